@@ -0,0 +1,379 @@
+#!/usr/bin/env python3
+# 分阶段性能基准测试 (Per-stage Benchmark Suite)
+# ==============================================================================
+# 用合成画面或录像 (--replay) 逐个测量主循环中每个阶段的延迟，
+# 输出 p50/p95/p99 延迟和吞吐量，任何阶段的 p95 超出预算就以非零状态退出。
+#
+# 用法:
+#   python3 benchmark.py                         # 合成画面，默认预算
+#   python3 benchmark.py --replay session.rec    # 用录制的真实画面
+#   python3 benchmark.py --stages ui_cart,full_loop --iterations 500
+#   python3 benchmark.py --budget detect=25 --budget hand_process=40
+#   python3 benchmark.py --budgets budgets.json  # {"detect": 25, ...}
+# ==============================================================================
+
+import sys
+import os
+import time
+import json
+import argparse
+
+import cv2
+import numpy as np
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), 'modules'))
+
+# ==============================================================================
+# 默认性能预算 (p95, 毫秒)
+# ------------------------------------------------------------------------------
+# 以 Jetson Nano 上 40 FPS 的目标帧率 (25 ms/帧) 为基准分配。
+# ==============================================================================
+DEFAULT_BUDGETS_MS = {
+    'detect': 20.0,
+    'color_convert': 2.0,
+    'hand_process': 35.0,
+    'gesture_recognize': 1.0,
+    'ui_background': 1.0,
+    'ui_video_frames': 3.0,
+    'ui_cart': 0.5,          # 购物车没变：面板沿用上一帧
+    'ui_cart_dirty': 6.0,    # 购物车变了：重画整个面板 (只在加减商品的那一帧发生)
+    'ui_qr': 6.0,
+    'cuda_render': 5.0,
+    'full_loop': 25.0,
+}
+
+# ==============================================================================
+# 统计工具
+# ==============================================================================
+
+class StageResult:
+    def __init__(self, name, samples_s, budget_ms=None, skipped=None):
+        self.name = name
+        self.samples_ms = np.asarray(samples_s, dtype=np.float64) * 1000.0
+        self.budget_ms = budget_ms
+        self.skipped = skipped
+
+    def percentile(self, q):
+        return float(np.percentile(self.samples_ms, q)) if self.samples_ms.size else 0.0
+
+    @property
+    def throughput(self):
+        total = self.samples_ms.sum() / 1000.0
+        return self.samples_ms.size / total if total > 0 else 0.0
+
+    @property
+    def passed(self):
+        # 跳过的阶段没有测到任何数据，不能算通过
+        return self.skipped is None and (self.budget_ms is None or self.percentile(95) <= self.budget_ms)
+
+    def as_dict(self):
+        if self.skipped:
+            return {'stage': self.name, 'skipped': self.skipped}
+        return {
+            'stage': self.name, 'iterations': int(self.samples_ms.size),
+            'p50_ms': self.percentile(50), 'p95_ms': self.percentile(95), 'p99_ms': self.percentile(99),
+            'throughput_per_s': self.throughput, 'budget_p95_ms': self.budget_ms, 'passed': self.passed,
+        }
+
+
+def time_stage(fn, frames, iterations, warmup):
+    """对每一帧调用 fn(frame)，返回每次调用的耗时 (秒)。"""
+    for i in range(warmup):
+        fn(frames[i % len(frames)])
+    samples = []
+    for i in range(iterations):
+        frame = frames[i % len(frames)]
+        start = time.perf_counter()
+        fn(frame)
+        samples.append(time.perf_counter() - start)
+    return samples
+
+# ==============================================================================
+# 输入画面
+# ==============================================================================
+
+def synthetic_frames(count, seed=0):
+    """生成 (水果帧 640x480 RGB, 手势帧 320x240 RGBA) 对，内容为噪声加色块，避免过于规整。"""
+    rng = np.random.RandomState(seed)
+    pairs = []
+    for i in range(count):
+        fruit = rng.randint(0, 255, (480, 640, 3), dtype=np.uint8)
+        cv2.circle(fruit, (100 + 20 * i % 440, 240), 60, (200, 30, 30), -1)
+        hand = rng.randint(0, 255, (240, 320, 4), dtype=np.uint8)
+        pairs.append((fruit, hand))
+    return pairs
+
+
+def replay_frames(path, count):
+    from frame_recorder import FrameReplay
+    replay = FrameReplay(path)
+    step = max(1, len(replay) // count)
+    # 拷贝出来：检测器会在画面上画框，不能每次都画在同一块内存上累积
+    return [(np.array(r['fruit']), np.array(r['hand'])) for r in replay.records[::step][:count]]
+
+
+def synthetic_landmarks():
+    """构造一只张开手掌的 21 个关节点，接口与 Mediapipe 的 NormalizedLandmarkList 相同。"""
+    class Point:
+        def __init__(self, x, y, z=0.0):
+            self.x, self.y, self.z = x, y, z
+
+    class Hand:
+        pass
+
+    hand = Hand()
+    hand.landmark = [Point(0.5, 0.9)]
+    for finger in range(5):
+        base_x = 0.3 + finger * 0.1
+        for joint in range(4):
+            hand.landmark.append(Point(base_x, 0.75 - joint * 0.12))
+    return hand
+
+# ==============================================================================
+# 各阶段
+# ==============================================================================
+# 每个 setup 函数返回一个 fn(frame_pair)；依赖或模型文件缺失时抛出异常，该阶段记为跳过。
+
+def _detector(ctx):
+    if 'detector' not in ctx:
+        from object_detector import ObjectDetector
+        ctx['detector'] = ObjectDetector("models/fruit/ssd-mobilenet.onnx", "models/fruit/labels.txt", backend=ctx['backend'])
+    return ctx['detector']
+
+
+def setup_detect(ctx):
+    detector = _detector(ctx)
+    to_input = ctx['to_input']
+    return lambda pair: detector.detect_and_draw(to_input(pair[0]))
+
+
+def _hand_prep(ctx):
+    if 'hand_prep' not in ctx:
+        from frame_buffers import HandFramePreprocessor
+        ctx['hand_prep'] = HandFramePreprocessor()
+    return ctx['hand_prep']
+
+
+def setup_color_convert(ctx):
+    prep = _hand_prep(ctx)
+    return lambda pair: prep.process(pair[1])
+
+
+def _hand_tracker(ctx):
+    if 'hand_tracker' not in ctx:
+        from hand_tracker import HandTracker
+        ctx['hand_tracker'] = HandTracker()
+    return ctx['hand_tracker']
+
+
+def setup_hand_process(ctx):
+    tracker = _hand_tracker(ctx)
+    return lambda pair: tracker.process_frame(cv2.cvtColor(pair[1], cv2.COLOR_RGBA2RGB))
+
+
+def _gesture_recognizer(ctx):
+    if 'gesture_recognizer' not in ctx:
+        from gesture_recognizer import GestureRecognizer
+        ctx['gesture_recognizer'] = GestureRecognizer()
+    return ctx['gesture_recognizer']
+
+
+def setup_gesture_recognize(ctx):
+    recognizer = _gesture_recognizer(ctx)
+    hand = synthetic_landmarks()
+    return lambda pair: recognizer.recognize(hand)
+
+
+def _ui(ctx):
+    if 'ui' not in ctx:
+        from ui_manager import UIManager
+        ctx['ui'] = UIManager()
+    return ctx['ui']
+
+
+def _cart(size):
+    names = ["apple", "orange", "banana", "strawberry", "grape", "pear", "pineapple", "watermelon"]
+    return {names[i % len(names)] + ("" if i < len(names) else str(i)): {'count': 1 + i % 3, 'price': 1.0 + i}
+            for i in range(size)}
+
+
+def setup_ui_background(ctx):
+    ui = _ui(ctx)
+    return lambda pair: ui.create_background()
+
+
+def setup_ui_video_frames(ctx):
+    ui = _ui(ctx)
+    background = ui.create_background()
+    return lambda pair: ui.draw_video_frames(background, pair[0], pair[1][..., :3])
+
+
+def setup_ui_cart(ctx):
+    """购物车内容不变的普通帧：只比较内容，面板沿用上一帧画好的。"""
+    ui = _ui(ctx)
+    background = ui.create_background()
+    cart = _cart(6)
+    total = sum(d['count'] * d['price'] for d in cart.values())
+    return lambda pair: ui.draw_shopping_cart(background, cart, total)
+
+
+def setup_ui_cart_dirty(ctx):
+    """每次调用购物车内容都不同：测量重画整个面板的耗时 (加减商品的那一帧)。"""
+    ui = _ui(ctx)
+    background = ui.create_background()
+    carts = [_cart(n) for n in range(0, 12)]
+    state = {'i': 0}
+
+    def draw(pair):
+        state['i'] += 1
+        cart = carts[state['i'] % len(carts)]
+        ui.draw_shopping_cart(background, cart, sum(d['count'] * d['price'] for d in cart.values()))
+    return draw
+
+
+def setup_ui_qr(ctx):
+    ui = _ui(ctx)
+    background = ui.create_background()
+    qr = np.zeros((300, 300, 3), dtype=np.uint8)
+    return lambda pair: ui.draw_qr_code(background, qr)
+
+
+def setup_cuda_render(ctx):
+    import jetson.utils
+    ui = _ui(ctx)
+    background = ui.create_background()
+    display = jetson.utils.videoOutput("display://0", argv=[f'--width={ui.width}', f'--height={ui.height}'])
+    return lambda pair: display.Render(jetson.utils.cudaFromNumpy(background))
+
+
+def setup_full_loop(ctx):
+    """
+    按 main.py 的顺序串起检测、手势和界面 (除显示输出外)。
+    不管有没有单独选中那些阶段，这里都自己创建检测器和手部追踪；缺少任何一个就整体跳过，
+    不会只测界面部分就报告通过。
+    """
+    ui = _ui(ctx)
+    detector = _detector(ctx)
+    tracker = _hand_tracker(ctx)
+    recognizer = _gesture_recognizer(ctx)
+    to_input = ctx['to_input']
+    prep = _hand_prep(ctx)
+    cart = _cart(4)
+    total = sum(d['count'] * d['price'] for d in cart.values())
+
+    def loop(pair):
+        fruit, hand = pair
+        detector.detect_and_draw(to_input(fruit))
+        hand_rgb = prep.process(hand)
+        results = tracker.process_frame(hand_rgb)
+        if results.multi_hand_landmarks:
+            recognizer.recognize(results.multi_hand_landmarks[0])
+        background = ui.create_background()
+        ui.draw_video_frames(background, fruit, hand_rgb)
+        tracker.draw_landmarks(ui.hand_view(background), results)
+        ui.draw_shopping_cart(background, cart, total)
+    return loop
+
+
+STAGES = [
+    ('detect', setup_detect),
+    ('color_convert', setup_color_convert),
+    ('hand_process', setup_hand_process),
+    ('gesture_recognize', setup_gesture_recognize),
+    ('ui_background', setup_ui_background),
+    ('ui_video_frames', setup_ui_video_frames),
+    ('ui_cart', setup_ui_cart),
+    ('ui_cart_dirty', setup_ui_cart_dirty),
+    ('ui_qr', setup_ui_qr),
+    ('cuda_render', setup_cuda_render),
+    ('full_loop', setup_full_loop),
+]
+
+# ==============================================================================
+# 入口
+# ==============================================================================
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Per-stage latency benchmark with performance budgets")
+    parser.add_argument('--replay', metavar='FILE', help="use frames from a recording instead of synthetic frames")
+    parser.add_argument('--frames', type=int, default=30, help="number of distinct input frames")
+    parser.add_argument('--iterations', type=int, default=300)
+    parser.add_argument('--warmup', type=int, default=20)
+    parser.add_argument('--stages', help="comma separated list of stages to run (default: all)")
+    parser.add_argument('--backend', default='auto', help="detector backend: jetson, cpu or auto")
+    parser.add_argument('--budget', action='append', default=[], metavar='STAGE=MS', help="override a p95 budget")
+    parser.add_argument('--budgets', metavar='FILE', help="JSON file with p95 budgets in ms")
+    parser.add_argument('--json', metavar='FILE', help="also write the results as JSON")
+    args = parser.parse_args()
+    if args.stages:
+        known = [name for name, _ in STAGES]
+        unknown = [name for name in args.stages.split(',') if name not in known]
+        if unknown:
+            parser.error(f"unknown stage(s): {', '.join(unknown)} (choose from {', '.join(known)})")
+    return args
+
+
+def main(args):
+    os.chdir(os.path.dirname(os.path.abspath(__file__)))  # 模型路径相对于项目根目录
+    budgets = dict(DEFAULT_BUDGETS_MS)
+    if args.budgets:
+        with open(args.budgets) as f:
+            budgets.update(json.load(f))
+    for item in args.budget:
+        stage, ms = item.split('=')
+        budgets[stage] = float(ms)
+
+    frames = replay_frames(args.replay, args.frames) if args.replay else synthetic_frames(args.frames)
+    selected = set(args.stages.split(',')) if args.stages else None
+
+    ctx = {'backend': args.backend, 'to_input': lambda frame: frame}
+    try:
+        import jetson.utils
+        if args.backend in ('jetson', 'auto'):
+            ctx['to_input'] = jetson.utils.cudaFromNumpy
+    except ImportError:
+        pass
+
+    results = []
+    for name, setup in STAGES:
+        if selected is not None and name not in selected:
+            continue
+        try:
+            fn = setup(ctx)
+        except Exception as e:
+            reason = (str(e).strip().splitlines() or [''])[-1]
+            results.append(StageResult(name, [], skipped=f"{type(e).__name__}: {reason}"))
+            continue
+        samples = time_stage(fn, frames, args.iterations, args.warmup)
+        results.append(StageResult(name, samples, budgets.get(name)))
+
+    print(f"\n{'stage':<18}{'p50 ms':>9}{'p95 ms':>9}{'p99 ms':>9}{'ops/s':>10}{'budget':>9}  result")
+    print("-" * 74)
+    for r in results:
+        if r.skipped:
+            print(f"{r.name:<18}{'':>46}  SKIP ({r.skipped})")
+            continue
+        budget = f"{r.budget_ms:.1f}" if r.budget_ms is not None else "-"
+        print(f"{r.name:<18}{r.percentile(50):>9.2f}{r.percentile(95):>9.2f}{r.percentile(99):>9.2f}"
+              f"{r.throughput:>10.1f}{budget:>9}  {'ok' if r.passed else 'OVER BUDGET'}")
+
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump([r.as_dict() for r in results], f, indent=2)
+
+    # 不指定 --stages 时，只能在 Jetson 上运行的阶段被跳过是正常的；
+    # 但显式要求的阶段被跳过、或者一个阶段都没测到，都算失败
+    over_budget = [r.name for r in results if not r.skipped and not r.passed]
+    skipped = [r.name for r in results if r.skipped and selected is not None]
+    if over_budget:
+        print(f"\nFAILED: {', '.join(over_budget)} exceeded the p95 budget")
+    if skipped:
+        print(f"\nFAILED: {', '.join(skipped)} requested but skipped")
+    if all(r.skipped for r in results):
+        print("\nFAILED: no stage was measured")
+        return 1
+    return 1 if over_budget or skipped else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(parse_args()))
@@ -6,21 +6,44 @@
 import sys
 import os
 import time
+import argparse
+STARTUP_T0 = time.monotonic()  # 启动时间线的零点：导入模块本身也要一两秒
 
 # --- 计算机视觉与硬件加速库 ---
 import cv2          # 用于图像处理 (加载、缩放图片)
 import numpy as np  # 用于图像数据的数组操作
-import jetson.utils # NVIDIA Jetson 平台专用工具库，用于高效访问摄像头和显示
+try:
+    import jetson.utils # NVIDIA Jetson 平台专用工具库，用于高效访问摄像头和显示
+except ImportError:
+    jetson = None       # 不在 Jetson 上：只能用 --replay 回放录像 (CPU 检测后端、无显示)
 
 # --- 自定义功能模块 ---
 # 将 'modules' 文件夹的路径添加到Python解释器的搜索列表中
 sys.path.append(os.path.join(os.path.dirname(__file__), 'modules'))
 
-from object_detector import ObjectDetector
+from object_detector import MODEL_REGISTRY, ObjectDetector, registry_labels
 from hand_tracker import HandTracker
 from ui_manager import UIManager
 from gesture_recognizer import GestureRecognizer
-from modules.voice_announcer import say as announcer_say
+from camera_capture import DualCameraCapture, LockstepCapture
+from frame_recorder import FrameRecorder, FrameReplay, NullOutput
+from hand_worker import HandWorker
+from fruit_tracker import FruitTracker
+from frame_buffers import FrameBufferPool, HandFramePreprocessor
+from cart import Cart
+from catalog import Catalog
+from transaction_log import TransactionLog
+from engine_cache import EngineCache
+from metrics import MetricsRegistry, MetricsServer
+from remote_stream import RemoteStream
+from phrase_cache import PhraseCache, standard_phrases
+from voice_announcer import say as announcer_say, start as start_announcer, shutdown as shutdown_announcer
+from voice_announcer import PRIORITY_LOW
+from checkout_state import CheckoutStateMachine
+from gesture_events import GestureEventEngine
+from pipeline import CheckoutStages, Pipeline
+from startup import Startup
+from lanes import Lane, MultiLaneRunner, load_lane_config, open_lane_capture, tile_layout
 
 
 # ==============================================================================
@@ -29,16 +52,91 @@ from modules.voice_announcer import say as announcer_say
 # 定义整个程序中使用的常量和配置参数。
 # ==============================================================================
 
-# --- 商品价格数据库 ---
-# 使用字典结构存储，键为小写水果名，值为单价。
-PRICE_LIST = {
-    "apple": 2.50, "orange": 1.80, "banana": 1.20, "strawberry": 4.00,
-    "grape": 5.50, "pear": 2.00, "pineapple": 3.50, "watermelon": 8.00
-}
+# --- 商品目录 ---
+# 商品名称和单价在目录文件中维护 (CSV / JSON / SQLite)，按模型类别建好索引；
+# 运行中修改价格会自动重新加载，不需要重启
+CATALOG_PATH = "catalog.csv"
 
-# 定义每隔多少帧进行一次手势识别
-GESTURE_CHECK_INTERVAL = 3
-def main():
+# 检测模型级联 (见 object_detector.MODEL_REGISTRY)：水果模型每帧都跑，超市通用商品模型只在水果模型
+# 没把握的区域 (或画面里一个有把握的水果都没有时) 才跑，第一次需要时才加载；模型文件不存在时只用水果模型
+DETECTOR_MODELS = ('fruit', 'supermarket')
+
+# 手势识别的自适应调度 (取代固定的每3帧一次)：手在动时每帧都跑 Mediapipe，
+# 手静止时每 HAND_HOLD_INTERVAL 帧跑一次，画面静止且没有手时每 HAND_IDLE_INTERVAL 帧才跑一次
+HAND_HOLD_INTERVAL = 3
+HAND_IDLE_INTERVAL = 15
+
+# 水果检测器每隔多少帧运行一次，中间的帧由追踪器外推
+DETECT_INTERVAL = 5
+
+# 是否把手部追踪 + 手势识别放到独立的工作进程中运行 (通过共享内存传帧)
+# 开启后 Mediapipe 不再阻塞主循环 (工作进程里同样按运动自适应调度)
+USE_HAND_WORKER = False
+
+# 购物车日志：每次修改都追加写入，程序崩溃/断电重启后按它恢复顾客的购物车
+CART_JOURNAL_PATH = "cart_journal.jsonl"
+
+# 交易记录数据库：每笔完成的交易写入本地 SQLite，用 modules/transaction_log.py 出报表
+TRANSACTION_DB_PATH = "transactions.db"
+
+# 两路摄像头画面允许的最大采集时间差 (秒)，超过就在状态栏提示不同步
+MAX_CAMERA_SKEW = 0.05
+
+# 显示刷新的节拍 (秒)：上游没有新画面时按这个间隔重画上一帧，窗口不会因为推理卡顿而停住
+RENDER_PERIOD = 1 / 30.0
+
+# 远程画面 (--stream-port) 每秒最多编码几帧：画面缩小一半后用 JPEG 编码，远程查看 5 FPS 足够，
+# 编码在后台线程进行，不拖慢本机显示
+REMOTE_STREAM_FPS = 5.0
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Smart Fruit Stall checkout system")
+    parser.add_argument('--record', metavar='FILE', help="record synchronized fruit/hand frames to FILE")
+    parser.add_argument('--record-every', type=int, default=1, metavar='N', help="record every N-th frame pair")
+    parser.add_argument('--replay', metavar='FILE', help="replay a recording instead of the CSI cameras")
+    parser.add_argument('--realtime', action='store_true', help="replay at the recorded frame rate (default: as fast as possible)")
+    parser.add_argument('--loop', action='store_true', help="loop the replay forever")
+    parser.add_argument('--headless', action='store_true', help="do not open a display")
+    parser.add_argument('--lanes', metavar='CONFIG', help="drive several checkout lanes from one process (JSON lane config)")
+    parser.add_argument('--cart-journal', metavar='FILE', help=f"cart journal path (default: {CART_JOURNAL_PATH}; disabled when replaying)")
+    parser.add_argument('--transactions', metavar='FILE', help=f"transaction database (default: {TRANSACTION_DB_PATH}; disabled when replaying)")
+    parser.add_argument('--metrics-port', type=int, default=0, metavar='PORT', help="serve Prometheus metrics on localhost:PORT")
+    parser.add_argument('--metrics-overlay', action='store_true', help="show per-stage timings on screen instead of the single FPS")
+    parser.add_argument('--stream-port', type=int, default=0, metavar='PORT', help="stream the screen as MJPEG on localhost:PORT")
+    parser.add_argument('--stream-fps', type=float, default=REMOTE_STREAM_FPS, metavar='FPS', help=f"remote stream frame rate (default: {REMOTE_STREAM_FPS})")
+    return parser.parse_args()
+
+
+def to_numpy(img):
+    """CUDA 图像零拷贝映射为 Numpy；回放得到的图像本来就是 Numpy。"""
+    return img if isinstance(img, np.ndarray) else jetson.utils.cudaToNumpy(img)
+
+
+def to_display(np_img):
+    """显示输出需要 CUDA 图像；没有 Jetson 时 (NullOutput) 直接传 Numpy。"""
+    return jetson.utils.cudaFromNumpy(np_img) if jetson is not None else np_img
+
+
+def run_lanes(args, lane_config, detector, catalog, qr_code_img, display, metrics, transaction_log, remote_stream=None):
+    """多路收银台模式：所有收银台共用一个检测器，手部追踪由少量工作进程轮流处理。"""
+    lanes = []
+    for spec in lane_config['lanes']:
+        capture = open_lane_capture(spec, jetson.utils if jetson is not None else None,
+                                    max_skew=MAX_CAMERA_SKEW, realtime=True)
+        journal = spec.get('cart_journal') or ("cart_journal_" + spec['name'].lower().replace(' ', '_') + ".jsonl")
+        lanes.append(Lane(spec['name'], capture, detector, catalog, announcer_say, cart_journal=journal,
+                          detect_interval=DETECT_INTERVAL, metrics=metrics, transaction_log=transaction_log))
+    runner = MultiLaneRunner(lanes, detector, lane_config.get('hand_workers', 2), qr_code_img,
+                             to_numpy, to_display, metrics=metrics, remote_stream=remote_stream)
+    announcer_say("Welcome", PRIORITY_LOW)
+    try:
+        runner.run(display)
+    finally:
+        runner.close()
+
+
+def main(args):
     """
     程序的主函数，封装了所有的初始化、主循环和资源管理。
     """
@@ -48,150 +146,191 @@ def main():
     # --------------------------------------------------------------------------
     
     print(" Starting Smart Fruit Stall System (Final Optimized Version)...")
+    imports_done = time.monotonic()
 
-    # --- 实例化所有自定义模块 ---
-    fruit_detector = ObjectDetector(model_path="models/fruit/ssd-mobilenet.onnx", labels_path="models/fruit/labels.txt")
-    hand_tracker = HandTracker()
+    # --- 性能指标 ---
+    # 端点和叠加层都没开时，阶段计时器是空操作，主循环几乎没有额外开销
+    metrics = MetricsRegistry(enabled=bool(args.metrics_port or args.metrics_overlay))
+    metrics_server = MetricsServer(metrics, port=args.metrics_port) if args.metrics_port else None
+    # 远程画面：没有客户端连接时合成阶段只多一次时间判断
+    remote_stream = RemoteStream(port=args.stream_port, fps=args.stream_fps, metrics=metrics) if args.stream_port else None
+    startup = Startup(t0=STARTUP_T0, metrics=metrics)
+    startup.record("imports", STARTUP_T0, imports_done)
+
+    # --- 先打开显示，立即显示启动画面 ---
+    display_started = time.monotonic()
     ui = UIManager()
-    gesture_recognizer = GestureRecognizer()
-    
-    # --- 加载静态资源 (二维码图片) ---
-    qr_image_path = "payment_qr.png"
-    qr_code_img = cv2.imread(qr_image_path)
-    if qr_code_img is not None:
-        qr_code_img = cv2.resize(qr_code_img, (300, 300))
+    lane_config = load_lane_config(args.lanes) if args.lanes else None
+    display_width, display_height = ui.width, ui.height
+    if lane_config is not None:
+        display_width, display_height, _ = tile_layout(len(lane_config['lanes']))
+    if args.headless or jetson is None:
+        display = NullOutput()
     else:
+        display = jetson.utils.videoOutput("display://0", argv=[f'--width={display_width}', f'--height={display_height}'])
+    display.Render(to_display(ui.draw_warmup_screen("Smart Fruit Stall is starting", "Loading", startup.elapsed)))
+    startup.record("display", display_started)
+
+    # ==========================================================================
+    # 并行初始化
+    # --------------------------------------------------------------------------
+    # 每个组件是一个启动任务，依赖的任务完成后立即在自己的线程里开始，互不相关的同时进行；
+    # 主线程只负责刷新启动画面。Mediapipe 和 pyttsx3 都在用到时才导入，不再拖慢模块导入。
+    # ==========================================================================
+
+    # 商品目录按级联的统一类别空间建索引；运行中修改价格会自动重新加载
+    startup.add("catalog", lambda: Catalog(CATALOG_PATH, registry_labels(DETECTOR_MODELS)).start_watching())
+    # 语音队列长度和延迟也并入同一个注册表；有 espeak/aplay 时播报走预合成的语音缓存，
+    # 常用短语在语音线程空闲时预合成 (部署时也可以运行 modules/phrase_cache.py 提前生成)
+    startup.add("announcer", lambda catalog: start_announcer(
+        metrics, phrase_cache=PhraseCache(), warmup=standard_phrases(catalog.product_names())), deps=["catalog"])
+    # 交易记录在后台线程中批量写入 SQLite；回放录像时默认不记录，避免测试数据混进报表
+    transaction_db = args.transactions or (None if args.replay else TRANSACTION_DB_PATH)
+    startup.add("transactions", lambda: TransactionLog(transaction_db) if transaction_db else None)
+
+    # --- 水果识别模型 ---
+    # EngineCache 检查模型旁边的 TensorRT engine 是否属于这块板子，不属于就移走并重新优化
+    # 没有 Jetson 时改用 CPU 后端，回放录像也能跑完整流程
+    fruit_model_path = MODEL_REGISTRY[DETECTOR_MODELS[0]]['model']
+
+    def prepare_engine():
+        if jetson is None:
+            return None
+        engine_cache = EngineCache(fruit_model_path)
+        engine_cache.prepare()
+        return engine_cache
+
+    def load_detector(engine_cache):
+        if engine_cache is None:
+            detector_kwargs = {'backend': 'cpu'}
+        else:
+            detector_kwargs = {'backend': 'jetson', 'engine_cache': engine_cache}
+        return ObjectDetector.from_registry(DETECTOR_MODELS, **detector_kwargs)
+
+    startup.add("engine_cache", prepare_engine)
+    startup.add("detector", load_detector, deps=["engine_cache"])
+
+    # --- 加载静态资源 (二维码图片) ---
+    def load_qr_code():
+        qr_code_img = cv2.imread("payment_qr.png")
+        if qr_code_img is not None:
+            return cv2.resize(qr_code_img, (300, 300))
         # 如果图片加载失败，创建一个带错误提示的黑色方块，保证程序健壮性
         qr_code_img = np.zeros((300, 300, 3), dtype=np.uint8)
         cv2.putText(qr_code_img, "QR NOT FOUND", (50, 150), cv2.FONT_HERSHEY_SIMPLEX, 1, (0, 0, 255), 2)
+        return qr_code_img
+
+    startup.add("qr_code", load_qr_code)
+
+    # --- 手部追踪、手势识别、摄像头和购物车 ---
+    # (多路模式下手部追踪全部在工作进程中进行，摄像头和购物车由每个收银台自己打开，这里不需要)
+    if lane_config is None:
+        startup.add("hand_tracker", lambda: HandTracker(hold_interval=HAND_HOLD_INTERVAL, idle_interval=HAND_IDLE_INTERVAL))
+        if USE_HAND_WORKER:
+            startup.add("hand_worker", lambda: HandWorker(frame_shape=(240, 320, 3), adaptive=True,
+                                                          hold_interval=HAND_HOLD_INTERVAL, idle_interval=HAND_IDLE_INTERVAL))
+        startup.add("gesture_recognizer", GestureRecognizer)
+
+        def open_cameras():
+            if args.replay:
+                # 回放录像：两路同步逐帧读取 (不开采集线程)，每次运行处理的帧序列完全相同
+                replay = FrameReplay(args.replay)
+                fruit_cam, hand_cam = replay.sources(realtime=args.realtime, loop=args.loop, as_cuda=jetson is not None)
+                print(f"Replaying {len(replay)} frame pairs from {args.replay}")
+                return LockstepCapture(fruit_cam, hand_cam, max_skew=MAX_CAMERA_SKEW)
+            # 采集线程会持续 Capture()，多分配几个缓冲区，避免主循环还在用的帧被摄像头覆盖
+            fruit_cam = jetson.utils.videoSource("csi://1", argv=['--input-width=640', '--input-height=480', '--num-buffers=8'])
+            hand_cam = jetson.utils.videoSource("csi://0", argv=['--input-width=320', '--input-height=240', '--num-buffers=8'])
+            # 每个摄像头一个采集线程，主循环只取最新的一对画面
+            return DualCameraCapture(fruit_cam, hand_cam, max_skew=MAX_CAMERA_SKEW)
+
+        startup.add("cameras", open_cameras)
+        # 购物车 (增量维护总价)；回放录像时默认不读写日志，避免和真实顾客的购物车混在一起
+        startup.add("cart", lambda: Cart(journal_path=args.cart_journal or (None if args.replay else CART_JOURNAL_PATH)))
+
+    # --- 等待所有组件就绪，期间刷新启动画面 ---
+    while not startup.done and display.IsStreaming():
+        engine_cache = startup.get("engine_cache") if startup.ready("engine_cache") else None
+        if engine_cache is not None and engine_cache.status == EngineCache.REBUILD and not startup.ready("detector"):
+            message = "Optimizing model for this device (first run, may take several minutes)"
+        else:
+            message = "Loading " + ", ".join(name.replace('_', ' ') for name in startup.pending())
+        display.Render(to_display(ui.draw_warmup_screen("Smart Fruit Stall is starting", message, startup.elapsed)))
+        time.sleep(0.1)
+    print(startup.timeline())
+
+    catalog = startup.get("catalog")
+    startup.get("announcer")
+    transaction_log = startup.get("transactions")
+    fruit_detector = startup.get("detector")
+    qr_code_img = startup.get("qr_code")
+    if lane_config is not None:
+        run_lanes(args, lane_config, fruit_detector, catalog, qr_code_img, display, metrics, transaction_log,
+                  remote_stream=remote_stream)
+        shutdown_announcer()
+        catalog.close()
+        if transaction_log is not None:
+            transaction_log.close()
+        if metrics_server is not None:
+            metrics_server.close()
+        if remote_stream is not None:
+            remote_stream.close()
+        return
+    engine_cache = startup.get("engine_cache")
+    print(f"Detector ready (engine: {engine_cache.status if engine_cache else 'n/a'})")
+    fruit_tracker = FruitTracker(fruit_detector, detect_interval=DETECT_INTERVAL)
+    hand_tracker = startup.get("hand_tracker")
+    hand_worker = startup.get("hand_worker") if USE_HAND_WORKER else None
+    gesture_recognizer = startup.get("gesture_recognizer")
+    cart = startup.get("cart")
+    capture = startup.get("cameras")
+    if not args.replay:
+        capture.start()  # 模型都就绪了才开始采集，不让摄像头线程和初始化抢 CPU
+    recorder = FrameRecorder(args.record, every_n=args.record_every) if args.record else None
 
-    # --- 初始化硬件接口 (摄像头与显示) ---
-    fruit_cam = jetson.utils.videoSource("csi://1", argv=['--input-width=640', '--input-height=480'])
-    hand_cam = jetson.utils.videoSource("csi://0", argv=['--input-width=320', '--input-height=240'])
-    display = jetson.utils.videoOutput("display://0", argv=[f'--width={ui.width}', f'--height={ui.height}'])
-    
     # --- 初始化语音播报 ---
-    announcer_say("Welcome")
+    announcer_say("Welcome", PRIORITY_LOW)
 
     # --- 初始化程序状态变量 ---
-    shopping_cart = {}             # 购物车
-    last_detected_fruits = set()   # “记忆”：上一帧的水果
-    addition_history = []          # “历史记录”：用于撤销
-    checkout_mode = False          # “开关”：是否为结账模式
-    last_action_time = 0           # “计时器”：用于手势防抖
-    
-    # --- 初始化性能优化所需变量 ---
-    frame_counter = 0              # 帧计数器
-    last_known_gesture = "No Hand" # “记忆”：上一次有效的手势结果
-    last_hand_results = None       # “记忆”：上一次的骨骼数据，用于平滑显示
-
+    # 购物/结账状态机：清空购物车时重置追踪器，画面中仍在的水果会重新计数
+    state = CheckoutStateMachine(cart, catalog, announcer_say, on_reset=fruit_tracker.reset, metrics=metrics,
+                                 transaction_log=transaction_log)
 
     # ==========================================================================
-    # 主循环 
-    
-    while display.IsStreaming():
-        
-        # ----------------------------------------------------------------------
-        #  数据采集 (Data Acquisition)
-        # ----------------------------------------------------------------------
-        frame_counter += 1
-        fruit_img = fruit_cam.Capture()
-        hand_img = hand_cam.Capture()
-        if fruit_img is None or hand_img is None: continue
-
-        # ----------------------------------------------------------------------
-        # 步骤 4.2: 核心处理 (Core Processing)
-        # ----------------------------------------------------------------------
-
-        # a) 水果检测 (每帧都执行，由GPU加速，非常快)
-        detections = fruit_detector.detect_and_draw(fruit_img)
-        fruit_frame_np = jetson.utils.cudaToNumpy(fruit_img)
-        
-        # b) 手势识别 
-        if frame_counter % GESTURE_CHECK_INTERVAL == 0:
-            hand_frame_np_rgb = cv2.cvtColor(jetson.utils.cudaToNumpy(hand_img), cv2.COLOR_RGBA2RGB)
-            hand_frame_flipped = cv2.flip(hand_frame_np_rgb, 1)#镜像
-            results = hand_tracker.process_frame(hand_frame_flipped)
-            last_hand_results = results # 更新骨骼数据
-            
-            if results.multi_hand_landmarks:
-                last_known_gesture = gesture_recognizer.recognize(results.multi_hand_landmarks[0])
-            else:
-                last_known_gesture = "No Hand"
-        
-        current_gesture = last_known_gesture # 使用最近一次的有效结果
-
-        # ----------------------------------------------------------------------
-        # 交互逻辑 (Interaction Logic - State Machine)
-        # ----------------------------------------------------------------------
-        time_since_last_action = time.time() - last_action_time
-        
-        # --- 状态一: 结账模式 (Checkout Mode) ---
-        if checkout_mode:
-            if current_gesture == "thumb_up" and time_since_last_action > 1.5:
-                announcer_say("Thank you. Cart is now clear.")
-                # 重置所有状态，为下一位顾客准备
-                shopping_cart.clear(); addition_history.clear(); last_detected_fruits.clear()
-                checkout_mode = False
-                last_action_time = time.time()
-        
-        # --- 状态二: 购物模式 (Shopping Mode) ---
-        else:
-            # 自动添加商品、大小写转换
-            current_detected_fruits = {fruit_detector.net.GetClassDesc(det.ClassID).strip().lower() for det in detections if fruit_detector.net.GetClassDesc(det.ClassID).strip().lower() != 'background'}
-            newly_appeared_fruits = current_detected_fruits - last_detected_fruits
-            if newly_appeared_fruits:
-                first_new_fruit = list(newly_appeared_fruits)[0]#只念最新加的一种水果
-                announcer_say(f"{first_new_fruit} added.")
-                for fruit in newly_appeared_fruits:
-                    if fruit in shopping_cart: shopping_cart[fruit]['count'] += 1#数量加一
-                    else: shopping_cart[fruit] = {'count': 1, 'price': PRICE_LIST[fruit]}
-                    addition_history.append(fruit)#加入历史记录
-            last_detected_fruits = current_detected_fruits#更新记忆
-
-            # 手势操作
-            if current_gesture == "pointing" and shopping_cart and time_since_last_action > 1.5:
-                total_price = sum(item['count'] * item['price'] for item in shopping_cart.values())
-                announcer_say(f"Total price is {total_price:.2f} dollars. Please scan to pay.")
-                checkout_mode = True#切换到结账模式
-                last_action_time = time.time()
-            elif time_since_last_action > 1.5:
-                if current_gesture == "thumb_up" and shopping_cart:
-                    announcer_say("Cart cleared.")
-                    shopping_cart.clear(); addition_history.clear(); last_detected_fruits.clear()
-                    last_action_time = time.time()
-                elif current_gesture == "open_palm" and addition_history:
-                    last_added_fruit = addition_history.pop()
-                    announcer_say(f"Undo {last_added_fruit}.")
-                    if last_added_fruit in shopping_cart:
-                        shopping_cart[last_added_fruit]['count'] -= 1#数量减一
-                        if shopping_cart[last_added_fruit]['count'] == 0:
-                            del shopping_cart[last_added_fruit]
-                    last_action_time = time.time()
-
-        # ----------------------------------------------------------------------
-        # 界面渲染 (UI Rendering)
-        # ----------------------------------------------------------------------
-        total_price = sum(item['count'] * item['price'] for item in shopping_cart.values())
-
-        # 准备手势窗口的实时画面
-        hand_frame_np_rgb = cv2.cvtColor(jetson.utils.cudaToNumpy(hand_img), cv2.COLOR_RGBA2RGB)
-        hand_frame_to_draw = cv2.flip(hand_frame_np_rgb, 1)
-        hand_tracker.draw_landmarks(hand_frame_to_draw, last_hand_results) # 用记住的骨骼数据绘制
-        cv2.putText(hand_frame_to_draw, f"Gesture: {current_gesture}", (10, 30), cv2.FONT_HERSHEY_SIMPLEX, 0.7, (255, 255, 0), 2)
-        
-        # 调用UI管理器进行最终合成
-        background = ui.create_background()
-        ui.draw_video_frames(background, fruit_frame_np, hand_frame_to_draw)
-        ui.draw_shopping_cart(background, shopping_cart, total_price)
-
-        if checkout_mode:
-            background = ui.draw_qr_code(background, qr_code_img)
-
-        # 将最终画面显示到屏幕
-        final_img_cuda = jetson.utils.cudaFromNumpy(background)
-        display.Render(final_img_cuda)
-        display.SetStatus(f"Smart Fruit Stall | FPS: {fruit_detector.get_network_fps():.1f}")
+    # 主循环：采集 → 检测 → 手势 → 决策 → 合成 → 显示 的流水线
+    # ==========================================================================
+    # 各阶段在自己的线程里并行处理不同的帧，阶段之间的队列满了丢最旧的帧；
+    # 推理偶尔卡顿时显示仍按 RENDER_PERIOD 刷新。
+    # 同时有好几帧在不同阶段中，手势画面的缓冲区要多准备几个 (转换 + 镜像后的画面，追踪和显示共用)。
+    # 逐帧的识别结果先经过投票，状态机只处理稳定下来的手势事件 (开始 / 保持 / 结束)
+    stages = CheckoutStages(capture, fruit_tracker, HandFramePreprocessor(FrameBufferPool(), slots=4),
+                            GestureEventEngine(), state, cart, ui, display, to_numpy, to_display, qr_code_img,
+                            hand_tracker=hand_tracker, hand_worker=hand_worker, gesture_recognizer=gesture_recognizer,
+                            recorder=recorder, metrics=metrics, metrics_overlay=args.metrics_overlay,
+                            remote_stream=remote_stream)
+    # 尽快回放录像时不丢帧，每次运行处理的帧序列和结果都相同
+    lossless = bool(args.replay and not args.realtime)
+    pipeline = Pipeline(stages.stages(render_period=RENDER_PERIOD, lossless=lossless), metrics=metrics)
+    try:
+        pipeline.run(until=display.IsStreaming)
+    finally:
+        # 流水线异常退出 (或 Ctrl+C) 时也要落盘日志、停掉采集线程和子进程
+        print(f"Pipeline queue drops: { {name: q.dropped for name, q in pipeline.queues.items()} }")
+        capture.stop()
+        cart.close()
+        catalog.close()
+        if transaction_log is not None:
+            transaction_log.close()
+        shutdown_announcer()
+        if metrics_server is not None:
+            metrics_server.close()
+        if remote_stream is not None:
+            remote_stream.close()
+        if recorder is not None:
+            recorder.close()
+        print(f"Text sprite cache: {ui.text_cache.stats()}")
+        if hand_worker is not None:
+            hand_worker.close()
 
 
 # ==============================================================================
@@ -201,4 +340,4 @@ def main():
 # ==============================================================================
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main(parse_args())
\ No newline at end of file
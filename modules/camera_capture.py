@@ -0,0 +1,284 @@
+#!/usr/bin/env python3
+# modules/camera_capture.py
+
+# ==============================================================================
+# 导入库
+# ==============================================================================
+import threading
+import time
+
+import numpy as np  # 只在替身摄像头 (SyntheticVideoSource) 中用来生成测试画面
+
+# ==============================================================================
+# 最新帧槽位 (LatestFrameSlot)
+# ==============================================================================
+
+class LatestFrameSlot:
+    """
+    线程安全的“最新帧”槽位：生产者线程不停写入，消费者只取最新的一帧。
+    - 每一帧都带有采集时间戳 (time.monotonic) 和递增的序号。
+    - 消费者还没取走旧帧就来了新帧时，旧帧直接被覆盖并记为丢帧 (stale)。
+    """
+    def __init__(self):
+        self._cond = threading.Condition()
+        self._frame = None
+        self._timestamp = 0.0
+        self._seq = 0            # 最新写入帧的序号 (从1开始)
+        self._consumed_seq = 0   # 消费者最后取走的序号
+        self.dropped = 0         # 没被消费就被覆盖掉的帧数
+
+    def put(self, frame, timestamp):
+        """生产者调用：写入一帧，并唤醒等待中的消费者。"""
+        with self._cond:
+            if self._seq > self._consumed_seq:
+                self.dropped += 1
+            self._frame = frame
+            self._timestamp = timestamp
+            self._seq += 1
+            self._cond.notify_all()
+
+    def get(self):
+        """
+        消费者调用：非阻塞地取最新帧。
+        :return: (frame, timestamp, seq, is_new)，还没有任何帧时 frame 为 None。
+        """
+        with self._cond:
+            is_new = self._seq > self._consumed_seq
+            self._consumed_seq = self._seq
+            return self._frame, self._timestamp, self._seq, is_new
+
+    def wait(self, after_seq, timeout):
+        """阻塞等待，直到出现序号大于 after_seq 的帧或超时。返回是否等到了新帧。"""
+        with self._cond:
+            if self._seq > after_seq:
+                return True
+            self._cond.wait(timeout)
+            return self._seq > after_seq
+
+    @property
+    def seq(self):
+        return self._seq
+
+# ==============================================================================
+# 采集线程 (CaptureThread)
+# ==============================================================================
+
+class CaptureThread(threading.Thread):
+    """
+    为一个视频源 (jetson.utils.videoSource 或替身) 单独开一个生产者线程，
+    不停 Capture() 并写入 LatestFrameSlot。
+    """
+    def __init__(self, source, slot, name="capture", copy_frame=None):
+        """
+        :param source: 需要实现 Capture() / IsStreaming() 的视频源。
+        :param slot: 写入的 LatestFrameSlot。
+        :param copy_frame: 可选的拷贝函数。videoSource 返回的图像来自内部环形缓冲区，
+                           如果消费者持有一帧的时间很长，可以在这里拷贝一份。
+        """
+        super().__init__(name=name)
+        self.daemon = True
+        self.source = source
+        self.slot = slot
+        self.copy_frame = copy_frame
+        self.captured = 0
+        self._stop_event = threading.Event()
+
+    def run(self):
+        while not self._stop_event.is_set() and self.source.IsStreaming():
+            try:
+                frame = self.source.Capture()
+            except Exception as e:
+                # 摄像头偶尔会超时，记录后继续，不让线程退出
+                print(f"[CaptureThread {self.name}] Capture failed: {e}")
+                time.sleep(0.01)
+                continue
+            if frame is None:
+                continue
+            timestamp = time.monotonic()
+            if self.copy_frame is not None:
+                frame = self.copy_frame(frame)
+            self.captured += 1
+            self.slot.put(frame, timestamp)
+
+    def stop(self, timeout=1.0):
+        self._stop_event.set()
+        self.join(timeout)
+
+# ==============================================================================
+# 双摄像头采集 (DualCameraCapture)
+# ==============================================================================
+
+class FramePair:
+    """一次取到的水果帧 + 手势帧，以及它们的时间戳、序号和是否为新帧。"""
+    def __init__(self, fruit, hand, fruit_ts, hand_ts, fruit_seq, hand_seq, fruit_new, hand_new, max_skew):
+        self.fruit = fruit
+        self.hand = hand
+        self.fruit_ts = fruit_ts
+        self.hand_ts = hand_ts
+        self.fruit_seq = fruit_seq
+        self.hand_seq = hand_seq
+        self.fruit_new = fruit_new
+        self.hand_new = hand_new
+        self.skew = abs(fruit_ts - hand_ts)     # 两路画面的采集时间差 (秒)
+        self.in_sync = self.skew <= max_skew    # 时间差是否在允许范围内
+
+
+class DualCameraCapture:
+    """
+    同时管理水果摄像头和手势摄像头的两个采集线程。
+    主循环通过 latest_pair() 取最新的一对画面，不再串行等待两次 Capture()。
+    """
+    def __init__(self, fruit_source, hand_source, max_skew=0.05, copy_frame=None):
+        """
+        :param max_skew: 两路画面时间差超过这个值 (秒) 就认为不同步。
+        """
+        self.fruit_slot = LatestFrameSlot()
+        self.hand_slot = LatestFrameSlot()
+        self.max_skew = max_skew
+        self._threads = [
+            CaptureThread(fruit_source, self.fruit_slot, name="fruit_cam", copy_frame=copy_frame),
+            CaptureThread(hand_source, self.hand_slot, name="hand_cam", copy_frame=copy_frame),
+        ]
+        self._last_seq = 0  # 上一次取帧时两路序号之和，用来判断有没有新帧
+
+    def start(self):
+        for t in self._threads:
+            t.start()
+        return self
+
+    def stop(self):
+        for t in self._threads:
+            t.stop()
+
+    def is_streaming(self):
+        return any(t.is_alive() for t in self._threads)
+
+    def latest_pair(self, wait=0.0):
+        """
+        取最新的一对画面。
+        :param wait: 两路都没有新帧时最多等待的秒数，0 表示完全不阻塞。
+        :return: FramePair；任意一路还没有出过帧时返回 None。
+        """
+        if wait > 0 and self.fruit_slot.seq + self.hand_slot.seq == self._last_seq:
+            # 只等水果摄像头即可：它帧率高、决定主循环节奏
+            self.fruit_slot.wait(self.fruit_slot.seq, wait)
+
+        # 两路都出过帧之后才取：只有一路有帧时不能把它标成已消费，否则下一次它不算新帧
+        if self.fruit_slot.seq == 0 or self.hand_slot.seq == 0:
+            return None
+        fruit, fruit_ts, fruit_seq, fruit_new = self.fruit_slot.get()
+        hand, hand_ts, hand_seq, hand_new = self.hand_slot.get()
+        self._last_seq = fruit_seq + hand_seq
+        return FramePair(fruit, hand, fruit_ts, hand_ts, fruit_seq, hand_seq,
+                         fruit_new, hand_new, self.max_skew)
+
+    def dropped_frames(self):
+        """返回 (水果丢帧数, 手势丢帧数)。"""
+        return self.fruit_slot.dropped, self.hand_slot.dropped
+
+
+class LockstepCapture:
+    """
+    与 DualCameraCapture 接口相同，但不开线程：每次 latest_pair() 都同步地从两路各取一帧。
+    用于回放录像，保证每次运行处理的帧序列完全相同 (确定性)。
+    """
+    def __init__(self, fruit_source, hand_source, max_skew=0.05):
+        self.fruit_source = fruit_source
+        self.hand_source = hand_source
+        self.max_skew = max_skew
+        self._seq = 0
+
+    def start(self):
+        return self
+
+    def stop(self):
+        pass
+
+    def is_streaming(self):
+        return self.fruit_source.IsStreaming() and self.hand_source.IsStreaming()
+
+    def latest_pair(self, wait=0.0):
+        fruit = self.fruit_source.Capture()
+        hand = self.hand_source.Capture()
+        if fruit is None or hand is None:
+            return None
+        self._seq += 1
+        # 回放源会带上录制时的时间戳，其他视频源就用当前时间
+        now = time.monotonic()
+        fruit_ts = getattr(self.fruit_source, 'last_timestamp', now)
+        hand_ts = getattr(self.hand_source, 'last_timestamp', now)
+        return FramePair(fruit, hand, fruit_ts, hand_ts, self._seq, self._seq, True, True, self.max_skew)
+
+    def dropped_frames(self):
+        return 0, 0
+
+# ==============================================================================
+# 替身视频源 (SyntheticVideoSource)
+# ==============================================================================
+
+class SyntheticVideoSource:
+    """
+    不依赖 jetson.utils 的替身摄像头，接口与 videoSource 相同，
+    用于在没有 CSI 摄像头的机器上测试采集逻辑。返回的是 Numpy 图像。
+    """
+    def __init__(self, width=640, height=480, fps=30.0, channels=3, max_frames=None):
+        self.width = width
+        self.height = height
+        self.fps = fps
+        self.max_frames = max_frames
+        self._frame_index = 0
+        self._next_time = time.monotonic()
+        self._frame = np.zeros((height, width, channels), dtype=np.uint8)
+        self._streaming = True
+
+    def Capture(self, timeout=None):
+        if not self._streaming:
+            return None
+        # 按设定帧率节流，模拟真实摄像头的阻塞行为
+        if self.fps:
+            delay = self._next_time - time.monotonic()
+            if delay > 0:
+                time.sleep(delay)
+            self._next_time = max(self._next_time + 1.0 / self.fps, time.monotonic())
+        self._frame_index += 1
+        if self.max_frames is not None and self._frame_index >= self.max_frames:
+            self._streaming = False
+        # 画一个随帧号移动的亮条，便于肉眼确认画面在刷新
+        frame = self._frame.copy()
+        x = (self._frame_index * 8) % self.width
+        frame[:, x:x + 8] = 255
+        return frame
+
+    def IsStreaming(self):
+        return self._streaming
+
+    def GetWidth(self):
+        return self.width
+
+    def GetHeight(self):
+        return self.height
+
+    def GetFrameRate(self):
+        return self.fps
+
+    def Close(self):
+        self._streaming = False
+
+# ==============================================================================
+# 单独测试代码
+# ==============================================================================
+# 运行 `python3 modules/camera_capture.py` 时执行，不需要真实摄像头。
+if __name__ == '__main__':
+    print("Running DualCameraCapture with synthetic sources...")
+    capture = DualCameraCapture(SyntheticVideoSource(640, 480, fps=30),
+                                SyntheticVideoSource(320, 240, fps=20)).start()
+    start = time.monotonic()
+    pairs = 0
+    while time.monotonic() - start < 2.0:
+        pair = capture.latest_pair(wait=0.05)
+        if pair is None:
+            continue
+        pairs += 1
+        time.sleep(0.04)  # 模拟比摄像头慢的主循环
+    capture.stop()
+    print(f"Pairs consumed: {pairs}, dropped (fruit, hand): {capture.dropped_frames()}")
@@ -0,0 +1,231 @@
+#!/usr/bin/env python3
+# modules/cart.py
+
+# ==============================================================================
+# 导入库
+# ==============================================================================
+import json
+import os
+import queue
+import threading
+import time
+
+# ==============================================================================
+# 购物车日志 (CartJournal)
+# ------------------------------------------------------------------------------
+# 每次修改购物车都追加一行 JSON 到日志文件，程序崩溃或断电后重启时按日志重建购物车。
+#   - 写盘在后台线程中进行，主循环只是往队列里放一条记录，永远不会被磁盘 IO 阻塞。
+#   - 后台线程把一段时间内的记录攒成一批，写完只 fsync 一次。
+#   - 购物车清空 (清空/完成交易) 时日志直接截断为空，所以日志最长只有一位顾客的商品数。
+# ==============================================================================
+
+class CartJournal:
+    def __init__(self, path, flush_interval=0.2):
+        """
+        :param path: 日志文件路径。
+        :param flush_interval: 两次 fsync 之间的最短间隔 (秒)，断电时最多丢失这段时间内的操作。
+        """
+        self.path = path
+        self.flush_interval = flush_interval
+        self.batches = 0
+        self.records = 0
+        self._queue = queue.Queue()
+        self._file = open(path, 'a')
+        self._thread = threading.Thread(target=self._run, name="cart_journal", daemon=True)
+        self._thread.start()
+
+    @staticmethod
+    def read(path):
+        """读出日志中的所有记录；最后一行写到一半 (断电) 时忽略它。"""
+        if not os.path.exists(path):
+            return []
+        records = []
+        with open(path) as f:
+            for line in f:
+                try:
+                    records.append(json.loads(line))
+                except ValueError:
+                    break
+        return records
+
+    def append(self, record):
+        """主循环调用：放进队列立即返回。"""
+        self._queue.put_nowait(record)
+
+    def _run(self):
+        closing = False
+        while not closing:
+            batch = [self._queue.get()]
+            # 攒一小会儿，把这段时间内的操作合成一次写盘
+            time.sleep(self.flush_interval)
+            while True:
+                try:
+                    batch.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+            if None in batch:
+                closing = True
+                batch = batch[:batch.index(None)]
+            self._write(batch)
+
+    def _write(self, batch):
+        if not batch:
+            return
+        # 批次里最后一次清空之前的记录都不需要了
+        last_clear = max((i for i, r in enumerate(batch) if r['op'] == 'clear'), default=None)
+        if last_clear is not None:
+            self._file.seek(0)
+            self._file.truncate()
+            batch = batch[last_clear + 1:]
+        for record in batch:
+            self._file.write(json.dumps(record, separators=(',', ':')) + "\n")
+        self._file.flush()
+        os.fsync(self._file.fileno())
+        self.batches += 1
+        self.records += len(batch)
+
+    def close(self):
+        self._queue.put(None)
+        self._thread.join()
+        self._file.close()
+
+# ==============================================================================
+# 购物车 (Cart)
+# ==============================================================================
+
+class Cart:
+    """
+    购物车：添加、撤销、清空都是 O(1)，总价以“分”为单位增量维护，不再每帧 sum()。
+    items 的格式与原来的 shopping_cart 字典相同 ({名称: {'count': n, 'price': 单价}})，
+    可以直接交给 UIManager.draw_shopping_cart。
+    """
+    def __init__(self, journal_path=None, flush_interval=0.2):
+        """
+        :param journal_path: 日志文件路径；给出时先按日志恢复购物车，之后的修改都写入日志。
+                             None 表示不记录 (回放录像、测试时)。
+        """
+        print("🛒 Initializing Cart...")
+        self.items = {}
+        self._history = []       # 按添加顺序记录的商品名，用于撤销
+        self._total_cents = 0
+        self.version = 0         # 每次修改加一，方便调用方判断购物车是否变化
+        self.journal = None
+        if journal_path:
+            restored = self._replay(CartJournal.read(journal_path))
+            self.journal = CartJournal(journal_path, flush_interval)
+            if restored:
+                print(f"✅ Cart restored from {journal_path}: {len(self._history)} items, total ${self.total:.2f}")
+
+    # --------------------------------------------------------------------------
+    # 查询
+    # --------------------------------------------------------------------------
+    @property
+    def total(self):
+        return self._total_cents / 100.0
+
+    @property
+    def total_cents(self):
+        return self._total_cents
+
+    def __len__(self):
+        return len(self._history)
+
+    def __bool__(self):
+        return bool(self._history)
+
+    # --------------------------------------------------------------------------
+    # 修改
+    # --------------------------------------------------------------------------
+    def add(self, name, price):
+        """
+        添加一件商品，price 为单价 (元)。
+        购物车里已经有这种商品时沿用那一行的单价：运行中改了目录价格，同一行的件数、行小计、
+        总价和交易记录的单价仍然一致；这一行撤销光之后再添加才按新价格。
+        """
+        entry = self.items.get(name)
+        cents = entry['cents'] if entry is not None else int(round(price * 100))
+        self._add(name, cents)
+        self._log({'op': 'add', 'name': name, 'cents': cents})
+
+    def undo(self):
+        """撤销最近一次添加。返回被撤销的商品名，购物车为空时返回 None。"""
+        if not self._history:
+            return None
+        name = self._undo()
+        self._log({'op': 'undo'})
+        return name
+
+    def clear(self):
+        """清空购物车 (清空手势或完成交易)。"""
+        self._clear()
+        self._log({'op': 'clear'})
+
+    def _add(self, name, cents):
+        entry = self.items.get(name)
+        if entry is None:
+            self.items[name] = {'count': 1, 'price': cents / 100.0, 'cents': cents}
+        else:
+            entry['count'] += 1
+        self._history.append((name, cents))
+        self._total_cents += cents
+        self.version += 1
+
+    def _undo(self):
+        name, cents = self._history.pop()
+        entry = self.items[name]
+        entry['count'] -= 1
+        if entry['count'] == 0:
+            del self.items[name]
+        self._total_cents -= cents
+        self.version += 1
+        return name
+
+    def _clear(self):
+        self.items.clear()
+        self._history.clear()
+        self._total_cents = 0
+        self.version += 1
+
+    def _log(self, record):
+        if self.journal is not None:
+            record['ts'] = round(time.time(), 3)
+            self.journal.append(record)
+
+    def _replay(self, records):
+        for record in records:
+            op = record.get('op')
+            if op == 'add':
+                self._add(record['name'], record['cents'])
+            elif op == 'undo' and self._history:
+                self._undo()
+            elif op == 'clear':
+                self._clear()
+        return bool(records)
+
+    def close(self):
+        if self.journal is not None:
+            self.journal.close()
+
+# ==============================================================================
+# 单独测试代码
+# ==============================================================================
+# 运行 `python3 modules/cart.py`：写一份日志，再从日志恢复，检查两边一致。
+if __name__ == '__main__':
+    import tempfile
+    path = os.path.join(tempfile.mkdtemp(), "cart.jsonl")
+    cart = Cart(journal_path=path)
+    for name, price in [("Apple", 2.5), ("Banana", 1.2), ("Apple", 2.5), ("Pear", 2.0)]:
+        cart.add(name, price)
+    cart.undo()
+    start = time.perf_counter()
+    for _ in range(10000):
+        cart.add("Grape", 5.5)
+        cart.undo()
+    print(f"add + undo: {(time.perf_counter() - start) / 10000 * 1e6:.1f} us")
+    cart.close()
+    print(f"Journal: {cart.journal.records} records in {cart.journal.batches} batches")
+
+    restored = Cart(journal_path=path)
+    assert restored.items == cart.items and restored.total_cents == cart.total_cents
+    print(f"Restored cart: {restored.items}, total ${restored.total:.2f}")
+    restored.close()
@@ -0,0 +1,247 @@
+#!/usr/bin/env python3
+# modules/catalog.py
+
+# ==============================================================================
+# 导入库
+# ==============================================================================
+import csv
+import json
+import os
+import sqlite3
+import threading
+
+import numpy as np
+
+# ==============================================================================
+# 商品目录 (Catalog)
+# ------------------------------------------------------------------------------
+# 商品数据从本地文件 (CSV / JSON / SQLite) 读入，整理成一个 numpy 结构化数组，
+# 再按检测模型的类别列表预先算好 “类别ID -> 商品行号” 的索引数组：
+#   - 主循环里查价格只是两次数组下标，不再有 PRICE_LIST[fruit] 的 KeyError，
+#     模型输出了目录里没有的类别时 lookup() 返回 None。
+#   - 第一次读源文件后会写一份编译好的 .npy，之后启动直接内存映射，几千个 SKU 也是毫秒级。
+#   - 后台线程轮询源文件的修改时间，价格改了就在后台重新加载，再一次性替换快照，
+#     主循环不需要等待，也不会看到加载到一半的数据。
+# ==============================================================================
+
+CATALOG_DTYPE = np.dtype([
+    ('sku', 'U16'),
+    ('label', 'U48'),     # 与模型 labels.txt 中的类别名对应 (不区分大小写)
+    ('name', 'U48'),      # 显示和播报用的商品名
+    ('cents', '<i8'),     # 单价，以分为单位
+])
+
+
+class Product:
+    __slots__ = ('sku', 'label', 'name', 'cents')
+
+    def __init__(self, row):
+        self.sku = str(row['sku'])
+        self.label = str(row['label'])
+        self.name = str(row['name'])
+        self.cents = int(row['cents'])
+
+    @property
+    def price(self):
+        return self.cents / 100.0
+
+    def __repr__(self):
+        return f"Product({self.sku!r}, {self.name!r}, ${self.price:.2f})"
+
+# ------------------------------------------------------------------------------
+# 读取各种格式的源文件
+# ------------------------------------------------------------------------------
+
+def _rows_to_table(rows):
+    table = np.zeros(len(rows), dtype=CATALOG_DTYPE)
+    for i, row in enumerate(rows):
+        label = str(row['label']).strip().lower()
+        table[i] = (str(row.get('sku') or label), label, str(row.get('name') or label).strip(),
+                    int(round(float(row['price']) * 100)))
+    return table
+
+
+def load_source(path):
+    """按扩展名读取 CSV / JSON / SQLite 商品表，返回 CATALOG_DTYPE 数组。"""
+    ext = os.path.splitext(path)[1].lower()
+    if ext == '.csv':
+        with open(path, newline='') as f:
+            rows = list(csv.DictReader(f))
+    elif ext == '.json':
+        with open(path) as f:
+            data = json.load(f)
+        rows = data['products'] if isinstance(data, dict) else data
+    elif ext in ('.db', '.sqlite', '.sqlite3'):
+        conn = sqlite3.connect(f"file:{path}?mode=ro", uri=True)
+        try:
+            cursor = conn.execute("SELECT sku, label, name, price FROM products")
+            rows = [dict(zip(('sku', 'label', 'name', 'price'), r)) for r in cursor]
+        finally:
+            conn.close()
+    elif ext == '.npy':
+        return np.load(path, mmap_mode='r')
+    else:
+        raise ValueError(f"Unsupported catalog format: {path}")
+    return _rows_to_table(rows)
+
+
+def compiled_path(path):
+    return os.path.splitext(path)[0] + '.npy'
+
+
+def compile_catalog(path, out_path=None):
+    """把源文件编译成 .npy，之后可以直接内存映射。返回输出路径。"""
+    out_path = out_path or compiled_path(path)
+    table = load_source(path)
+    tmp = out_path + '.tmp.npy'
+    np.save(tmp, table)
+    os.replace(tmp, out_path)  # 原子替换，正在映射旧文件的进程不受影响
+    return out_path
+
+
+def load_catalog(path):
+    """
+    读取商品表：编译好的 .npy 比源文件新时直接内存映射，否则读源文件并顺便编译一份。
+    """
+    if path.endswith('.npy'):
+        return load_source(path)
+    npy = compiled_path(path)
+    if os.path.exists(npy) and os.path.getmtime(npy) >= os.path.getmtime(path):
+        return np.load(npy, mmap_mode='r')
+    table = load_source(path)
+    try:
+        tmp = npy + '.tmp.npy'
+        np.save(tmp, table)
+        os.replace(tmp, npy)
+    except OSError:
+        pass  # 目录只读时就每次读源文件
+    return table
+
+# ------------------------------------------------------------------------------
+# 快照与索引
+# ------------------------------------------------------------------------------
+
+class _Snapshot:
+    """一次加载的结果：商品表 + 类别ID索引。替换时整体替换，读者不加锁。"""
+    def __init__(self, table, labels):
+        self.table = table
+        rows = {}
+        for i, label in enumerate(table['label']):
+            rows.setdefault(str(label).lower(), i)
+        self.index = np.array([rows.get(label.strip().lower(), -1) for label in labels], dtype=np.int64)
+        self.cents = np.asarray(table['cents'])
+        self.products = {}  # 行号 -> Product，按需创建
+
+
+class Catalog:
+    """
+    商品目录。
+    - bind_labels(labels) 绑定检测模型的类别列表 (下标即 class_id)。
+    - lookup(class_id) 返回 Product，目录里没有这个类别时返回 None。
+    - start_watching() 开启热加载。
+    """
+    def __init__(self, path, labels=(), poll_interval=2.0):
+        print(f"📒 Loading product catalog from {path}...")
+        self.path = path
+        self.poll_interval = poll_interval
+        self.reloads = 0
+        self._labels = list(labels)
+        self._mtime = os.path.getmtime(path)
+        self._snapshot = _Snapshot(load_catalog(path), self._labels)
+        self._stop_event = threading.Event()
+        self._thread = None
+        missing = self.missing_labels()
+        print(f"✅ Catalog loaded: {len(self)} products" +
+              (f" (no product for labels: {', '.join(missing)})" if missing else ""))
+
+    def __len__(self):
+        return len(self._snapshot.table)
+
+    def bind_labels(self, labels):
+        self._labels = list(labels)
+        self._snapshot = _Snapshot(self._snapshot.table, self._labels)
+
+    def missing_labels(self):
+        """模型能识别、但目录里没有对应商品的类别 (background 除外)。"""
+        return [label for label, row in zip(self._labels, self._snapshot.index)
+                if row < 0 and label.strip().lower() != 'background']
+
+    def lookup(self, class_id):
+        snapshot = self._snapshot  # 只读一次引用，热加载同时发生也不会混用新旧数据
+        if not 0 <= class_id < len(snapshot.index):
+            return None
+        row = snapshot.index[class_id]
+        if row < 0:
+            return None
+        product = snapshot.products.get(row)
+        if product is None:
+            product = snapshot.products[row] = Product(snapshot.table[row])
+        return product
+
+    def price_cents(self, class_id):
+        """只要价格时的快速路径：两次数组下标。不在目录中返回 -1。"""
+        snapshot = self._snapshot
+        row = snapshot.index[class_id] if 0 <= class_id < len(snapshot.index) else -1
+        return int(snapshot.cents[row]) if row >= 0 else -1
+
+    def product_names(self):
+        return [str(name) for name in self._snapshot.table['name']]
+
+    # --------------------------------------------------------------------------
+    # 热加载
+    # --------------------------------------------------------------------------
+    def reload_if_changed(self):
+        """源文件修改过就重新加载。返回是否重新加载了。在后台线程中调用。"""
+        try:
+            mtime = os.path.getmtime(self.path)
+            if mtime == self._mtime:
+                return False
+            snapshot = _Snapshot(load_catalog(self.path), self._labels)
+        except Exception as e:
+            # 文件可能正写到一半，保留旧目录，下次轮询再试
+            print(f"[Catalog] Reload of {self.path} failed, keeping previous catalog: {e}")
+            return False
+        self._snapshot = snapshot
+        self._mtime = mtime
+        self.reloads += 1
+        print(f"[Catalog] Reloaded {self.path}: {len(snapshot.table)} products")
+        return True
+
+    def start_watching(self):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._watch, name="catalog_watcher", daemon=True)
+            self._thread.start()
+        return self
+
+    def _watch(self):
+        while not self._stop_event.wait(self.poll_interval):
+            self.reload_if_changed()
+
+    def close(self):
+        self._stop_event.set()
+        if self._thread is not None:
+            self._thread.join()
+
+# ==============================================================================
+# 命令行工具
+# ==============================================================================
+# 用法: python3 modules/catalog.py catalog.csv [--labels models/fruit/labels.txt]
+# 编译 .npy 并检查模型的每个类别是否都有对应商品。
+if __name__ == '__main__':
+    import argparse
+    import time
+
+    parser = argparse.ArgumentParser(description="Compile and check the product catalog.")
+    parser.add_argument('catalog')
+    parser.add_argument('--labels', action='append', default=[], help="labels.txt to check against (repeatable)")
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    out = compile_catalog(args.catalog)
+    print(f"Compiled {args.catalog} -> {out} in {(time.perf_counter() - start) * 1000:.1f} ms")
+    for labels_path in args.labels:
+        with open(labels_path) as f:
+            labels = [line.strip() for line in f if line.strip()]
+        catalog = Catalog(args.catalog, labels)
+        for class_id, label in enumerate(labels):
+            print(f"  {class_id:3d} {label:<16} -> {catalog.lookup(class_id)}")
@@ -0,0 +1,157 @@
+#!/usr/bin/env python3
+# modules/checkout_state.py
+
+# ==============================================================================
+# 导入库
+# ==============================================================================
+import time
+
+from gesture_events import GESTURE_HOLD, GESTURE_START
+from voice_announcer import PRIORITY_NORMAL, PRIORITY_URGENT
+
+# ==============================================================================
+# 收银状态机 (CheckoutStateMachine)
+# ------------------------------------------------------------------------------
+# 原来写在 main.py 主循环里的交互逻辑，抽出来以后单收银台和多路收银台共用：
+#   购物模式：新确认的水果轨迹自动加入购物车；张开手掌撤销、点赞清空、指向结账。
+#   结账模式：显示二维码，点赞表示交易完成，清空购物车迎接下一位顾客。
+# 手势操作由 GestureEventEngine 的事件驱动 (投票确认过的 start / hold)，而不是某一帧的识别结果，
+# 所以一帧认错不会误操作，也不需要固定的冷却时间。
+# 所有时间都用画面的采集时间 (now)，回放录像时结果与实时运行一致。
+# 给了 transaction_log 时，每笔完成的交易连同用时、撤销/清空次数一起写入交易记录。
+# ==============================================================================
+
+class CheckoutStateMachine:
+    def __init__(self, cart, catalog, say, on_reset=None,
+                 metrics=None, metric_labels=None, announce_prefix="", transaction_log=None, lane="Lane 1"):
+        """
+        :param cart: Cart 实例。
+        :param catalog: Catalog 实例，把轨迹的类别ID换成商品。
+        :param say: 播报函数，签名同 voice_announcer.say。
+        :param on_reset: 购物车被清空时调用 (例如重置水果追踪器，让画面中的水果重新计数)。
+        :param metrics: 可选的 MetricsRegistry。
+        :param metric_labels: 附加在指标上的标签，例如 {'lane': 'Lane 1'}。
+        :param announce_prefix: 播报前缀，多路收银台模式下区分是哪一台。
+        :param transaction_log: 可选的 TransactionLog，记录完成的交易。
+        :param lane: 写入交易记录的收银台名称。
+        """
+        self.cart = cart
+        self.catalog = catalog
+        self._say = say
+        self._on_reset = on_reset
+        self.announce_prefix = announce_prefix
+        self.checkout_mode = False      # “开关”：是否为结账模式
+
+        # 当前这位顾客的交易统计 (第一件商品加入时开始，完成交易时写入记录；
+        # 购物车被撤销或清空到空时作废，下一件商品重新开始计时，不会算到下一位顾客头上)
+        self.transaction_log = transaction_log
+        self.lane = lane
+        self._started = None            # 第一件商品加入的画面时间
+        self._checkout_started = None   # 进入结账模式的画面时间
+        self._undo_count = 0
+        self._clear_count = 0
+
+        self._metrics = metrics
+        self._metric_labels = dict(metric_labels or {})
+        self._items_added = None
+        if metrics is not None:
+            self._items_added = metrics.counter("items_added_total", "Items automatically added to the cart",
+                                                self._metric_labels or None)
+
+    def _announce(self, text, priority=PRIORITY_NORMAL, key=None, count=1):
+        self._say(text, priority, key=key, count=count, prefix=self.announce_prefix)
+
+    def _count_action(self, action):
+        if self._metrics is not None:
+            labels = dict(self._metric_labels, action=action)
+            self._metrics.counter("gesture_actions_total", "Cart actions triggered by gestures", labels).inc()
+
+    def _reset(self):
+        # 重置所有状态，为下一位顾客准备
+        self.cart.clear()
+        if self._on_reset is not None:
+            self._on_reset()
+
+    def _finish_transaction(self, now):
+        """把购物车里的商品作为一笔完成的交易写入记录，然后重置统计。"""
+        if self.transaction_log is not None and self.cart and self._started is not None:
+            # 画面时间只用来算时长，写入的时间戳以当前的墙上时间为准
+            wall = time.time()
+            items = [(name, entry['count'], entry['cents']) for name, entry in self.cart.items.items()]
+            checkout_at = wall - (now - self._checkout_started) if self._checkout_started is not None else None
+            self.transaction_log.record(self.lane, items, wall - (now - self._started), wall, checkout_at=checkout_at,
+                                        undo_count=self._undo_count, clear_count=self._clear_count)
+        self._reset_stats()
+
+    def _reset_stats(self):
+        self._started = self._checkout_started = None
+        self._undo_count = self._clear_count = 0
+
+    def update(self, now, gesture_events, new_tracks):
+        """
+        处理一帧的输入。
+        :param now: 画面采集时间。
+        :param gesture_events: 本帧的手势事件 (GestureEventEngine.push 的返回值)。
+        :param new_tracks: 本帧新确认的水果轨迹 (每条轨迹计一件商品)。
+        """
+        # --- 购物模式：自动添加商品 ---
+        # 目录里没有的类别 (background、未上架的商品) 直接跳过
+        if not self.checkout_mode:
+            new_products = [self.catalog.lookup(track.class_id) for track in new_tracks]
+            new_products = [product for product in new_products if product is not None]
+            if new_products:
+                if self._started is None:
+                    self._started = now
+                # 一次出现多个时直接念数量；来不及念的 "X added" 会在语音队列里合并成 "N items added"
+                if len(new_products) == 1:
+                    self._announce(f"{new_products[0].name} added.", key='added')
+                else:
+                    self._announce(f"{len(new_products)} items added.", key='added', count=len(new_products))
+                for product in new_products:
+                    self.cart.add(product.name, product.price)  # 数量加一，同时记入撤销历史和日志
+                    if self._items_added is not None:
+                        self._items_added.inc()
+
+        for event in gesture_events:
+            self._on_gesture(event, now)
+
+        if not self.cart:
+            self._reset_stats()
+        elif self._started is None:
+            self._started = now   # 从购物车日志恢复的购物车：从重启后的第一帧开始计时
+
+    def _on_gesture(self, event, now):
+        gesture, started = event.gesture, event.kind == GESTURE_START
+        held = event.kind == GESTURE_HOLD
+
+        # --- 状态一: 结账模式 (Checkout Mode) ---
+        if self.checkout_mode:
+            # 点赞完成交易；只认手势开始，一直举着不会把下一位顾客的购物车也清掉
+            if gesture == "thumb_up" and started:
+                self._announce("Thank you. Cart is now clear.", PRIORITY_URGENT, key='checkout')
+                self._count_action('finish')
+                self._finish_transaction(now)
+                self._reset()
+                self.checkout_mode = False
+            return
+
+        # --- 状态二: 购物模式 (Shopping Mode) ---
+        if not self.cart:
+            return
+        if gesture == "pointing" and (started or held):
+            # 先指向、后放水果时，保持指向的 hold 事件也能进入结账
+            self._announce(f"Total price is {self.cart.total:.2f} dollars. Please scan to pay.", PRIORITY_URGENT, key='checkout')
+            self.checkout_mode = True  # 切换到结账模式
+            self._checkout_started = now
+            self._count_action('checkout')
+        elif gesture == "thumb_up" and started:
+            self._announce("Cart cleared.", PRIORITY_URGENT, key='checkout')
+            self._count_action('clear')
+            self._clear_count += 1
+            self._reset()
+        elif gesture == "open_palm" and (started or held):
+            # 保持张开手掌时每个 hold 事件再撤销一件，像按住键盘连发
+            last_added = self.cart.undo()
+            self._announce(f"Undo {last_added}.", key='undo')
+            self._count_action('undo')
+            self._undo_count += 1
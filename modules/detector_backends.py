@@ -0,0 +1,354 @@
+#!/usr/bin/env python3
+# modules/detector_backends.py
+
+# ==============================================================================
+# 导入必要的库
+# ==============================================================================
+# 注意：这里不在模块顶层导入 jetson.inference / OpenCV / onnxruntime，
+# 各个后端在创建时才导入自己需要的库：
+# - Jetson 上不会加载 OpenCV (会和 jetson.inference 冲突)；
+# - x86 服务器上没有 jetson.inference 也能运行 CPU 后端。
+import collections
+import time
+
+import numpy as np
+
+# ==============================================================================
+# 检测结果 (Detection)
+# ==============================================================================
+
+class Detection:
+    """
+    与 jetson.inference.detectNet.Detection 字段一致的检测结果，
+    main.py 和追踪器只依赖这些字段，所以所有后端可以互换。
+    """
+    def __init__(self, class_id, confidence, left, top, right, bottom):
+        self.ClassID = int(class_id)
+        self.Confidence = float(confidence)
+        self.Left = float(left)
+        self.Top = float(top)
+        self.Right = float(right)
+        self.Bottom = float(bottom)
+
+    @property
+    def Width(self):
+        return self.Right - self.Left
+
+    @property
+    def Height(self):
+        return self.Bottom - self.Top
+
+    @property
+    def Area(self):
+        return self.Width * self.Height
+
+    @property
+    def Center(self):
+        return ((self.Left + self.Right) / 2.0, (self.Top + self.Bottom) / 2.0)
+
+    def __repr__(self):
+        return (f"Detection(ClassID={self.ClassID}, Confidence={self.Confidence:.3f}, "
+                f"box=({self.Left:.1f}, {self.Top:.1f}, {self.Right:.1f}, {self.Bottom:.1f}))")
+
+
+def load_labels(labels_path):
+    """读取 labels.txt，每行一个类别名。"""
+    with open(labels_path) as f:
+        return [line.strip() for line in f if line.strip()]
+
+# ==============================================================================
+# 向量化的框解码与 NMS
+# ==============================================================================
+
+def decode_ssd_locations(locations, priors, center_variance=0.1, size_variance=0.2):
+    """
+    把 SSD 回归输出 (相对先验框的偏移) 解码成归一化的角点坐标。
+    只有导出时没带解码层的模型才需要这一步。
+    :param locations: (..., N, 4) 的 (dx, dy, dw, dh)。
+    :param priors: (N, 4) 的 (cx, cy, w, h)，归一化坐标。
+    :return: (..., N, 4) 的 (left, top, right, bottom)，归一化坐标。
+    """
+    centers = locations[..., :2] * center_variance * priors[:, 2:] + priors[:, :2]
+    sizes = np.exp(locations[..., 2:] * size_variance) * priors[:, 2:]
+    return np.concatenate([centers - sizes / 2, centers + sizes / 2], axis=-1)
+
+
+def nms(boxes, scores, iou_threshold, max_detections):
+    """
+    贪心 NMS，每一步用向量化的 IoU 一次性去掉所有重叠框。
+    :return: 保留下来的下标 (按分数从高到低)。
+    """
+    order = np.argsort(-scores)
+    areas = (boxes[:, 2] - boxes[:, 0]) * (boxes[:, 3] - boxes[:, 1])
+    keep = []
+    while order.size and len(keep) < max_detections:
+        best = order[0]
+        keep.append(best)
+        rest = order[1:]
+        left = np.maximum(boxes[best, 0], boxes[rest, 0])
+        top = np.maximum(boxes[best, 1], boxes[rest, 1])
+        right = np.minimum(boxes[best, 2], boxes[rest, 2])
+        bottom = np.minimum(boxes[best, 3], boxes[rest, 3])
+        inter = np.clip(right - left, 0, None) * np.clip(bottom - top, 0, None)
+        iou = inter / np.maximum(areas[best] + areas[rest] - inter, 1e-6)
+        order = rest[iou <= iou_threshold]
+    return np.array(keep, dtype=np.int64)
+
+
+def postprocess(scores, boxes, width, height, threshold, iou_threshold=0.45, max_detections=100):
+    """
+    单张图的后处理：按类别阈值筛选 + 按类别 NMS，输出 Detection 列表。
+    :param scores: (N, C) softmax 后的类别分数，第 0 类是背景。
+    :param boxes: (N, 4) 归一化角点坐标。
+    """
+    # 一次性找出所有 (先验框, 类别) 里超过阈值的组合，背景类不参与
+    prior_idx, class_idx = np.nonzero(scores[:, 1:] > threshold)
+    if prior_idx.size == 0:
+        return []
+    class_idx = class_idx + 1
+    cand_scores = scores[prior_idx, class_idx]
+    cand_boxes = np.clip(boxes[prior_idx], 0.0, 1.0) * np.array([width, height, width, height], dtype=np.float32)
+
+    # 按类别 NMS 的常用技巧：给每个类别的框加一个足够大的偏移，一次 NMS 就能分开处理
+    offsets = (class_idx * (max(width, height) + 1)).astype(np.float32)[:, None]
+    keep = nms(cand_boxes + offsets, cand_scores, iou_threshold, max_detections)
+    return [Detection(class_idx[i], cand_scores[i], *cand_boxes[i]) for i in keep]
+
+# ==============================================================================
+# Jetson 后端 (TensorRT, GPU)
+# ==============================================================================
+
+# JetsonBackend.crop() 最多保留几种尺寸的裁剪缓冲区
+CROP_POOL_SIZE = 8
+
+
+class JetsonBackend:
+    """封装 jetson.inference.detectNet，所有计算都在 GPU 上完成。"""
+    name = 'jetson'
+
+    def __init__(self, model_path, labels_path, threshold=0.8, engine_cache=True):
+        """
+        :param engine_cache: True 表示自动管理 TensorRT engine 缓存；也可以传入一个
+                             已经 prepare() 过的 EngineCache，False 表示不管理。
+        """
+        import jetson.inference
+        import jetson.utils
+        from engine_cache import EngineCache
+        self._utils = jetson.utils
+        self._crop_buffers = collections.OrderedDict()   # (宽, 高, 格式) -> CUDA 图像，最近使用的在后
+        # 用参数列表模拟命令行参数，配置模型的加载方式
+        argv = [
+            f"--model={model_path}",     # 指定ONNX模型文件的位置
+            f"--labels={labels_path}",    # 指定标签文件的位置
+            "--input-blob=input_0",      # 告诉网络输入的节点名称 (通常在模型转换时定义)
+            "--output-cvg=scores",     # 告诉网络输出分数的节点名称
+            "--output-bbox=boxes"      # 告诉网络输出边界框的节点名称
+        ]
+        # 当第一次运行的时候：解析ONNX、TensorRT优化、生成Engine
+        # 当第二次及以后运行时，直接加载缓存的Engine文件，推理会非常快
+        # EngineCache 会先把别的板子上生成的 engine 移走，避免 TensorRT 加载失败
+        if engine_cache is True:
+            engine_cache = EngineCache(model_path)
+        self.engine_cache = engine_cache or None
+        if self.engine_cache is not None and self.engine_cache.status is None:
+            self.engine_cache.prepare()
+        try:
+            self.net = jetson.inference.detectNet(argv=argv, threshold=threshold)
+        except Exception as e:
+            if self.engine_cache is None or self.engine_cache.status == EngineCache.REBUILD:
+                raise
+            # 清单对得上但 engine 依然加载失败 (文件损坏等)：删掉后重新优化一次
+            print(f"[JetsonBackend] Cached engine failed to load ({e}), rebuilding...")
+            self.engine_cache.invalidate()
+            self.net = jetson.inference.detectNet(argv=argv, threshold=threshold)
+        if self.engine_cache is not None:
+            self.engine_cache.commit()
+
+    def detect(self, img, overlay='box,labels,conf'):
+        return self.net.Detect(img, overlay=overlay)
+
+    def detect_batch(self, imgs, overlay='box,labels,conf'):
+        # detectNet 的 Python 接口一次只接受一张图，逐张送入 (都在 GPU 上，开销很小)
+        return [self.net.Detect(img, overlay=overlay) for img in imgs]
+
+    def draw_rect(self, img, box, class_id):
+        self._utils.cudaDrawRect(img, box, self.net.GetClassColor(class_id))
+
+    def crop(self, img, roi):
+        """
+        在 GPU 上裁剪出 roi = (left, top, right, bottom) 区域 (级联检测用)。
+        返回的缓冲区按尺寸复用 (级联会把区域边长取整，尺寸种类很少)，下一次同尺寸的 crop() 会覆盖它。
+        """
+        left, top, right, bottom = roi
+        key = (right - left, bottom - top, img.format)
+        out = self._crop_buffers.pop(key, None)
+        if out is None:
+            out = self._utils.cudaAllocMapped(width=key[0], height=key[1], format=img.format)
+            while len(self._crop_buffers) >= CROP_POOL_SIZE:
+                self._crop_buffers.popitem(last=False)   # 最久没用的尺寸
+        self._crop_buffers[key] = out
+        self._utils.cudaCrop(img, out, roi)
+        return out
+
+    def get_class_desc(self, class_id):
+        return self.net.GetClassDesc(class_id)
+
+    def get_network_fps(self):
+        return self.net.GetNetworkFPS()
+
+# ==============================================================================
+# CPU 后端 (ONNX Runtime 或 OpenCV DNN)
+# ==============================================================================
+
+class CpuBackend:
+    """
+    在没有 GPU 的 x86 服务器上运行同一个 ssd-mobilenet.onnx，用于测试和基准测试。
+    - 支持多帧批量推理 (detect_batch)。
+    - 框解码和 NMS 都用 Numpy 向量化完成。
+    - 输入为 Numpy 图像 (RGB 或 RGBA)。
+    """
+    name = 'cpu'
+
+    def __init__(self, model_path, labels_path, threshold=0.8, runtime='auto', input_size=300,
+                 mean=127.0, std=128.0, iou_threshold=0.45, max_detections=100, priors=None):
+        """
+        :param runtime: 'onnxruntime'、'opencv' 或 'auto' (优先 onnxruntime)。
+        :param input_size: 网络输入边长，ssd-mobilenet 为 300。
+        :param mean/std: 与 jetson-inference 中 SSD-Mobilenet ONNX 的预处理一致。
+        :param priors: 模型输出未解码的偏移量时，提供 (N, 4) 先验框用于解码；
+                       train_ssd.py 导出的模型已经带解码层，保持 None 即可。
+        """
+        import cv2
+        self._cv2 = cv2
+        self.labels = load_labels(labels_path)
+        self.threshold = threshold
+        self.input_size = input_size
+        self.mean = mean
+        self.std = std
+        self.iou_threshold = iou_threshold
+        self.max_detections = max_detections
+        self.priors = priors
+        self._fps = 0.0
+        self._colors = self._make_colors(len(self.labels))
+
+        self.runtime = runtime
+        if runtime in ('auto', 'onnxruntime'):
+            try:
+                import onnxruntime
+                self._session = onnxruntime.InferenceSession(model_path, providers=['CPUExecutionProvider'])
+                self._input_name = self._session.get_inputs()[0].name
+                self._output_names = [o.name for o in self._session.get_outputs()]
+                self.runtime = 'onnxruntime'
+            except ImportError:
+                if runtime == 'onnxruntime':
+                    raise
+                self.runtime = 'opencv'
+        if self.runtime == 'opencv':
+            self._dnn = cv2.dnn.readNetFromONNX(model_path)
+            self._dnn.setPreferableBackend(cv2.dnn.DNN_BACKEND_OPENCV)
+            self._dnn.setPreferableTarget(cv2.dnn.DNN_TARGET_CPU)
+            self._output_names = list(self._dnn.getUnconnectedOutLayersNames())
+
+    @staticmethod
+    def _make_colors(count):
+        # 固定种子，让同一类别每次颜色相同
+        rng = np.random.RandomState(7)
+        return [tuple(int(c) for c in rng.randint(64, 256, 3)) for _ in range(count)]
+
+    def _preprocess(self, imgs):
+        size = (self.input_size, self.input_size)
+        batch = np.empty((len(imgs), 3, self.input_size, self.input_size), dtype=np.float32)
+        for i, img in enumerate(imgs):
+            resized = self._cv2.resize(img[..., :3], size)
+            batch[i] = resized.transpose(2, 0, 1)
+        batch -= self.mean
+        batch /= self.std
+        return batch
+
+    def _infer(self, batch):
+        if self.runtime == 'onnxruntime':
+            outputs = self._session.run(self._output_names, {self._input_name: batch})
+        else:
+            self._dnn.setInput(batch)
+            outputs = self._dnn.forward(self._output_names)
+        named = dict(zip(self._output_names, outputs))
+        scores = named.get('scores', outputs[0])
+        boxes = named.get('boxes', outputs[1])
+        if self.priors is not None:
+            boxes = decode_ssd_locations(boxes, self.priors)
+        return scores, boxes
+
+    def detect(self, img, overlay='box,labels,conf'):
+        return self.detect_batch([img], overlay)[0]
+
+    def detect_batch(self, imgs, overlay='box,labels,conf'):
+        """一次推理多帧，返回每帧的 Detection 列表。"""
+        if not imgs:
+            return []
+        start = time.perf_counter()
+        scores, boxes = self._infer(self._preprocess(imgs))
+        elapsed = time.perf_counter() - start
+        self._fps = len(imgs) / elapsed if elapsed > 0 else 0.0
+
+        results = []
+        for i, img in enumerate(imgs):
+            h, w = img.shape[:2]
+            detections = postprocess(scores[i], boxes[i], w, h, self.threshold,
+                                     self.iou_threshold, self.max_detections)
+            if overlay and overlay != 'none':
+                self._draw_overlay(img, detections, overlay)
+            results.append(detections)
+        return results
+
+    def _draw_overlay(self, img, detections, overlay):
+        for det in detections:
+            color = self._colors[det.ClassID % len(self._colors)]
+            p1, p2 = (int(det.Left), int(det.Top)), (int(det.Right), int(det.Bottom))
+            if 'box' in overlay:
+                self._cv2.rectangle(img, p1, p2, color, 2)
+            text = []
+            if 'labels' in overlay:
+                text.append(self.get_class_desc(det.ClassID))
+            if 'conf' in overlay:
+                text.append(f"{det.Confidence * 100:.1f}%")
+            if text:
+                self._cv2.putText(img, " ".join(text), (p1[0] + 2, p1[1] + 16),
+                                  self._cv2.FONT_HERSHEY_SIMPLEX, 0.5, color, 1)
+
+    def draw_rect(self, img, box, class_id):
+        color = self._colors[class_id % len(self._colors)]
+        left, top, right, bottom = (int(v) for v in box)
+        self._cv2.rectangle(img, (left, top), (right, bottom), color, 2)
+
+    def crop(self, img, roi):
+        """裁剪 roi = (left, top, right, bottom) 区域，返回视图 (预处理时 resize 会拷贝)。"""
+        left, top, right, bottom = roi
+        return img[top:bottom, left:right]
+
+    def get_class_desc(self, class_id):
+        return self.labels[class_id] if 0 <= class_id < len(self.labels) else str(class_id)
+
+    def get_network_fps(self):
+        return self._fps
+
+# ==============================================================================
+# 后端工厂
+# ==============================================================================
+
+BACKENDS = {
+    'jetson': JetsonBackend,
+    'cpu': CpuBackend,
+}
+
+
+def create_backend(name, model_path, labels_path, threshold=0.8, **kwargs):
+    """按名字创建后端。'auto' 表示有 jetson.inference 时用 GPU，否则用 CPU。"""
+    if name == 'auto':
+        try:
+            import jetson.inference  # noqa: F401
+            name = 'jetson'
+        except ImportError:
+            name = 'cpu'
+    if name not in BACKENDS:
+        raise ValueError(f"Unknown detector backend '{name}', expected one of {sorted(BACKENDS)}")
+    return BACKENDS[name](model_path, labels_path, threshold=threshold, **kwargs)
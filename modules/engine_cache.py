@@ -0,0 +1,272 @@
+#!/usr/bin/env python3
+# modules/engine_cache.py
+
+# ==============================================================================
+# 导入库
+# ==============================================================================
+import glob
+import hashlib
+import json
+import os
+import platform
+import shutil
+import threading
+import time
+
+# ==============================================================================
+# 设备与版本信息
+# ==============================================================================
+# TensorRT 的 engine 文件只能在“同一型号设备 + 同一 TensorRT 版本 + 同一精度”下使用，
+# 这三项加上模型文件本身的哈希，共同决定一个 engine 是否可以复用。
+
+def file_sha256(path, chunk_size=1 << 20):
+    sha = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(chunk_size), b''):
+            sha.update(chunk)
+    return sha.hexdigest()
+
+
+def tensorrt_version():
+    try:
+        import tensorrt
+        return tensorrt.__version__
+    except ImportError:
+        pass
+    # 没有 Python 版 TensorRT 时，从 JetPack 的头文件里读版本号
+    header = '/usr/include/aarch64-linux-gnu/NvInferVersion.h'
+    if os.path.exists(header):
+        parts = {}
+        with open(header) as f:
+            for line in f:
+                for name in ('NV_TENSORRT_MAJOR', 'NV_TENSORRT_MINOR', 'NV_TENSORRT_PATCH'):
+                    if line.startswith(f'#define {name} '):
+                        parts[name] = line.split()[2]
+        if len(parts) == 3:
+            return '.'.join(parts[n] for n in ('NV_TENSORRT_MAJOR', 'NV_TENSORRT_MINOR', 'NV_TENSORRT_PATCH'))
+    return 'unknown'
+
+
+def device_model():
+    """返回设备型号 (例如 'NVIDIA Jetson Nano Developer Kit')，非 Jetson 设备返回机器架构。"""
+    try:
+        with open('/proc/device-tree/model') as f:
+            return f.read().strip('\x00 \n')
+    except OSError:
+        return platform.machine()
+
+# ==============================================================================
+# Engine 缓存管理 (EngineCache)
+# ==============================================================================
+
+class EngineCache:
+    """
+    管理一个 ONNX 模型对应的 TensorRT engine 文件。
+    - jetson.inference 会把 engine 存在模型旁边：<model>.<trt版本>.<设备>.<精度>.engine。
+    - 旁边再放一个清单文件 <model>.engine.json，记录这个 engine 是在什么条件下生成的。
+    - 条件不一致 (换了板子/升级了 JetPack/换了模型) 时，旧 engine 会被移进按 key 分类的
+      缓存目录，而不是直接删除；换回原来的设备时可以直接恢复，免去重新优化。
+    """
+    VALID = 'valid'        # 模型旁边的 engine 可以直接使用
+    RESTORED = 'restored'  # 从缓存目录恢复了匹配的 engine
+    REBUILD = 'rebuild'    # 没有可用的 engine，加载时 TensorRT 会重新优化 (耗时数分钟)
+
+    def __init__(self, model_path, precision='FP16', cache_dir=None):
+        self.model_path = model_path
+        self.precision = precision
+        self.cache_dir = cache_dir or os.path.join(os.path.dirname(os.path.abspath(model_path)), '.engine_cache')
+        self.manifest_path = model_path + '.engine.json'
+        self.status = None
+        self._key = None
+
+    @property
+    def key(self):
+        if self._key is None:
+            identity = '|'.join([file_sha256(self.model_path), self.precision, device_model(), tensorrt_version()])
+            self._key = hashlib.sha256(identity.encode()).hexdigest()[:16]
+        return self._key
+
+    def _engine_files(self):
+        return sorted(glob.glob(glob.escape(self.model_path) + '.*.engine'))
+
+    def _read_manifest(self):
+        try:
+            with open(self.manifest_path) as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {}
+
+    def _stash(self, files, key):
+        """把 engine 文件移到 cache_dir/<key>/ 下。"""
+        target = os.path.join(self.cache_dir, key)
+        os.makedirs(target, exist_ok=True)
+        for path in files:
+            shutil.move(path, os.path.join(target, os.path.basename(path)))
+
+    def _is_valid(self, engines, manifest):
+        return bool(engines) and manifest.get('key') == self.key and all(os.path.getsize(p) > 0 for p in engines)
+
+    def check(self):
+        """
+        只查看、不做任何改动：返回 prepare() 会得到的状态 (RESTORED 表示缓存目录里有匹配的 engine 可以恢复)。
+        :return: VALID / RESTORED / REBUILD 之一。
+        """
+        if self._is_valid(self._engine_files(), self._read_manifest()):
+            return self.VALID
+        if glob.glob(os.path.join(self.cache_dir, self.key, '*.engine')):
+            return self.RESTORED
+        return self.REBUILD
+
+    def prepare(self):
+        """
+        在加载模型之前调用。保证模型旁边只留下与当前设备匹配的 engine。
+        会移动/复制 engine 文件、改写清单；只想查看状态时用 check()。
+        :return: VALID / RESTORED / REBUILD 之一。
+        """
+        engines = self._engine_files()
+        manifest = self._read_manifest()
+        if self._is_valid(engines, manifest):
+            self.status = self.VALID
+            return self.status
+
+        if engines:
+            # 来历不明或属于别的设备的 engine：先收起来，不让 TensorRT 去加载它
+            stale_key = manifest.get('key') or 'unknown-' + time.strftime('%Y%m%d%H%M%S')
+            print(f"[EngineCache] Stashing foreign engine(s) for {os.path.basename(self.model_path)} ({stale_key})")
+            self._stash(engines, stale_key)
+            self._remove_manifest()
+
+        cached = sorted(glob.glob(os.path.join(self.cache_dir, self.key, '*.engine')))
+        if cached:
+            model_dir = os.path.dirname(os.path.abspath(self.model_path))
+            for path in cached:
+                shutil.copy2(path, os.path.join(model_dir, os.path.basename(path)))
+            self._write_manifest()
+            self.status = self.RESTORED
+        else:
+            self.status = self.REBUILD
+        return self.status
+
+    def commit(self):
+        """模型成功加载后调用：记录清单，并在缓存目录里备份一份。"""
+        engines = self._engine_files()
+        if not engines:
+            return
+        self._write_manifest()
+        target = os.path.join(self.cache_dir, self.key)
+        os.makedirs(target, exist_ok=True)
+        for path in engines:
+            backup = os.path.join(target, os.path.basename(path))
+            if not os.path.exists(backup) or os.path.getsize(backup) != os.path.getsize(path):
+                shutil.copy2(path, backup)
+
+    def invalidate(self):
+        """加载失败时调用：删除模型旁边的 engine (以及缓存中同 key 的备份)，下次重新优化。"""
+        for path in self._engine_files():
+            os.remove(path)
+        shutil.rmtree(os.path.join(self.cache_dir, self.key), ignore_errors=True)
+        self._remove_manifest()
+        self.status = self.REBUILD
+
+    def _write_manifest(self):
+        manifest = {
+            'key': self.key,
+            'precision': self.precision,
+            'device': device_model(),
+            'tensorrt': tensorrt_version(),
+            'engines': [os.path.basename(p) for p in self._engine_files()],
+            'created': time.strftime('%Y-%m-%d %H:%M:%S'),
+        }
+        with open(self.manifest_path, 'w') as f:
+            json.dump(manifest, f, indent=2)
+
+    def _remove_manifest(self):
+        if os.path.exists(self.manifest_path):
+            os.remove(self.manifest_path)
+
+# ==============================================================================
+# 后台加载 (BackgroundLoader)
+# ==============================================================================
+
+class BackgroundLoader:
+    """
+    在后台线程中执行一个耗时的初始化函数 (例如加载/重新优化检测模型)，
+    主线程可以同时显示预热画面。
+    """
+    def __init__(self, target, name="loader"):
+        self.result = None
+        self.error = None
+        self.started = time.monotonic()
+        self._target = target
+        self._done = threading.Event()
+        self._thread = threading.Thread(target=self._run, name=name, daemon=True)
+        self._thread.start()
+
+    def _run(self):
+        try:
+            self.result = self._target()
+        except Exception as e:
+            self.error = e
+        finally:
+            self._done.set()
+
+    @property
+    def done(self):
+        return self._done.is_set()
+
+    @property
+    def elapsed(self):
+        return time.monotonic() - self.started
+
+    def get(self, timeout=None):
+        """等待加载完成并返回结果；加载失败时抛出原来的异常。"""
+        self._done.wait(timeout)
+        if self.error is not None:
+            raise self.error
+        return self.result
+
+# ==============================================================================
+# 命令行：部署时预先生成所有模型的 engine
+# ==============================================================================
+# 用法: python3 modules/engine_cache.py [--models models] [--status] [--force]
+if __name__ == '__main__':
+    import argparse
+    import sys
+
+    sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+    parser = argparse.ArgumentParser(description="Pre-build TensorRT engines for every model under models/.")
+    parser.add_argument('--models', default=os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'models'))
+    parser.add_argument('--precision', default='FP16')
+    parser.add_argument('--status', action='store_true', help="only report cache status, do not build")
+    parser.add_argument('--force', action='store_true', help="discard existing engines and rebuild")
+    args = parser.parse_args()
+    if args.status and args.force:
+        parser.error("--status only reports and cannot be combined with --force")
+
+    model_paths = sorted(glob.glob(os.path.join(args.models, '*', '*.onnx')))
+    if not model_paths:
+        print(f"No ONNX models found under {args.models}")
+    failures = 0
+    for model_path in model_paths:
+        labels_path = os.path.join(os.path.dirname(model_path), 'labels.txt')
+        cache = EngineCache(model_path, precision=args.precision)
+        if args.status:
+            # 只报告：不移动、不复制任何 engine，也不改写清单
+            print(f"{model_path}: {cache.check()} (key {cache.key})")
+            continue
+        if args.force:
+            cache.invalidate()
+        status = cache.prepare()
+        print(f"{model_path}: {status} (key {cache.key})")
+        if status == EngineCache.VALID:
+            continue
+        start = time.monotonic()
+        try:
+            from object_detector import ObjectDetector
+            ObjectDetector(model_path, labels_path, backend='jetson', engine_cache=cache)
+            print(f"  engine ready in {time.monotonic() - start:.0f}s")
+        except Exception as e:
+            failures += 1
+            print(f"  [ERROR] failed to build engine: {e}")
+    sys.exit(1 if failures else 0)
@@ -0,0 +1,80 @@
+#!/usr/bin/env python3
+# modules/frame_buffers.py
+
+# ==============================================================================
+# 导入库
+# ==============================================================================
+import cv2
+import numpy as np
+
+# ==============================================================================
+# 预分配缓冲区池 (FrameBufferPool)
+# ==============================================================================
+
+class FrameBufferPool:
+    """
+    按名字管理预先分配好的图像缓冲区。主循环里的 cvtColor/flip 都用 dst= 写进这些缓冲区，
+    分辨率不变时每帧零分配；只有形状变了 (换摄像头/换录像) 才重新分配。
+    """
+    def __init__(self):
+        self._buffers = {}
+        self.allocations = 0
+
+    def get(self, name, shape, dtype=np.uint8):
+        buf = self._buffers.get(name)
+        if buf is None or buf.shape != tuple(shape) or buf.dtype != dtype:
+            buf = np.empty(shape, dtype=dtype)
+            self._buffers[name] = buf
+            self.allocations += 1
+        return buf
+
+    def nbytes(self):
+        return sum(buf.nbytes for buf in self._buffers.values())
+
+# ==============================================================================
+# 手势画面预处理 (HandFramePreprocessor)
+# ==============================================================================
+
+class HandFramePreprocessor:
+    """
+    每个手势帧只做一次颜色转换 + 镜像，结果同时交给手部追踪和界面显示。
+    返回的是池里的缓冲区，slots 次 process() 之后会被覆盖
+    (流水线模式下几帧同时在不同阶段中，要给每帧一个自己的缓冲区)。
+    """
+    def __init__(self, pool=None, name="hand", slots=1):
+        self.pool = pool or FrameBufferPool()
+        self.name = name
+        self.slots = slots
+        self._next = 0
+
+    def process(self, np_img):
+        """
+        :param np_img: 摄像头画面 (RGBA 或 RGB)。
+        :return: 镜像后的 RGB 图像 (预分配的缓冲区)。
+        """
+        h, w = np_img.shape[:2]
+        name = self.name if self.slots == 1 else f"{self.name}{self._next}"
+        self._next = (self._next + 1) % self.slots
+        rgb = self.pool.get(name, (h, w, 3))
+        if np_img.shape[2] == 4:
+            cv2.cvtColor(np_img, cv2.COLOR_RGBA2RGB, dst=rgb)
+            cv2.flip(rgb, 1, dst=rgb)  # OpenCV 的水平翻转支持原地操作
+        else:
+            cv2.flip(np_img, 1, dst=rgb)
+        return rgb
+
+# ==============================================================================
+# 单独测试代码
+# ==============================================================================
+# 运行 `python3 modules/frame_buffers.py`，确认与原来的 cvtColor + flip 结果一致且不再分配内存。
+if __name__ == '__main__':
+    import time
+    frame = np.random.randint(0, 255, (240, 320, 4), dtype=np.uint8)
+    prep = HandFramePreprocessor()
+    expected = cv2.flip(cv2.cvtColor(frame, cv2.COLOR_RGBA2RGB), 1)
+    assert np.array_equal(prep.process(frame), expected)
+    start = time.perf_counter()
+    for _ in range(1000):
+        prep.process(frame)
+    elapsed = (time.perf_counter() - start) / 1000
+    print(f"process(): {elapsed * 1e6:.1f} us/frame, allocations: {prep.pool.allocations}, pool: {prep.pool.nbytes()} bytes")
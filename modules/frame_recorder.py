@@ -0,0 +1,255 @@
+#!/usr/bin/env python3
+# modules/frame_recorder.py
+
+# ==============================================================================
+# 导入库
+# ==============================================================================
+import json
+import os
+import queue
+import struct
+import threading
+import time
+
+import numpy as np
+
+# ==============================================================================
+# 文件格式
+# ==============================================================================
+# 一个录像文件 = 文件头 + 若干条定长记录，方便用 np.memmap 直接映射：
+#   [0:8]     魔数 b'SFSREC01'
+#   [8:12]    JSON 长度 (uint32, 小端)
+#   [12:...]  JSON: 两路画面的 shape/dtype，以及记录的 numpy 结构化 dtype 描述
+#   填充到 HEADER_ALIGN 字节对齐
+#   记录:     fruit_ts(f8) hand_ts(f8) fruit(原始像素) hand(原始像素)
+# 记录条数由文件大小推出，录制中途断电最多丢掉最后一条不完整的记录。
+
+MAGIC = b'SFSREC01'
+HEADER_ALIGN = 4096
+
+# 回放输出的环形缓冲区数量：流水线 6 个阶段 + 5 个队列里最多同时有约 11 帧，再留一帧给“上一帧”的记忆
+REPLAY_BUFFERS = 12
+
+
+def _record_dtype(fruit_shape, fruit_dtype, hand_shape, hand_dtype):
+    return np.dtype([
+        ('fruit_ts', '<f8'),
+        ('hand_ts', '<f8'),
+        ('fruit', np.dtype(fruit_dtype), tuple(fruit_shape)),
+        ('hand', np.dtype(hand_dtype), tuple(hand_shape)),
+    ])
+
+# ==============================================================================
+# 录制 (FrameRecorder)
+# ==============================================================================
+
+class FrameRecorder:
+    """
+    把同步的水果帧 + 手势帧 + 时间戳写入录像文件。
+    写盘在后台线程进行，磁盘跟不上时丢帧 (计入 dropped)，不会拖慢主循环。
+    """
+    def __init__(self, path, max_queue=8, every_n=1):
+        """
+        :param path: 录像文件路径。
+        :param max_queue: 待写入帧的最大数量。
+        :param every_n: 每隔几帧录一帧，用来控制文件大小。
+        """
+        self.path = path
+        self.every_n = max(1, every_n)
+        self.written = 0
+        self.dropped = 0
+        self._offered = 0
+        self._file = None
+        self._dtype = None
+        self._queue = queue.Queue(maxsize=max_queue)
+        self._thread = threading.Thread(target=self._run, name="frame_recorder", daemon=True)
+        self._thread.start()
+
+    def _open(self, fruit, hand):
+        self._dtype = _record_dtype(fruit.shape, fruit.dtype, hand.shape, hand.dtype)
+        header = json.dumps({
+            'fruit': {'shape': list(fruit.shape), 'dtype': fruit.dtype.str},
+            'hand': {'shape': list(hand.shape), 'dtype': hand.dtype.str},
+            'record_size': self._dtype.itemsize,
+            'created': time.strftime('%Y-%m-%d %H:%M:%S'),
+        }).encode()
+        prefix = MAGIC + struct.pack('<I', len(header)) + header
+        padding = (-len(prefix)) % HEADER_ALIGN
+        self._file = open(self.path, 'wb')
+        self._file.write(prefix + b'\0' * padding)
+
+    def write(self, fruit, hand, fruit_ts, hand_ts):
+        """主循环调用：拷贝一对画面放进写入队列，立即返回。"""
+        self._offered += 1
+        if (self._offered - 1) % self.every_n:
+            return
+        try:
+            self._queue.put_nowait((np.array(fruit, copy=True), np.array(hand, copy=True), fruit_ts, hand_ts))
+        except queue.Full:
+            self.dropped += 1
+
+    def _run(self):
+        record = None
+        while True:
+            item = self._queue.get()
+            if item is None:
+                break
+            fruit, hand, fruit_ts, hand_ts = item
+            if self._file is None:
+                self._open(fruit, hand)
+                record = np.zeros((), dtype=self._dtype)
+            if fruit.shape != self._dtype['fruit'].shape or hand.shape != self._dtype['hand'].shape:
+                self.dropped += 1  # 中途分辨率变了，定长格式存不下
+                continue
+            record['fruit_ts'] = fruit_ts
+            record['hand_ts'] = hand_ts
+            record['fruit'] = fruit
+            record['hand'] = hand
+            self._file.write(record.tobytes())
+            self.written += 1
+
+    def close(self):
+        self._queue.put(None)
+        self._thread.join()
+        if self._file is not None:
+            self._file.close()
+        print(f"[FrameRecorder] {self.written} frame pairs written to {self.path} ({self.dropped} dropped)")
+
+# ==============================================================================
+# 回放 (FrameReplay / ReplaySource)
+# ==============================================================================
+
+class FrameReplay:
+    """用只读内存映射打开录像文件。records[i]['fruit'] 直接是文件页上的视图，不做拷贝，也不能写。"""
+    def __init__(self, path):
+        with open(path, 'rb') as f:
+            if f.read(8) != MAGIC:
+                raise ValueError(f"{path} is not a frame recording")
+            header_len, = struct.unpack('<I', f.read(4))
+            self.header = json.loads(f.read(header_len).decode())
+        offset = 12 + header_len
+        offset += (-offset) % HEADER_ALIGN
+        fruit, hand = self.header['fruit'], self.header['hand']
+        dtype = _record_dtype(fruit['shape'], fruit['dtype'], hand['shape'], hand['dtype'])
+        count = (os.path.getsize(path) - offset) // dtype.itemsize
+        # 只读映射：页面由内核按需换入换出，不算进程的私有内存；要在画面上画框的话先拷贝 (见 ReplaySource)
+        self.records = np.memmap(path, dtype=dtype, mode='r', offset=offset, shape=(count,))
+        self.path = path
+
+    def __len__(self):
+        return len(self.records)
+
+    def sources(self, realtime=False, loop=False, as_cuda=False, buffers=REPLAY_BUFFERS):
+        """返回 (水果视频源, 手势视频源)，两者共享同一个映射。"""
+        return (ReplaySource(self, 'fruit', realtime, loop, as_cuda, buffers),
+                ReplaySource(self, 'hand', realtime, loop, as_cuda, buffers))
+
+
+class ReplaySource:
+    """
+    接口与 jetson.utils.videoSource 相同的回放视频源。
+    :param realtime: True 时按录制时的时间间隔放帧；False 时尽可能快地放 (用于确定性测试/性能分析)。
+    :param as_cuda: True 时返回 CUDA 图像 (在 Jetson 上回放给 TensorRT 用)；否则返回 Numpy 数组。
+    :param buffers: Numpy 输出的环形缓冲区数量。和 videoSource 一样，返回的图像属于一个环形缓冲区，
+                    轮回来时被下一帧覆盖，所以要多于流水线中同时存在的画面数。
+    """
+    def __init__(self, replay, stream, realtime=False, loop=False, as_cuda=False, buffers=REPLAY_BUFFERS):
+        self.replay = replay
+        self.stream = stream
+        self.realtime = realtime
+        self.loop = loop
+        self.index = 0
+        self.last_timestamp = 0.0
+        self._start_wall = None
+        self._start_ts = None
+        self._to_cuda = None
+        self._buffers = None
+        self._next_buffer = 0
+        if as_cuda:
+            import jetson.utils
+            self._to_cuda = jetson.utils.cudaFromNumpy
+        else:
+            # 检测器/追踪器会直接在画面上画框：拷贝出映射再交出去，循环回放时下一轮看到的仍是原始画面
+            shape = replay.header[stream]
+            self._buffers = [np.empty(shape['shape'], dtype=np.dtype(shape['dtype'])) for _ in range(max(1, buffers))]
+
+    def Capture(self, timeout=None):
+        if self.index >= len(self.replay):
+            if not self.loop or not len(self.replay):
+                return None
+            self.index = 0
+            self._start_wall = None
+        record = self.replay.records[self.index]
+        self.index += 1
+        self.last_timestamp = float(record[self.stream + '_ts'])
+        if self.realtime:
+            if self._start_wall is None:
+                self._start_wall, self._start_ts = time.monotonic(), self.last_timestamp
+            delay = (self.last_timestamp - self._start_ts) - (time.monotonic() - self._start_wall)
+            if delay > 0:
+                time.sleep(delay)
+        frame = record[self.stream]
+        if self._to_cuda:
+            return self._to_cuda(frame)   # cudaFromNumpy 本身就会拷贝
+        out = self._buffers[self._next_buffer]
+        self._next_buffer = (self._next_buffer + 1) % len(self._buffers)
+        np.copyto(out, frame)
+        return out
+
+    def IsStreaming(self):
+        return self.loop or self.index < len(self.replay)
+
+    def GetWidth(self):
+        return self.replay.header[self.stream]['shape'][1]
+
+    def GetHeight(self):
+        return self.replay.header[self.stream]['shape'][0]
+
+    def GetFrameRate(self):
+        ts = self.replay.records[self.stream + '_ts']
+        if len(ts) < 2 or ts[-1] <= ts[0]:
+            return 0.0
+        return (len(ts) - 1) / float(ts[-1] - ts[0])
+
+    def Close(self):
+        self.index = len(self.replay)
+        self.loop = False
+
+# ==============================================================================
+# 无显示输出 (NullOutput)
+# ==============================================================================
+
+class NullOutput:
+    """替代 jetson.utils.videoOutput，用于没有显示器的回放/测试。"""
+    def __init__(self, is_streaming=None):
+        """:param is_streaming: 可选的回调，返回 False 时 IsStreaming() 结束。"""
+        self._is_streaming = is_streaming
+        self.frames = 0
+        self.status = ""
+
+    def Render(self, img):
+        self.frames += 1
+
+    def SetStatus(self, status):
+        self.status = status
+
+    def IsStreaming(self):
+        return self._is_streaming() if self._is_streaming else True
+
+    def GetFrameRate(self):
+        return 0.0
+
+# ==============================================================================
+# 单独测试代码
+# ==============================================================================
+# `python3 modules/frame_recorder.py <file>` 打印录像文件的概要信息。
+if __name__ == '__main__':
+    import sys
+    if len(sys.argv) != 2:
+        print("usage: python3 modules/frame_recorder.py <recording>")
+        sys.exit(1)
+    replay = FrameReplay(sys.argv[1])
+    fruit_src, hand_src = replay.sources()
+    print(f"{replay.path}: {len(replay)} frame pairs, created {replay.header.get('created')}")
+    print(f"  fruit {replay.header['fruit']}  ~{fruit_src.GetFrameRate():.1f} FPS")
+    print(f"  hand  {replay.header['hand']}  ~{hand_src.GetFrameRate():.1f} FPS")
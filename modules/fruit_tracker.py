@@ -0,0 +1,194 @@
+#!/usr/bin/env python3
+# modules/fruit_tracker.py
+
+# ==============================================================================
+# 导入库
+# ==============================================================================
+import itertools
+
+import numpy as np
+
+# ==============================================================================
+# 工具函数
+# ==============================================================================
+
+def iou_matrix(boxes_a, boxes_b):
+    """
+    向量化计算两组框 (left, top, right, bottom) 的两两 IoU。
+    :return: 形状为 (len(a), len(b)) 的数组。
+    """
+    a = np.asarray(boxes_a, dtype=np.float32).reshape(-1, 4)
+    b = np.asarray(boxes_b, dtype=np.float32).reshape(-1, 4)
+    left = np.maximum(a[:, None, 0], b[None, :, 0])
+    top = np.maximum(a[:, None, 1], b[None, :, 1])
+    right = np.minimum(a[:, None, 2], b[None, :, 2])
+    bottom = np.minimum(a[:, None, 3], b[None, :, 3])
+    inter = np.clip(right - left, 0, None) * np.clip(bottom - top, 0, None)
+    area_a = (a[:, 2] - a[:, 0]) * (a[:, 3] - a[:, 1])
+    area_b = (b[:, 2] - b[:, 0]) * (b[:, 3] - b[:, 1])
+    union = area_a[:, None] + area_b[None, :] - inter
+    return np.where(union > 0, inter / np.maximum(union, 1e-6), 0.0)
+
+# ==============================================================================
+# 单个目标的轨迹 (Track)
+# ==============================================================================
+
+class Track:
+    """
+    一个被持续追踪的水果。用 alpha-beta 滤波 (简化的匀速卡尔曼) 维护框的位置和速度，
+    检测器不运行的帧里按速度外推。
+    """
+    ALPHA = 0.6   # 位置修正系数
+    BETA = 0.2    # 速度修正系数
+
+    def __init__(self, track_id, class_id, box, confidence):
+        self.id = track_id
+        self.class_id = class_id
+        self.box = np.asarray(box, dtype=np.float32)
+        self.velocity = np.zeros(4, dtype=np.float32)
+        self.confidence = confidence      # 检测置信度，外推时逐帧衰减
+        self.hits = 1                     # 被检测器匹配到的次数
+        self.misses = 0                   # 连续漏检次数 (只在检测帧累计)
+        self.frames_since_detect = 0
+        self.confirmed = False
+        self.counted = False              # 是否已经作为新商品上报过
+
+    def predict(self, decay):
+        self.box = self.box + self.velocity
+        self.confidence *= decay
+        self.frames_since_detect += 1
+
+    def correct(self, box, confidence):
+        residual = np.asarray(box, dtype=np.float32) - self.box
+        self.box = self.box + self.ALPHA * residual
+        # 速度按每帧计算，检测间隔 N 帧时把残差平摊到这 N 帧上
+        self.velocity = self.velocity + self.BETA * residual / max(self.frames_since_detect, 1)
+        self.confidence = confidence
+        self.hits += 1
+        self.misses = 0
+        self.frames_since_detect = 0
+
+# ==============================================================================
+# 多目标追踪器 (FruitTracker)
+# ==============================================================================
+
+class FruitTracker:
+    """
+    叠加在 ObjectDetector 之上的轻量多目标追踪器。
+    - 每 N 帧 (或有轨迹置信度过低、有待确认的新轨迹时) 才真正运行一次检测器；
+      其余帧只按速度外推框的位置，并在 GPU 上画出追踪框。
+    - 每条轨迹有稳定的 ID，同一种水果出现两个也会得到两条轨迹，各计数一次。
+    """
+    def __init__(self, detector, detect_interval=5, iou_threshold=0.3, min_hits=2,
+                 max_misses=2, confidence_decay=0.95, redetect_confidence=0.6):
+        """
+        :param detector: ObjectDetector 实例。
+        :param detect_interval: 正常情况下每隔多少帧运行一次检测器。
+        :param iou_threshold: 检测框与轨迹匹配所需的最小 IoU。
+        :param min_hits: 轨迹被匹配多少次后确认为真实商品 (过滤单帧误检)。
+        :param max_misses: 连续多少个检测帧没匹配上就删除轨迹。
+        :param confidence_decay: 外推帧中轨迹置信度的衰减系数。
+        :param redetect_confidence: 任一轨迹置信度低于该值时，下一帧立即重新检测。
+        """
+        self.detector = detector
+        self.detect_interval = detect_interval
+        self.iou_threshold = iou_threshold
+        self.min_hits = min_hits
+        self.max_misses = max_misses
+        self.confidence_decay = confidence_decay
+        self.redetect_confidence = redetect_confidence
+
+        self.tracks = []
+        self._ids = itertools.count(1)
+        self._frames_since_detect = detect_interval  # 第一帧就运行检测
+        self.detector_runs = 0
+        self.frames = 0
+
+    def reset(self):
+        """清空所有轨迹。画面中仍在的水果会被当作新商品重新上报。"""
+        self.tracks = []
+        self._frames_since_detect = self.detect_interval
+
+    def _need_detection(self):
+        if self._frames_since_detect >= self.detect_interval:
+            return True
+        for track in self.tracks:
+            # 新出现的轨迹需要尽快确认；外推太久的轨迹不再可信
+            if not track.confirmed or track.confidence < self.redetect_confidence:
+                return True
+        return False
+
+    def update(self, img):
+        """
+        处理一帧水果画面。
+        :param img: 传给 detector 的原始图像 (CUDA 图像)。
+        :return: (tracks, new_tracks) —— 当前所有已确认的轨迹，以及本帧新确认的轨迹。
+        """
+        if self.predict():
+            return self.correct(img, self.detector.detect_and_draw(img))
+        return self.correct(img)
+
+    # update() 拆成两步，多路收银台模式下先让每一路 predict()，
+    # 把需要检测的画面凑成一批交给检测器，再把各自的结果交回 correct()。
+    def predict(self):
+        """第一步：所有轨迹外推一帧。返回这一帧是否需要运行检测器。"""
+        self.frames += 1
+        for track in self.tracks:
+            track.predict(self.confidence_decay)
+        return self._need_detection()
+
+    def correct(self, img, detections=None):
+        """
+        第二步：有检测结果就和轨迹关联；没有 (本帧跳过检测) 就把外推的框画到图上。
+        :return: 与 update() 相同。
+        """
+        if detections is not None:
+            self.detector_runs += 1
+            self._frames_since_detect = 0
+            self._associate(detections)
+        else:
+            self._frames_since_detect += 1
+            self.detector.draw_boxes(img, [(track.box, track.class_id) for track in self.tracks if track.confirmed])
+
+        new_tracks = []
+        for track in self.tracks:
+            if not track.confirmed and track.hits >= self.min_hits:
+                track.confirmed = True
+            if track.confirmed and not track.counted:
+                track.counted = True
+                new_tracks.append(track)
+        return [t for t in self.tracks if t.confirmed], new_tracks
+
+    def _associate(self, detections):
+        """按类别贪心匹配检测框和轨迹 (IoU 从大到小)。"""
+        det_boxes = np.array([(d.Left, d.Top, d.Right, d.Bottom) for d in detections], dtype=np.float32).reshape(-1, 4)
+        det_classes = np.array([d.ClassID for d in detections], dtype=np.int32)
+        track_boxes = np.array([t.box for t in self.tracks], dtype=np.float32).reshape(-1, 4)
+        track_classes = np.array([t.class_id for t in self.tracks], dtype=np.int32)
+
+        matched_tracks, matched_dets = set(), set()
+        if len(self.tracks) and len(detections):
+            ious = iou_matrix(track_boxes, det_boxes)
+            ious[track_classes[:, None] != det_classes[None, :]] = 0.0  # 不同类别不能匹配
+            for flat_index in np.argsort(-ious, axis=None):
+                ti, di = np.unravel_index(flat_index, ious.shape)
+                if ious[ti, di] < self.iou_threshold:
+                    break
+                if ti in matched_tracks or di in matched_dets:
+                    continue
+                matched_tracks.add(ti)
+                matched_dets.add(di)
+                self.tracks[ti].correct(det_boxes[di], detections[di].Confidence)
+
+        survivors = []
+        for ti, track in enumerate(self.tracks):
+            if ti not in matched_tracks:
+                track.misses += 1
+                # 还没确认的轨迹漏检一次就删除
+                if track.misses > (self.max_misses if track.confirmed else 0):
+                    continue
+            survivors.append(track)
+        for di, det in enumerate(detections):
+            if di not in matched_dets:
+                survivors.append(Track(next(self._ids), det.ClassID, det_boxes[di], det.Confidence))
+        self.tracks = survivors
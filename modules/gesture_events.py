@@ -0,0 +1,117 @@
+#!/usr/bin/env python3
+# modules/gesture_events.py
+
+# ==============================================================================
+# 导入库
+# ==============================================================================
+import numpy as np
+
+# ==============================================================================
+# 手势事件 (GestureEvent)
+# ==============================================================================
+
+GESTURE_START = 'start'      # 手势稳定出现
+GESTURE_HOLD = 'hold'        # 手势保持中，每隔 hold_interval 秒一次
+GESTURE_RELEASE = 'release'  # 手势结束 (换了手势或手拿开)
+
+
+class GestureEvent:
+    __slots__ = ('kind', 'gesture', 'timestamp', 'duration')
+
+    def __init__(self, kind, gesture, timestamp, duration=0.0):
+        self.kind = kind
+        self.gesture = gesture
+        self.timestamp = timestamp
+        self.duration = duration    # 从 start 到这个事件经过的时间 (秒)
+
+    def __repr__(self):
+        return f"GestureEvent({self.kind}, {self.gesture}, t={self.timestamp:.3f}, held={self.duration:.2f}s)"
+
+# ==============================================================================
+# 手势事件引擎 (GestureEventEngine)
+# ------------------------------------------------------------------------------
+# 接在 GestureRecognizer.recognize 之后。每个手势帧的识别结果和置信度写进固定长度的环形缓冲区，
+# 在最近 window 帧里按置信度加权投票：
+#   - 某个手势的票数达到 start_votes 才算开始 (N-of-M)，单独一帧认错不会触发任何操作；
+#   - 开始之后票数跌到 keep_votes 以下才算结束 (迟滞)，中间偶尔认错一两帧也不会断开重来；
+#   - 保持期间每 hold_interval 秒发一个 hold 事件。
+# 状态机只对事件做出反应，手势稳定几帧就执行，不再需要固定的 1.5 秒冷却。
+# ==============================================================================
+
+class GestureEventEngine:
+    def __init__(self, window=5, start_votes=3.0, keep_votes=2.0, hold_interval=1.0,
+                 min_confidence=0.3, ignore=("No Hand", "unknown", None)):
+        """
+        :param window: 环形缓冲区长度 (M)，即参与投票的最近帧数。
+        :param start_votes: 开始一个手势需要的票数 (N)，每帧的票按置信度计 (0~1)。
+        :param keep_votes: 保持当前手势需要的票数，小于 start_votes 形成迟滞。
+        :param hold_interval: hold 事件的间隔 (秒)；None 表示不发 hold 事件。
+        :param min_confidence: 低于这个置信度的帧不投票。
+        :param ignore: 不产生事件的结果 (没有手、无法识别)。
+        """
+        if not 0 < keep_votes <= start_votes <= window:
+            raise ValueError("need 0 < keep_votes <= start_votes <= window")
+        self.window = window
+        self.start_votes = start_votes
+        self.keep_votes = keep_votes
+        self.hold_interval = hold_interval
+        self.min_confidence = min_confidence
+        self.ignore = set(ignore)
+        self._labels = [None] * window
+        self._confidences = np.zeros(window, dtype=np.float32)
+        self._pos = 0
+        self.active = None          # 当前处于保持状态的手势
+        self._start_time = 0.0
+        self._last_hold = 0.0
+
+    def reset(self):
+        self._labels = [None] * self.window
+        self._confidences[:] = 0.0
+        self.active = None
+
+    def votes(self, gesture):
+        """最近 window 帧中投给 gesture 的票数。"""
+        return float(sum(c for label, c in zip(self._labels, self._confidences) if label == gesture))
+
+    def push(self, gesture, timestamp, confidence=1.0):
+        """
+        写入一帧的识别结果，返回这一帧产生的事件列表 (多数帧为空)。
+        :param gesture: 识别结果。
+        :param timestamp: 画面采集时间。
+        :param confidence: 识别置信度 (0~1)。
+        """
+        if gesture in self.ignore or confidence < self.min_confidence:
+            gesture, confidence = None, 0.0
+        self._labels[self._pos] = gesture
+        self._confidences[self._pos] = confidence
+        self._pos = (self._pos + 1) % self.window
+
+        events = []
+        if self.active is not None and self.votes(self.active) < self.keep_votes:
+            events.append(GestureEvent(GESTURE_RELEASE, self.active, timestamp, timestamp - self._start_time))
+            self.active = None
+        if gesture is not None and gesture != self.active and self.votes(gesture) >= self.start_votes:
+            if self.active is not None:
+                # 直接换成了另一个手势：旧的先结束
+                events.append(GestureEvent(GESTURE_RELEASE, self.active, timestamp, timestamp - self._start_time))
+            self.active = gesture
+            self._start_time = self._last_hold = timestamp
+            events.append(GestureEvent(GESTURE_START, gesture, timestamp))
+        elif (self.active is not None and self.hold_interval is not None
+              and timestamp - self._last_hold >= self.hold_interval):
+            self._last_hold = timestamp
+            events.append(GestureEvent(GESTURE_HOLD, self.active, timestamp, timestamp - self._start_time))
+        return events
+
+# ==============================================================================
+# 单独测试代码
+# ==============================================================================
+# 运行 `python3 modules/gesture_events.py`：一段夹杂误识别的 30 FPS 手势序列。
+if __name__ == '__main__':
+    sequence = (["No Hand"] * 5 + ["thumb_up"] + ["No Hand"] * 5 +           # 单独一帧误识别：不触发
+                ["pointing"] * 4 + ["unknown"] + ["pointing"] * 40 +          # 中间认错一帧：不断开
+                ["open_palm"] * 10 + ["No Hand"] * 10)
+    engine = GestureEventEngine()
+    for i, gesture in enumerate(sequence):
+        for event in engine.push(gesture, i / 30.0):
+            print(f"frame {i:3d}: {event}")
@@ -4,8 +4,198 @@
 # ==============================================================================
 # 导入必要的库
 # ==============================================================================
-import mediapipe as mp 
-import math          # 用于计算平方根和距离
+import numpy as np   # 关节点整体转成数组，距离和角度一次算完
+
+# ==============================================================================
+# 关节点编号 (与 Mediapipe 的 HandLandmark 一致)
+# ==============================================================================
+WRIST = 0
+MIDDLE_FINGER_MCP = 9
+# 指尖的ID：拇指(4)、食指(8)、中指(12)、无名指(16)、小指(20)
+FINGER_TIPS = np.array([4, 8, 12, 16, 20])
+# 手指中间关节(PIP)的ID (拇指没有PIP，用IP代替)：3, 6, 10, 14, 18
+FINGER_PIPS = np.array([3, 6, 10, 14, 18])
+# 每根手指从手腕到指尖的关节链，用来算每个关节的弯曲角度
+FINGER_CHAINS = np.array([[0, 1, 2, 3, 4], [0, 5, 6, 7, 8], [0, 9, 10, 11, 12],
+                          [0, 13, 14, 15, 16], [0, 17, 18, 19, 20]])
+_PAIRS = np.triu_indices(21, k=1)   # 21 个点两两之间的 210 对
+
+_TIPS_AND_PIPS = np.concatenate([FINGER_TIPS, FINGER_PIPS])
+_FINGER_BITS = 1 << np.arange(5)   # 五根手指“伸直”的组合编码成 0~31
+
+# ==============================================================================
+# 手势规则
+# ------------------------------------------------------------------------------
+# 规则只取决于五根手指各自伸直还是弯曲，一共 32 种组合，导入时预先查好表：
+# 逐帧识别和批量识别都只是查表，添加手势只需要改 _rule()。
+# ==============================================================================
+
+GESTURES = ("pointing", "thumb_up", "open_palm", "unknown")
+_GESTURE_NAMES = np.array(GESTURES)
+
+
+def _rule(straight):
+    """straight: 拇指、食指、中指、无名指、小指是否伸直。返回 GESTURES 中的下标。"""
+    thumb, index, middle, ring, pinky = straight
+    # 这里的if顺序很重要，决定了判断的优先级。
+    # 1. 指向 (结账)：食指伸直，中指、无名指、小指都弯曲 (拇指不管)
+    if index and not middle and not ring and not pinky:
+        return 0
+    # 2. 点赞 (清空)：只有大拇指伸直，其余四指都弯曲
+    if thumb and not index and not middle and not ring and not pinky:
+        return 1
+    # 3. 五指张开 (撤销)
+    if all(straight):
+        return 2
+    # 如果以上条件都不满足，则返回“未知”
+    return 3
+
+
+_RULE_TABLE = np.array([_rule([bool(bits >> i & 1) for i in range(5)]) for bits in range(32)])
+# 计算置信度时看哪几根手指：指向不看拇指，其余手势看全部五根
+_RULE_FINGERS = [slice(1, 5), slice(0, 5), slice(0, 5), slice(0, 5)]
+
+# ==============================================================================
+# 关节点 -> 数组 / 特征
+# ==============================================================================
+
+def landmarks_to_array(hand_landmarks):
+    """
+    把一只手的关节点转成 (21, 3) 的 float32 数组，每只手只转换这一次。
+    接受 Mediapipe 的 NormalizedLandmarkList、[(x, y, z), ...] 列表或已经是数组的输入。
+    """
+    if isinstance(hand_landmarks, np.ndarray):
+        return hand_landmarks.astype(np.float32, copy=False)
+    if hasattr(hand_landmarks, 'landmark'):
+        return np.array([(lm.x, lm.y, lm.z) for lm in hand_landmarks.landmark], dtype=np.float32)
+    return np.asarray(hand_landmarks, dtype=np.float32)
+
+
+def _as_batch(points):
+    points = np.asarray(points, dtype=np.float32)
+    return points[None] if points.ndim == 2 else points
+
+
+def normalize_points(points):
+    """
+    平移到以手腕为原点，再除以手掌大小 (手腕到中指根部的距离)，
+    这样特征与手在画面中的位置、远近无关。只用 x、y (Mediapipe 的 z 噪声较大)。
+    :param points: (N, 21, 2/3) 或 (21, 2/3)。
+    :return: (N, 21, 2)。
+    """
+    xy = _as_batch(points)[..., :2]
+    xy = xy - xy[:, WRIST:WRIST + 1]
+    palm = np.linalg.norm(xy[:, MIDDLE_FINGER_MCP], axis=1)
+    return xy / np.maximum(palm, 1e-6)[:, None, None]
+
+
+def joint_angles(points):
+    """每根手指三个中间关节的夹角 (0~1，1 表示完全伸直)。返回 (N, 15)。"""
+    xy = normalize_points(points)
+    chain = xy[:, FINGER_CHAINS]                   # (N, 5, 5, 2)
+    a = chain[:, :, :-2] - chain[:, :, 1:-1]       # 关节指向上一节
+    b = chain[:, :, 2:] - chain[:, :, 1:-1]        # 关节指向下一节
+    cos = (a * b).sum(-1) / np.maximum(np.linalg.norm(a, axis=-1) * np.linalg.norm(b, axis=-1), 1e-6)
+    return (np.arccos(np.clip(cos, -1.0, 1.0)) / np.pi).reshape(len(xy), 15)
+
+
+def extract_features(points):
+    """
+    训练/分类用的特征向量：归一化后的 210 个两两距离 + 15 个关节角度。
+    :param points: (N, 21, 2/3) 或 (21, 2/3)。
+    :return: (N, 225) float32。
+    """
+    xy = normalize_points(points)
+    distances = np.linalg.norm(xy[:, _PAIRS[0]] - xy[:, _PAIRS[1]], axis=-1)
+    return np.concatenate([distances, joint_angles(points)], axis=1).astype(np.float32)
+
+# ==============================================================================
+# 可训练的分类器 (LandmarkClassifier)
+# ------------------------------------------------------------------------------
+# 纯 NumPy 的最近质心 / kNN 分类器，和规则判断并列，用来添加新手势或者和规则比较准确率。
+# 特征先按训练集做标准化，再算欧氏距离。
+# ==============================================================================
+
+class LandmarkClassifier:
+    def __init__(self, method='centroid', k=5):
+        """
+        :param method: 'centroid' (最近质心，模型只有每类一个向量) 或 'knn'。
+        :param k: kNN 的近邻数。
+        """
+        if method not in ('centroid', 'knn'):
+            raise ValueError(f"Unknown classifier method: {method}")
+        self.method = method
+        self.k = k
+        self.classes = None
+        self._mean = self._std = None
+        self._vectors = None   # 质心，或 kNN 的全部训练样本
+        self._targets = None   # 每个向量对应的类别下标
+
+    def fit(self, points, labels):
+        """
+        :param points: (N, 21, 2/3) 关节点。
+        :param labels: 长度为 N 的手势名称。
+        """
+        features = extract_features(points)
+        labels = np.asarray(labels)
+        self.classes, targets = np.unique(labels, return_inverse=True)
+        self._mean = features.mean(axis=0)
+        self._std = np.maximum(features.std(axis=0), 1e-6)
+        features = (features - self._mean) / self._std
+        if self.method == 'centroid':
+            self._vectors = np.stack([features[targets == c].mean(axis=0) for c in range(len(self.classes))])
+            self._targets = np.arange(len(self.classes))
+        else:
+            self._vectors, self._targets = features, targets
+        return self
+
+    def _distances(self, features, chunk=1024):
+        """分块计算到所有模型向量的距离平方，几千只手一起算也不会占太多内存。"""
+        vectors = self._vectors
+        v2 = (vectors * vectors).sum(axis=1)
+        for start in range(0, len(features), chunk):
+            f = features[start:start + chunk]
+            yield start, np.maximum((f * f).sum(axis=1)[:, None] + v2[None] - 2.0 * f @ vectors.T, 0.0)
+
+    def predict(self, points):
+        """
+        :return: (手势名称数组, 置信度数组)。
+        最近质心的置信度看最近和次近两个质心的距离差；kNN 的置信度是近邻里赢家所占的比例。
+        """
+        features = (extract_features(points) - self._mean) / self._std
+        labels = np.empty(len(features), dtype=self.classes.dtype)
+        confidences = np.empty(len(features), dtype=np.float32)
+        for start, d2 in self._distances(features):
+            end = start + len(d2)
+            if self.method == 'centroid':
+                order = np.argsort(d2, axis=1)
+                rows = np.arange(len(d2))
+                labels[start:end] = self.classes[order[:, 0]]
+                if d2.shape[1] > 1:
+                    nearest, second = np.sqrt(d2[rows, order[:, 0]]), np.sqrt(d2[rows, order[:, 1]])
+                    confidences[start:end] = 1.0 - nearest / np.maximum(second, 1e-6)
+                else:
+                    confidences[start:end] = 1.0
+            else:
+                k = min(self.k, d2.shape[1])
+                neighbours = self._targets[np.argpartition(d2, k - 1, axis=1)[:, :k]]
+                counts = np.stack([(neighbours == c).sum(axis=1) for c in range(len(self.classes))], axis=1)
+                labels[start:end] = self.classes[counts.argmax(axis=1)]
+                confidences[start:end] = counts.max(axis=1) / float(k)
+        return labels, confidences
+
+    def save(self, path):
+        np.savez(path, method=self.method, k=self.k, classes=self.classes, mean=self._mean, std=self._std,
+                 vectors=self._vectors, targets=self._targets)
+
+    @classmethod
+    def load(cls, path):
+        data = np.load(path)
+        classifier = cls(str(data['method']), int(data['k']))
+        classifier.classes = data['classes']
+        classifier._mean, classifier._std = data['mean'], data['std']
+        classifier._vectors, classifier._targets = data['vectors'], data['targets']
+        return classifier
 
 # ==============================================================================
 # 定义GestureRecognizer类
@@ -13,41 +203,26 @@ import math          # 用于计算平方根和距离
 
 class GestureRecognizer:
     """
-    依据手部关键点识别手势
+    依据手部关键点识别手势。
+    默认用规则判断 (哪几根手指伸直)；给了训练好的 LandmarkClassifier 时改用分类器。
     """
 
+    # 距离之比偏离1达到这么多 (15%) 就认为这根手指的判断完全可靠
+    CONFIDENT_MARGIN = 0.15
+
     # --------------------------------------------------------------------------
     # 初始化方法 (__init__)
     # --------------------------------------------------------------------------
-    def __init__(self):
+    def __init__(self, classifier=None):
+        """
+        :param classifier: 可选的 LandmarkClassifier，或者它保存的 .npz 文件路径。
+        """
         print("Initializing GestureRecognizer (Final Version)...")
-        self.mp_hands = mp.solutions.hands
-        
-        # --- 为了方便，我们预先定义好需要用到的关节点 ---
-        # 指尖的ID列表
-        self.finger_tips = [
-            self.mp_hands.HandLandmark.THUMB_TIP,        # 拇指指尖 (ID: 4)
-            self.mp_hands.HandLandmark.INDEX_FINGER_TIP, # 食指指尖 (ID: 8)
-            self.mp_hands.HandLandmark.MIDDLE_FINGER_TIP,# 中指指尖 (ID: 12)
-            self.mp_hands.HandLandmark.RING_FINGER_TIP,  # 无名指指尖 (ID: 16)
-            self.mp_hands.HandLandmark.PINKY_TIP         # 小指指尖 (ID: 20)
-        ]
-        # 手指中间关节(PIP)的ID列表 (拇指除外，用IP代替)
-        self.finger_pip = [
-            self.mp_hands.HandLandmark.THUMB_IP,         # 拇指IP关节点 (ID: 3)
-            self.mp_hands.HandLandmark.INDEX_FINGER_PIP, # 食指PIP关节点 (ID: 6)
-            self.mp_hands.HandLandmark.MIDDLE_FINGER_PIP,# 中指PIP关节点 (ID: 10)
-            self.mp_hands.HandLandmark.RING_FINGER_PIP,  # 无名指PIP关节点 (ID: 14)
-            self.mp_hands.HandLandmark.PINKY_PIP         # 小指PIP关节点 (ID: 18)
-        ]
-        print("GestureRecognizer initialized.")
-        
-    # --------------------------------------------------------------------------
-    # 辅助方法（主要利用距离）
-    # --------------------------------------------------------------------------
-    def _get_distance(self, p1, p2):
-        """计算两个关节点在2D平面上的欧几里得距离"""
-        return math.sqrt((p1.x - p2.x)**2 + (p1.y - p2.y)**2)
+        if isinstance(classifier, str):
+            classifier = LandmarkClassifier.load(classifier)
+        self.classifier = classifier
+        print("GestureRecognizer initialized." + (f" (classifier: {classifier.method}, classes: "
+                                                  f"{', '.join(map(str, classifier.classes))})" if classifier else ""))
 
     # --------------------------------------------------------------------------
     # 核心识别方法 (recognize)
@@ -55,50 +230,150 @@ class GestureRecognizer:
     def recognize(self, hand_landmarks):
         """
         接收一个手(21个)的关节点，判断它是什么手势。
-        
+
         :param hand_landmarks: Mediapipe返回的单手关节点列表。
         :return: 手势名称字符串 ( "pointing", "thumb_up", "open_palm", "unknown")
         """
-        if not hand_landmarks:
-            return None
-
-        landmarks = hand_landmarks.landmark # landmarks是一个包含21个点的列表
-        
-        # --- 第一步：判断每一根手指是“伸直”还是“弯曲” ---
-        fingers_straight = []
-        wrist = landmarks[self.mp_hands.HandLandmark.WRIST] # 获取手腕关节点(ID: 0)作为基准点
-        
-        # 这个循环遍历五根手指
-        for i in range(5):
-            tip = landmarks[self.finger_tips[i]] # 获取当前手指的指尖
-            pip = landmarks[self.finger_pip[i]] # 获取当前手指的中间关节
-            
-            # --- 核心逻辑 ---
-            # 如果“指尖到手腕的距离”大于“中间关节到手腕的距离”，认为这根手指是伸直的，否则是弯曲的
-            if self._get_distance(tip, wrist) > self._get_distance(pip, wrist):
-                fingers_straight.append(True)
-            else:
-                fingers_straight.append(False)
-        
-        # `fingers_straight` 现在是一个布尔列，表示手指是不是直的，例如 [True, False, False, False, False] 表示只有大拇指伸直。
-
-        # --- 第二步：根据手指伸直/弯曲的组合来定义手势 ---
-        # 这里的if/elif顺序很重要，决定了判断的优先级。
-        
-        # 1. 指向 (结账)
-        #只有食指(索引1)是伸直的，并且中指(2)、无名指(3)、小指(4)都是弯曲的。
-        if fingers_straight[1] and not fingers_straight[2] and not fingers_straight[3] and not fingers_straight[4]:
-            return "pointing"
-            
-        # 2. 点赞 (清空)
-        # 条件：只有大拇指(索引0)是伸直的，其余四指都是弯曲的。
-        if fingers_straight[0] and not fingers_straight[1] and not fingers_straight[2] and not fingers_straight[3] and not fingers_straight[4]:
-            return "thumb_up"
-            
-        # 3. 五指张开 (撤销)
-        # 条件：所有五根手指(索引0到4)都是伸直的。
-        if all(fingers_straight):
-            return "open_palm"
-        
-        # 如果以上条件都不满足，则返回“未知”
-        return "unknown"
\ No newline at end of file
+        return self.recognize_with_confidence(hand_landmarks)[0]
+
+    def recognize_with_confidence(self, hand_landmarks):
+        """
+        同 recognize，另外给出置信度 (0~1)，交给 GestureEventEngine 加权投票。
+
+        :return: (手势名称, 置信度)
+        """
+        # 不能写 `if not hand_landmarks`：数组输入会抛 ValueError (真值不明确)
+        if hand_landmarks is None:
+            return None, 0.0
+        points = landmarks_to_array(hand_landmarks)
+        if len(points) == 0:
+            return None, 0.0
+        if self.classifier is not None:
+            labels, confidences = self.classifier.predict(points[None])
+            return str(labels[0]), float(confidences[0])
+        # 单只手走一条短路径：只有10个距离，批量版本的几十次 NumPy 调用反而更慢
+        d = points[_TIPS_AND_PIPS, :2] - points[WRIST, :2]
+        distances = np.hypot(d[:, 0], d[:, 1]).tolist()
+        tips, pips = distances[:5], distances[5:]
+        code = int(_RULE_TABLE[sum(1 << i for i in range(5) if tips[i] > pips[i])])
+        margins = [min(abs(t / p - 1.0) / self.CONFIDENT_MARGIN, 1.0) if p > 0 else 0.0 for t, p in zip(tips, pips)]
+        return GESTURES[code], min(margins[_RULE_FINGERS[code]])
+
+    def recognize_batch(self, points):
+        """
+        一次识别很多只手 (离线评估录像时几千只手一起算)。
+        :param points: (N, 21, 2/3) 关节点数组。
+        :return: (手势名称数组, 置信度数组)。
+        """
+        if self.classifier is not None:
+            return self.classifier.predict(points)
+        return self.rule_batch(points)
+
+    @classmethod
+    def rule_batch(cls, points):
+        """
+        规则判断的向量化版本：
+        如果“指尖到手腕的距离”大于“中间关节到手腕的距离”，认为这根手指是伸直的，否则是弯曲的。
+        置信度看决定这个手势的几根手指离“伸直/弯曲”的分界有多远：
+        两个距离之比越接近1，这根手指的判断越不可靠。
+        """
+        xy = _as_batch(points)[..., :2]
+        d = xy[:, _TIPS_AND_PIPS] - xy[:, WRIST:WRIST + 1]
+        distances = np.hypot(d[..., 0], d[..., 1])               # (N, 10)
+        tip_distance, pip_distance = distances[:, :5], distances[:, 5:]
+        ratio = np.divide(tip_distance, pip_distance, out=np.ones_like(tip_distance), where=pip_distance > 0)
+        margins = np.minimum(np.abs(ratio - 1.0) / cls.CONFIDENT_MARGIN, 1.0)
+        codes = _RULE_TABLE[(tip_distance > pip_distance) @ _FINGER_BITS]
+        confidences = np.where(codes == 0, margins[:, 1:].min(axis=1), margins.min(axis=1)).astype(np.float32)
+        return _GESTURE_NAMES[codes], confidences
+
+# ==============================================================================
+# 离线评估 / 训练工具
+# ==============================================================================
+# 用法:
+#   python3 modules/gesture_recognizer.py extract session.rec -o hands.npz    # 从录像中提取关节点 (需要 mediapipe)
+#   python3 modules/gesture_recognizer.py eval hands.npz [--model gestures.npz]
+#   python3 modules/gesture_recognizer.py train hands.npz -o gestures.npz [--method knn]
+# hands.npz 中 points 为 (N, 21, 3) 关节点，labels 为每只手的手势名称。
+# extract 先用规则填好 labels，人工改正错误的标签后就能用来评估和训练。
+if __name__ == '__main__':
+    import argparse
+    import sys
+    import time
+
+    def extract(args):
+        from frame_buffers import HandFramePreprocessor
+        from frame_recorder import FrameReplay
+        from hand_tracker import HandTracker
+        replay = FrameReplay(args.input)
+        tracker, prep = HandTracker(), HandFramePreprocessor()
+        points, timestamps = [], []
+        for record in replay.records:
+            results = tracker.process_frame(prep.process(record['hand']))
+            if results.multi_hand_landmarks:
+                points.append(landmarks_to_array(results.multi_hand_landmarks[0]))
+                timestamps.append(float(record['hand_ts']))
+        tracker.close()
+        points = np.array(points, dtype=np.float32).reshape(-1, 21, 3)
+        labels, _ = GestureRecognizer.rule_batch(points)
+        np.savez(args.output, points=points, labels=labels, timestamps=np.array(timestamps))
+        print(f"Extracted {len(points)} hands from {len(replay)} frames -> {args.output}")
+
+    def report(name, predicted, labels, elapsed):
+        print(f"\n{name}: {len(predicted) / max(elapsed, 1e-9):,.0f} hands/s")
+        if labels is None:
+            for gesture, count in zip(*np.unique(predicted, return_counts=True)):
+                print(f"  {gesture:<12} {count:7d}")
+            return
+        print(f"  accuracy: {(predicted == labels).mean() * 100:.1f}%")
+        for gesture in np.unique(labels):
+            mask = labels == gesture
+            print(f"  {gesture:<12} recall {(predicted[mask] == gesture).mean() * 100:5.1f}%  ({mask.sum()} samples)")
+
+    def evaluate(args):
+        data = np.load(args.input)
+        points = data['points']
+        labels = data['labels'] if 'labels' in data.files else None
+        recognizers = [("Rules", GestureRecognizer())]
+        if args.model:
+            recognizers.append((f"Classifier ({args.model})", GestureRecognizer(args.model)))
+        for name, recognizer in recognizers:
+            start = time.perf_counter()
+            predicted, _ = recognizer.recognize_batch(points)
+            report(name, predicted, labels, time.perf_counter() - start)
+
+    def train(args):
+        data = np.load(args.input)
+        points, labels = data['points'], data['labels']
+        # 打乱后留 20% 做验证
+        order = np.random.RandomState(0).permutation(len(points))
+        split = int(len(order) * 0.8)
+        classifier = LandmarkClassifier(args.method, k=args.k).fit(points[order[:split]], labels[order[:split]])
+        if split < len(order):
+            start = time.perf_counter()
+            predicted, _ = classifier.predict(points[order[split:]])
+            report(f"Held-out ({args.method})", predicted, labels[order[split:]], time.perf_counter() - start)
+        classifier.fit(points, labels).save(args.output)
+        print(f"Saved {args.method} classifier for {', '.join(map(str, classifier.classes))} -> {args.output}")
+
+    parser = argparse.ArgumentParser(description="Offline gesture evaluation and classifier training.")
+    commands = parser.add_subparsers(dest='command')
+    p = commands.add_parser('extract', help="run hand tracking over a recording and save the landmarks")
+    p.add_argument('input')
+    p.add_argument('-o', '--output', default='hands.npz')
+    p.set_defaults(func=extract)
+    p = commands.add_parser('eval', help="accuracy and throughput of the rules (and a trained classifier)")
+    p.add_argument('input')
+    p.add_argument('--model', help="trained classifier .npz")
+    p.set_defaults(func=evaluate)
+    p = commands.add_parser('train', help="train a nearest-centroid / kNN classifier")
+    p.add_argument('input')
+    p.add_argument('-o', '--output', default='gestures.npz')
+    p.add_argument('--method', choices=('centroid', 'knn'), default='centroid')
+    p.add_argument('--k', type=int, default=5)
+    p.set_defaults(func=train)
+    args = parser.parse_args()
+    if not getattr(args, 'func', None):
+        parser.print_help()
+        sys.exit(1)
+    args.func(args)
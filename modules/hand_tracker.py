@@ -6,8 +6,9 @@
 # ==============================================================================
 import cv2          # 用于颜色空间转换和绘图 (单独测试要用)
 import numpy as np  # Python中处理数组和矩阵的基础库
-import jetson.utils # 用于与Jetson硬件交互 (单独测试用)
-import mediapipe as mp # 实现手部追踪
+from frame_buffers import FrameBufferPool
+# mediapipe (实现手部追踪) 导入要好几秒，在创建 HandTracker 时才导入，启动时可以和其他初始化同时进行
+# jetson.utils 只在下面的单独测试代码里用到，在那里再导入，这样回放录像时不需要 Jetson
 
 # --- 仅在独立测试时需要导入 ---
 # 为了让这个脚本可以独立运行测试，我们需要能够在这里也调用手势识别器。
@@ -18,6 +19,50 @@ except ImportError:
     # 如果是在主程序中被导入，这个导入可能会失败，但没关系。
     pass
 
+# ==============================================================================
+# 运动检测 (MotionGate)
+# ------------------------------------------------------------------------------
+# 把手势画面缩小到 80x60 灰度图，和上一帧做差，统计变化的像素比例。
+# 每帧只要几十微秒，用来判断画面是否静止，静止时就不必每帧都跑 Mediapipe。
+# ==============================================================================
+
+class MotionGate:
+    def __init__(self, size=(80, 60), pixel_threshold=12, min_fraction=0.005):
+        """
+        :param size: 做差分的缩小尺寸 (宽, 高)。缩小本身就能滤掉大部分摄像头噪点。
+        :param pixel_threshold: 灰度变化超过多少算这个像素“动了”。
+        :param min_fraction: 动了的像素超过这个比例才算画面有运动。
+        """
+        self.size = size
+        self.pixel_threshold = pixel_threshold
+        self.min_fraction = min_fraction
+        self.pool = FrameBufferPool()
+        self.last_fraction = 0.0
+        self._index = 0          # 两个灰度缓冲区轮流使用，另一个就是上一帧
+        self._has_prev = False
+
+    def update(self, np_img_rgb):
+        """输入一帧 RGB 画面，返回与上一帧相比是否有运动。"""
+        w, h = self.size
+        small = self.pool.get('small', (h, w, 3))
+        cv2.resize(np_img_rgb, (w, h), dst=small, interpolation=cv2.INTER_AREA)
+        gray = self.pool.get(f'gray{self._index}', (h, w))
+        cv2.cvtColor(small, cv2.COLOR_RGB2GRAY, dst=gray)
+        prev = self.pool.get(f'gray{1 - self._index}', (h, w))
+        self._index = 1 - self._index
+        if not self._has_prev:
+            self._has_prev = True
+            self.last_fraction = 1.0
+            return True
+        diff = self.pool.get('diff', (h, w))
+        cv2.absdiff(gray, prev, dst=diff)
+        cv2.threshold(diff, self.pixel_threshold, 255, cv2.THRESH_BINARY, dst=diff)
+        self.last_fraction = cv2.countNonZero(diff) / float(w * h)
+        return self.last_fraction >= self.min_fraction
+
+    def reset(self):
+        self._has_prev = False
+
 # ==============================================================================
 # 定义HandTracker类
 # ==============================================================================
@@ -31,7 +76,8 @@ class HandTracker:
     # --------------------------------------------------------------------------
     # 初始化方法 (__init__)
     # --------------------------------------------------------------------------
-    def __init__(self, static_mode=False, max_hands=1, min_detect_conf=0.8, min_track_conf=0.8):
+    def __init__(self, static_mode=False, max_hands=1, min_detect_conf=0.8, min_track_conf=0.8,
+                 hold_interval=3, idle_interval=15, roi_margin=0.4, min_roi=96, roi_inset=0.1):
         """
         初始化手部追踪器。
         
@@ -39,20 +85,48 @@ class HandTracker:
         max_hands: 最多检测1只手，测试了一下两个手太卡
         min_detect_conf: 检测置信度
         min_track_conf: 追踪置信度
+        hold_interval: update() 中手在画面里但没有动时，每隔几帧跑一次
+        idle_interval: update() 中画面静止且没有手时，每隔几帧跑一次 (以防运动检测漏掉慢慢伸进来的手)
+        roi_margin: 上一次手部外接框向四周扩大的比例，手移动时仍在裁剪范围内
+        min_roi: 裁剪区域的最小边长 (像素)
+        roi_inset: 手部外接框离裁剪窗口边缘不到窗口边长的这个比例时，才重新放置窗口
         """
         print("Initializing HandTracker...")
-        
+        import mediapipe as mp
+
         # --- 加载Mediapipe手部模型 ---
         self.mp_hands = mp.solutions.hands # 获取手部解决方案模块solutions.hands是Mediapipe中手部解决方案
-        self.hands = self.mp_hands.Hands(
+        self._hands_args = dict(
             static_image_mode=static_mode,
             max_num_hands=max_hands,
             min_detection_confidence=min_detect_conf,
             min_tracking_confidence=min_track_conf
         )
+        self.hands = self.mp_hands.Hands(**self._hands_args)
+        # 裁剪区域用另一个实例：视频模式会记住上一帧的手部位置 (相对于输入图像的归一化坐标)，
+        # 裁剪窗口和整幅画面交替送进同一个实例的话，记住的位置每次都对不上，只能重新做手掌检测。
+        # 第一次真正裁剪时才创建：只调用 process_frame() 的实例 (例如 HandScheduler 的工作进程)
+        # 和一直没有手的画面都不会多占一份模型内存和启动时间。
+        self.roi_hands = None
         
         # --- 加载绘图工具 ---
         self.mp_drawing = mp.solutions.drawing_utils # 绘图工具模块，用于画骨骼
+
+        # --- 自适应调度 (update) ---
+        self.hold_interval = hold_interval
+        self.idle_interval = idle_interval
+        self.roi_margin = roi_margin
+        self.min_roi = min_roi
+        self.roi_inset = roi_inset
+        self._window = None      # 当前的裁剪窗口 (x0, y0, w, h)，手还在里面时保持不动
+        self.motion = MotionGate()
+        self.pool = FrameBufferPool()
+        self._last_results = None
+        self._frames_since_run = idle_interval  # 第一帧一定会跑
+        self.runs = 0
+        self.skipped = 0
+        self.roi_runs = 0
+        self.roi_misses = 0
         print("HandTracker initialized.")
 
     # --------------------------------------------------------------------------
@@ -68,6 +142,95 @@ class HandTracker:
         # Mediapipe内部处理只读图像，不会修改传入的`np_img_rgb`
         return self.hands.process(np_img_rgb)
 
+    # --------------------------------------------------------------------------
+    # 自适应处理方法 (update)
+    # --------------------------------------------------------------------------
+    def update(self, np_img_rgb):
+        """
+        主循环每个新的手势帧调用一次，代替固定的“每隔N帧跑一次”：
+          - 有手且在动：每帧都跑，手势变化的延迟最低；
+          - 有手但静止：每 hold_interval 帧跑一次，手势不会变；
+          - 没有手：画面有运动时立即跑 (可能是手伸进来了)，静止时每 idle_interval 帧才跑一次。
+        上一次看到了手时，只把手附近扩大后的区域送进 Mediapipe，关键点再映射回整幅画面的坐标。
+        裁剪窗口在手还在里面时保持不动，Mediapipe 的跨帧追踪一直有效，不用每帧重新检测手掌。
+        np_img_rgb: Numpy格式的、RGB颜色空间的图像。
+        return: (results, ran)。没有跑时 results 是上一次的结果，ran 为 False。
+        """
+        moving = self.motion.update(np_img_rgb)
+        has_hand = bool(self._last_results and self._last_results.multi_hand_landmarks)
+        if moving:
+            interval = 1
+        else:
+            interval = self.hold_interval if has_hand else self.idle_interval
+        self._frames_since_run += 1
+        if self._frames_since_run < interval:
+            self.skipped += 1
+            return self._last_results, False
+
+        self._frames_since_run = 0
+        self.runs += 1
+        results = None
+        if has_hand:
+            self._window = self._roi(self._last_results.multi_hand_landmarks[0], np_img_rgb.shape, self._window)
+        else:
+            self._window = None
+        if self._window is not None:
+            results = self._process_roi(np_img_rgb, self._window)
+            self.roi_runs += 1
+            if not results.multi_hand_landmarks:
+                # 手移出了裁剪区域 (或者真的拿开了)，马上在整幅画面上再找一次
+                self.roi_misses += 1
+                self._window = None
+                results = None
+        if results is None:
+            results = self.process_frame(np_img_rgb)
+        self._last_results = results
+        return results, True
+
+    def _roi(self, hand_landmarks, shape, window=None):
+        """
+        裁剪窗口：手部关键点的外接框离当前窗口 (window) 的边缘还有 roi_inset 的余量时沿用它；
+        否则重新取外接正方形，向四周扩大 roi_margin。接近整幅画面时返回 None。
+        """
+        height, width = shape[:2]
+        xs = [lm.x * width for lm in hand_landmarks.landmark]
+        ys = [lm.y * height for lm in hand_landmarks.landmark]
+        if window is not None:
+            x0, y0, w, h = window
+            inset = w * self.roi_inset
+            if (min(xs) >= x0 + inset and max(xs) <= x0 + w - inset and
+                    min(ys) >= y0 + inset and max(ys) <= y0 + h - inset):
+                return window
+        cx, cy = (min(xs) + max(xs)) / 2, (min(ys) + max(ys)) / 2
+        side = max(max(xs) - min(xs), max(ys) - min(ys)) * (1 + 2 * self.roi_margin)
+        side = int(min(max(side, self.min_roi), width, height))
+        x0 = int(min(max(cx - side / 2, 0), width - side))
+        y0 = int(min(max(cy - side / 2, 0), height - side))
+        if side * side > 0.6 * width * height:
+            return None  # 裁剪省不了多少，直接用整幅画面
+        return x0, y0, side, side
+
+    def _process_roi(self, np_img_rgb, roi):
+        x0, y0, w, h = roi
+        crop = self.pool.get('roi', (h, w, 3))
+        np.copyto(crop, np_img_rgb[y0:y0 + h, x0:x0 + w])  # Mediapipe 需要连续内存
+        if self.roi_hands is None:
+            self.roi_hands = self.mp_hands.Hands(**self._hands_args)
+        results = self.roi_hands.process(crop)
+        if results.multi_hand_landmarks:
+            height, width = np_img_rgb.shape[:2]
+            for hand_landmarks in results.multi_hand_landmarks:
+                for lm in hand_landmarks.landmark:
+                    lm.x = (x0 + lm.x * w) / width
+                    lm.y = (y0 + lm.y * h) / height
+                    lm.z = lm.z * w / width  # z 与 x 使用同一比例尺
+        return results
+
+    def stats(self):
+        total = self.runs + self.skipped
+        return {'runs': self.runs, 'skipped': self.skipped, 'roi_runs': self.roi_runs, 'roi_misses': self.roi_misses,
+                'run_ratio': self.runs / total if total else 0.0}
+
     # --------------------------------------------------------------------------
     # 绘制关节点方法 
     # --------------------------------------------------------------------------
@@ -99,6 +262,8 @@ class HandTracker:
         释放Mediapipe模型占用的资源。
         """
         self.hands.close()
+        if self.roi_hands is not None:
+            self.roi_hands.close()
         
 # ==============================================================================
 # 单独测试代码
@@ -106,6 +271,7 @@ class HandTracker:
 # 运行 `python3 modules/hand_tracker.py` 时执行。
 # 测试追踪手势和识别手势有没有问题
 if __name__ == '__main__':
+    import jetson.utils # 用于与Jetson硬件交互 (单独测试用)
     print("\n-------------------------------------------")
     print("Running HandTracker in Standalone Test Mode...")
     print("-------------------------------------------")
@@ -136,10 +302,10 @@ if __name__ == '__main__':
         frame_np_rgb_flipped = cv2.flip(frame_np_rgb, 1) # 摄像头是镜像的翻转一下方便看手的动作
 
         # --- 核心处理 ---
-        results = tracker.process_frame(frame_np_rgb_flipped)
+        results, ran = tracker.update(frame_np_rgb_flipped)
         
         current_gesture = "No Hand"
-        if results.multi_hand_landmarks:
+        if results and results.multi_hand_landmarks:
             # 识别手势
             hand_landmarks = results.multi_hand_landmarks[0]
             current_gesture = recognizer.recognize(hand_landmarks)
@@ -155,6 +321,8 @@ if __name__ == '__main__':
         # --- 显示 ---
         output_img_cuda = jetson.utils.cudaFromNumpy(frame_np_rgb_flipped)
         display.Render(output_img_cuda)
-        display.SetStatus(f"Hand Tracking & Gesture Recognition | {display.GetFrameRate():.1f} FPS")
+        stats = tracker.stats()
+        display.SetStatus(f"Hand Tracking & Gesture Recognition | {display.GetFrameRate():.1f} FPS | "
+                          f"Mediapipe runs: {stats['run_ratio'] * 100:.0f}% ({stats['roi_runs']} cropped)")
 
     tracker.close()
\ No newline at end of file
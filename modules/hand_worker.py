@@ -0,0 +1,226 @@
+#!/usr/bin/env python3
+# modules/hand_worker.py
+
+# ==============================================================================
+# 导入库
+# ==============================================================================
+import multiprocessing as mp_proc
+import queue
+import time
+
+import numpy as np
+
+# ==============================================================================
+# 共享内存环形缓冲区 (SharedFrameRing)
+# ==============================================================================
+
+class SharedFrameRing:
+    """
+    主进程与手势工作进程之间的共享内存帧缓冲区。
+    - 图像数据放在 multiprocessing.RawArray 里，两边都用 np.frombuffer 直接映射，
+      传递的只有槽位号和帧号，不会 pickle 任何 Numpy 数组。
+    - 只保留“最新帧”语义：工作进程总是处理最新写入的那一帧，旧帧直接被覆盖。
+    - 工作进程正在读的槽位会被标记为 busy，主进程写入时会跳过它。
+    """
+    def __init__(self, shape, slots=3, ctx=None):
+        ctx = ctx or mp_proc.get_context()
+        self.shape = tuple(shape)
+        self.slots = slots
+        self.frame_size = int(np.prod(self.shape))
+        self._buffer = ctx.RawArray('B', self.frame_size * slots)
+        self._timestamps = ctx.RawArray('d', slots)
+        self._busy = ctx.RawArray('b', slots)
+        self._latest_slot = ctx.RawValue('i', -1)
+        self._latest_id = ctx.RawValue('q', 0)
+        self._lock = ctx.Lock()
+        self._views = None
+
+    def __getstate__(self):
+        # Numpy 视图不能跨进程传递，子进程里按需重新映射
+        state = self.__dict__.copy()
+        state['_views'] = None
+        return state
+
+    def _view(self, slot):
+        if self._views is None:
+            flat = np.frombuffer(self._buffer, dtype=np.uint8)
+            self._views = [flat[i * self.frame_size:(i + 1) * self.frame_size].reshape(self.shape)
+                           for i in range(self.slots)]
+        return self._views[slot]
+
+    def write(self, frame, timestamp=None):
+        """主进程调用：把一帧拷进空闲槽位并发布为最新帧，返回帧号。"""
+        with self._lock:
+            latest = self._latest_slot.value
+            slot = next(i for i in range(self.slots) if i != latest and not self._busy[i])
+        # 拷贝在锁外进行，这个槽位既不是最新帧也没人在读
+        np.copyto(self._view(slot), frame)
+        with self._lock:
+            self._timestamps[slot] = time.monotonic() if timestamp is None else timestamp
+            self._latest_slot.value = slot
+            self._latest_id.value += 1
+            return self._latest_id.value
+
+    def acquire_latest(self):
+        """工作进程调用：锁定最新帧，返回 (slot, frame_id, timestamp)，没有帧时 slot 为 None。"""
+        with self._lock:
+            slot = self._latest_slot.value
+            if slot < 0:
+                return None, 0, 0.0
+            self._busy[slot] = 1
+            return slot, self._latest_id.value, self._timestamps[slot]
+
+    def release(self, slot):
+        with self._lock:
+            self._busy[slot] = 0
+
+    def frame(self, slot):
+        return self._view(slot)
+
+# ==============================================================================
+# 工作进程入口
+# ==============================================================================
+
+def _worker_main(ring, request_event, stop_event, result_queue, tracker_kwargs, adaptive):
+    """在独立进程中运行 HandTracker + GestureRecognizer。"""
+    # 在子进程里才导入并初始化 Mediapipe，避免主进程为它付出启动时间
+    from hand_tracker import HandTracker
+    from gesture_recognizer import GestureRecognizer
+
+    tracker = HandTracker(**tracker_kwargs)
+    recognizer = GestureRecognizer()
+    last_frame_id = 0
+    hands, gesture, confidence = [], "No Hand", 1.0
+    try:
+        while not stop_event.is_set():
+            if not request_event.wait(0.1):
+                continue
+            request_event.clear()
+            slot, frame_id, timestamp = ring.acquire_latest()
+            if slot is None:
+                continue
+            try:
+                if frame_id == last_frame_id:
+                    continue
+                if adaptive:
+                    results, ran = tracker.update(ring.frame(slot))
+                else:
+                    results, ran = tracker.process_frame(ring.frame(slot)), True
+            finally:
+                ring.release(slot)
+            last_frame_id = frame_id
+
+            # 只回传纯 Python 数据：每只手 21 个 (x, y, z)
+            # 运动检测跳过的帧也回一条 (沿用上次的结果)，主进程据此知道这一帧已处理完
+            if ran:
+                hands = []
+                gesture, confidence = "No Hand", 1.0
+                if results.multi_hand_landmarks:
+                    gesture, confidence = recognizer.recognize_with_confidence(results.multi_hand_landmarks[0])
+                    for hand_landmarks in results.multi_hand_landmarks:
+                        hands.append([(lm.x, lm.y, lm.z) for lm in hand_landmarks.landmark])
+            try:
+                result_queue.put_nowait((frame_id, timestamp, gesture, confidence, hands, time.monotonic() - timestamp))
+            except queue.Full:
+                pass  # 主进程一直没来取，丢掉这条结果，下一条会更新
+    finally:
+        tracker.close()
+
+# ==============================================================================
+# 结果对象
+# ==============================================================================
+
+class HandResults:
+    """
+    模仿 Mediapipe 的 results 对象，只提供 multi_hand_landmarks，
+    这样 HandTracker.draw_landmarks() 和 GestureRecognizer.recognize() 可以直接使用。
+    """
+    def __init__(self, hands):
+        self.multi_hand_landmarks = [_to_landmark_list(points) for points in hands] or None
+
+
+def _to_landmark_list(points):
+    # 优先还原成 Mediapipe 的 protobuf 对象，绘图工具需要它
+    from mediapipe.framework.formats import landmark_pb2
+    landmark_list = landmark_pb2.NormalizedLandmarkList()
+    for x, y, z in points:
+        landmark_list.landmark.add(x=x, y=y, z=z)
+    return landmark_list
+
+# ==============================================================================
+# 主进程侧接口 (HandWorker)
+# ==============================================================================
+
+class HandWorker:
+    """
+    手部追踪工作进程。主循环调用 submit() 投递画面、poll() 取最新结果，两者都不会阻塞。
+    """
+    def __init__(self, frame_shape=(240, 320, 3), slots=3, adaptive=False, **tracker_kwargs):
+        """
+        :param frame_shape: 投递的 RGB 画面尺寸 (高, 宽, 通道)。
+        :param adaptive: 用 HandTracker.update() 按运动自适应调度；几路画面交替投递时必须关闭
+                         (帧差和裁剪区域都只对同一个摄像头的连续画面有意义)。
+        :param tracker_kwargs: 传给 HandTracker 的参数。
+        """
+        print("Starting HandWorker process...")
+        # 主进程已经初始化了 CUDA，用 spawn 启动干净的子进程而不是 fork
+        ctx = mp_proc.get_context('spawn')
+        self.ring = SharedFrameRing(frame_shape, slots=slots, ctx=ctx)
+        self._request_event = ctx.Event()
+        self._stop_event = ctx.Event()
+        self._results = ctx.Queue(maxsize=8)
+        self._process = ctx.Process(
+            target=_worker_main,
+            args=(self.ring, self._request_event, self._stop_event, self._results, tracker_kwargs, adaptive),
+            name="hand_worker",
+            daemon=True,
+        )
+        self._process.start()
+        self.submitted = 0
+        self.completed = 0
+        self.last_latency = 0.0
+        self.last_frame_id = 0
+        self.last_submitted_id = 0
+
+    def submit(self, frame_rgb, timestamp=None):
+        """投递一帧 RGB 画面，立即返回帧号。"""
+        frame_id = self.ring.write(frame_rgb, timestamp)
+        self._request_event.set()
+        self.submitted += 1
+        self.last_submitted_id = frame_id
+        return frame_id
+
+    @property
+    def idle(self):
+        """最后投递的一帧已经取回结果 (几路收银台轮流共用一个工作进程时，据此决定何时投递下一路)。"""
+        return self.last_frame_id >= self.last_submitted_id
+
+    def poll(self):
+        """
+        取出目前为止最新的结果，不阻塞。
+        :return: (HandResults, gesture, confidence, timestamp, frame_id) ；没有新结果时返回 None。
+                 frame_id 与 submit() 返回的帧号对应，几路共用一个进程时据此判断结果属于哪一路。
+        """
+        latest = None
+        while True:
+            try:
+                latest = self._results.get_nowait()
+            except queue.Empty:
+                break
+            self.completed += 1
+        if latest is None:
+            return None
+        frame_id, timestamp, gesture, confidence, hands, latency = latest
+        self.last_frame_id = frame_id
+        self.last_latency = latency
+        return HandResults(hands), gesture, confidence, timestamp, frame_id
+
+    def is_alive(self):
+        return self._process.is_alive()
+
+    def close(self, timeout=2.0):
+        self._stop_event.set()
+        self._request_event.set()
+        self._process.join(timeout)
+        if self._process.is_alive():
+            self._process.terminate()
@@ -0,0 +1,295 @@
+#!/usr/bin/env python3
+# modules/lanes.py
+
+# ==============================================================================
+# 导入库
+# ==============================================================================
+import collections
+import json
+import math
+import time
+
+import cv2
+import numpy as np
+
+from camera_capture import DualCameraCapture, LockstepCapture
+from cart import Cart
+from checkout_state import CheckoutStateMachine
+from frame_buffers import HandFramePreprocessor
+from gesture_events import GestureEventEngine
+from fruit_tracker import FruitTracker
+from hand_worker import HandWorker
+from metrics import MetricsRegistry
+from ui_manager import UIManager
+
+# ==============================================================================
+# 多路收银台模式
+# ------------------------------------------------------------------------------
+# 一个进程同时驱动几个收银台 (每台一个水果摄像头 + 一个手势摄像头)：
+#   - 整个进程只加载一个检测器 (一个 TensorRT engine)，每一轮把所有需要检测的水果画面
+#     凑成一批调用 detect_batch()。CPU 后端真正拼成一个 batch 推理；
+#     detectNet 只接受单张图，Jetson 后端逐张送入，但省掉了 N 个进程各自的模型和显存。
+#   - 手部追踪交给少量 HandWorker 进程，几台收银台轮流共用 (HandScheduler)。
+#   - 每台收银台有自己的购物车 (和日志)、状态机和界面，最后缩小拼到同一个显示窗口里。
+# ==============================================================================
+
+TILE_SIZE = (480, 400)  # 每台收银台在合成画面中的尺寸 (单台界面 960x800 缩小一半)
+
+
+def load_lane_config(path):
+    """
+    读取收银台配置 (JSON)：
+    {"hand_workers": 2,
+     "lanes": [{"name": "Lane 1", "fruit": "csi://1", "hand": "csi://0"},
+               {"name": "Lane 2", "replay": "lane2.rec", "cart_journal": "cart_lane2.jsonl"}]}
+    """
+    with open(path) as f:
+        config = json.load(f)
+    lanes = config.get('lanes') or []
+    if not lanes:
+        raise ValueError(f"{path} does not define any lanes")
+    for i, spec in enumerate(lanes):
+        spec.setdefault('name', f"Lane {i + 1}")
+        if 'replay' not in spec and not ('fruit' in spec and 'hand' in spec):
+            raise ValueError(f"{spec['name']}: needs 'fruit' and 'hand' sources or a 'replay' file")
+    return config
+
+
+def tile_layout(count, tile_size=TILE_SIZE):
+    """按接近正方形的网格排列，返回 (显示宽, 显示高, [(x, y, w, h), ...])。"""
+    cols = int(math.ceil(math.sqrt(count)))
+    rows = int(math.ceil(count / cols))
+    w, h = tile_size
+    return cols * w, rows * h, [((i % cols) * w, (i // cols) * h, w, h) for i in range(count)]
+
+
+def open_lane_capture(spec, jetson_utils=None, max_skew=0.05, realtime=True):
+    """按配置打开一台收银台的两路视频源。回放文件用于在没有摄像头的机器上测试多路模式。"""
+    if 'replay' in spec:
+        from frame_recorder import FrameReplay
+        fruit_cam, hand_cam = FrameReplay(spec['replay']).sources(
+            realtime=realtime, loop=spec.get('loop', True), as_cuda=jetson_utils is not None)
+        return LockstepCapture(fruit_cam, hand_cam, max_skew=max_skew)
+    fruit_cam = jetson_utils.videoSource(spec['fruit'], argv=['--input-width=640', '--input-height=480', '--num-buffers=8'])
+    hand_cam = jetson_utils.videoSource(spec['hand'], argv=['--input-width=320', '--input-height=240', '--num-buffers=8'])
+    return DualCameraCapture(fruit_cam, hand_cam, max_skew=max_skew).start()
+
+# ==============================================================================
+# 单台收银台 (Lane)
+# ==============================================================================
+
+class Lane:
+    """一台收银台的全部状态：采集、水果追踪、手势、购物车、状态机和界面。"""
+    def __init__(self, name, capture, detector, catalog, say, cart_journal=None,
+                 detect_interval=5, metrics=None, transaction_log=None):
+        print(f"🧾 Initializing {name}...")
+        self.name = name
+        self.capture = capture
+        self.ui = UIManager()
+        self.tracker = FruitTracker(detector, detect_interval=detect_interval)
+        self.cart = Cart(journal_path=cart_journal)
+        self.state = CheckoutStateMachine(self.cart, catalog, say, on_reset=self.tracker.reset,
+                                          metrics=metrics, metric_labels={'lane': name},
+                                          announce_prefix=f"{name}, ",
+                                          transaction_log=transaction_log, lane=name)
+        self.hand_prep = HandFramePreprocessor()
+
+        self.pair = None
+        self.fruit_frame = None     # 最近一帧水果画面 (Numpy，已画好检测框)
+        self.hand_frame = None      # 最近一帧转换 + 镜像后的手势画面
+        self.hand_ts = 0.0
+        self.hand_new = False       # hand_frame 还没交给手部追踪
+        self.hand_results = None
+        self.gesture = "No Hand"
+        self.gesture_engine = GestureEventEngine()
+        self.gesture_events = []    # 本轮产生的手势事件
+        self.new_tracks = []
+
+    def close(self):
+        self.capture.stop()
+        self.cart.close()
+
+# ==============================================================================
+# 手部追踪调度 (HandScheduler)
+# ==============================================================================
+
+class HandScheduler:
+    """
+    把几台收银台的手势画面分给少量 HandWorker 进程。
+    收银台按顺序固定分到各个工作进程；一个进程同一时刻只处理一帧，
+    结果回来后轮到同组的下一台 (有新画面的) 收银台，谁也不会被饿死。
+    """
+    def __init__(self, lanes, num_workers, frame_shape=(240, 320, 3), stall_timeout=1.0):
+        """
+        :param num_workers: 工作进程数，最多与收银台数相同。
+        :param stall_timeout: 投递后超过这么久还没有结果 (结果被丢弃或进程卡住) 就换下一台。
+        """
+        num_workers = max(1, min(num_workers, len(lanes)))
+        self.stall_timeout = stall_timeout
+        self._groups = []
+        for w in range(num_workers):
+            group = lanes[w::num_workers]
+            # 几台收银台交替共用一个 Mediapipe 实例时，视频模式的跨帧追踪和运动检测都没有意义，
+            # 改用静态图片模式、每帧都跑；独占一个进程的收银台照常自适应调度
+            shared = len(group) > 1
+            worker = HandWorker(frame_shape=frame_shape, static_mode=shared, adaptive=not shared)
+            self._groups.append({'worker': worker, 'lanes': group, 'next': 0, 'busy_lane': None, 'sent': 0.0,
+                                 'frame_id': None})
+
+    def step(self):
+        """收取已完成的结果，并给空闲的工作进程投递下一帧。不阻塞。"""
+        now = time.monotonic()
+        for group in self._groups:
+            worker = group['worker']
+            result = worker.poll()
+            # 只接受当前这台收银台那一帧的结果：超时换台之后，上一台迟到的结果不能算到这一台头上
+            if result is not None and group['busy_lane'] is not None and result[4] == group['frame_id']:
+                lane = group['busy_lane']
+                lane.hand_results, lane.gesture, confidence, hand_ts, _ = result
+                lane.gesture_events.extend(lane.gesture_engine.push(lane.gesture, hand_ts, confidence))
+            if worker.idle or now - group['sent'] > self.stall_timeout:
+                group['busy_lane'] = None
+            if group['busy_lane'] is not None:
+                continue
+            lanes = group['lanes']
+            for offset in range(len(lanes)):
+                lane = lanes[(group['next'] + offset) % len(lanes)]
+                if lane.hand_new:
+                    group['frame_id'] = worker.submit(lane.hand_frame, lane.hand_ts)
+                    lane.hand_new = False
+                    group['busy_lane'] = lane
+                    group['sent'] = now
+                    group['next'] = (group['next'] + offset + 1) % len(lanes)
+                    break
+
+    def close(self):
+        for group in self._groups:
+            group['worker'].close()
+
+# ==============================================================================
+# 多路主循环 (MultiLaneRunner)
+# ==============================================================================
+
+class MultiLaneRunner:
+    def __init__(self, lanes, detector, hand_workers, qr_image, to_numpy, to_display, metrics=None,
+                 remote_stream=None):
+        """
+        :param lanes: Lane 列表。
+        :param detector: 所有收银台共用的 ObjectDetector。
+        :param hand_workers: 手部追踪工作进程数。
+        :param to_numpy / to_display: main.py 中 CUDA 图像与 Numpy 互转的函数。
+        :param remote_stream: 可选的 RemoteStream，拼接好的画面同时提供给远程查看。
+        """
+        self.lanes = lanes
+        self.detector = detector
+        self.qr_image = qr_image
+        self.to_numpy = to_numpy
+        self.to_display = to_display
+        self.hands = HandScheduler(lanes, hand_workers)
+        width, height, self.tiles = tile_layout(len(lanes))
+        self.composite = np.zeros((height, width, 3), dtype=np.uint8)
+        self.batch_sizes = collections.deque(maxlen=30)  # 最近几轮的检测批大小，显示在状态栏
+        self.metrics = metrics if metrics is not None else MetricsRegistry(enabled=False)
+        self.remote_stream = remote_stream
+        self._draw_landmarks = _landmark_drawer()
+
+    def step(self):
+        """
+        跑一轮所有收银台。
+        :return: 合成好的画面；所有收银台都没有新画面时返回 None。
+        """
+        # --- 采集 ---
+        any_new = False
+        for lane in self.lanes:
+            lane.pair = lane.capture.latest_pair()
+            lane.new_tracks = []
+            lane.gesture_events = []
+            if lane.pair is not None and (lane.pair.fruit_new or lane.pair.hand_new):
+                any_new = True
+        if not any_new:
+            return None
+
+        # --- 水果检测：先各自外推，需要检测的画面凑成一批 ---
+        batch = []
+        for lane in self.lanes:
+            pair = lane.pair
+            if pair is None or not pair.fruit_new:
+                continue
+            if lane.tracker.predict():
+                batch.append(lane)
+            else:
+                _, lane.new_tracks = lane.tracker.correct(pair.fruit)
+                lane.fruit_frame = self.to_numpy(pair.fruit)
+        if batch:
+            self.batch_sizes.append(len(batch))
+            with self.metrics.stage('detect'):
+                results = self.detector.detect_batch([lane.pair.fruit for lane in batch])
+            for lane, detections in zip(batch, results):
+                _, lane.new_tracks = lane.tracker.correct(lane.pair.fruit, detections)
+                lane.fruit_frame = self.to_numpy(lane.pair.fruit)
+
+        # --- 手势：每个新画面只转换一次，交给调度器 ---
+        for lane in self.lanes:
+            pair = lane.pair
+            if pair is not None and pair.hand_new:
+                lane.hand_frame = lane.hand_prep.process(self.to_numpy(pair.hand))
+                lane.hand_ts = pair.hand_ts
+                lane.hand_new = True
+        with self.metrics.stage('hand'):
+            self.hands.step()
+
+        # --- 状态机与界面 ---
+        with self.metrics.stage('compose'):
+            for lane, (x, y, w, h) in zip(self.lanes, self.tiles):
+                if lane.pair is None or lane.fruit_frame is None:
+                    continue
+                lane.state.update(max(lane.pair.fruit_ts, lane.pair.hand_ts), lane.gesture_events, lane.new_tracks)
+                screen = self._render_lane(lane)
+                cv2.resize(screen, (w, h), dst=self.composite[y:y + h, x:x + w], interpolation=cv2.INTER_AREA)
+        return self.composite
+
+    def _render_lane(self, lane):
+        ui = lane.ui
+        background = ui.create_background()
+        ui.draw_video_frames(background, lane.fruit_frame, lane.hand_frame)
+        hand_view = ui.hand_view(background)
+        self._draw_landmarks(hand_view, lane.hand_results)
+        ui.text_cache.put_text(hand_view, f"{lane.name}: {lane.gesture}", (10, 30), cv2.FONT_HERSHEY_SIMPLEX, 0.7, (255, 255, 0), 2)
+        ui.draw_shopping_cart(background, lane.cart.items, lane.cart.total)
+        if lane.state.checkout_mode:
+            background = ui.draw_qr_code(background, self.qr_image)
+        return background
+
+    def run(self, display):
+        """主循环：直到显示窗口关闭或所有收银台的视频源都结束。"""
+        while display.IsStreaming():
+            if not any(lane.capture.is_streaming() for lane in self.lanes):
+                break
+            composite = self.step()
+            if composite is None:
+                time.sleep(0.005)
+                continue
+            if self.remote_stream is not None:
+                self.remote_stream.offer(composite)
+            with self.metrics.stage('render'):
+                display.Render(self.to_display(composite))
+            avg_batch = sum(self.batch_sizes) / max(len(self.batch_sizes), 1)
+            display.SetStatus(f"Smart Fruit Stall | {len(self.lanes)} lanes | "
+                              f"Net: {self.detector.get_network_fps():.1f} FPS | Avg batch: {avg_batch:.1f}")
+
+    def close(self):
+        for lane in self.lanes:
+            lane.close()
+        self.hands.close()
+
+
+def _landmark_drawer():
+    """主进程只需要 Mediapipe 的绘图工具，不需要再创建一个 Hands 模型。"""
+    import mediapipe as mp
+    drawing, connections = mp.solutions.drawing_utils, mp.solutions.hands.HAND_CONNECTIONS
+
+    def draw(img, results):
+        if results and results.multi_hand_landmarks:
+            for hand_landmarks in results.multi_hand_landmarks:
+                drawing.draw_landmarks(img, hand_landmarks, connections)
+    return draw
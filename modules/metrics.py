@@ -0,0 +1,265 @@
+#!/usr/bin/env python3
+# modules/metrics.py
+
+# ==============================================================================
+# 导入库
+# ==============================================================================
+import bisect
+import http.server
+import socketserver
+import threading
+import time
+
+# ==============================================================================
+# 指标类型
+# ==============================================================================
+# 热路径上只做几次整数/浮点加法，不加锁：HTTP 线程读取时偶尔看到“少算一次”的数据，
+# 对监控来说完全可以接受，换来的是主循环里几乎为零的开销。
+
+# 延迟直方图的默认桶 (秒)，覆盖 0.5 ms ~ 1 s
+LATENCY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.015, 0.02, 0.025,
+                   0.035, 0.05, 0.075, 0.1, 0.25, 0.5, 1.0)
+
+
+class Counter:
+    def __init__(self, name, help_text, labels=None):
+        self.name = name
+        self.help = help_text
+        self.labels = labels or {}
+        self.value = 0
+
+    def inc(self, amount=1):
+        self.value += amount
+
+
+class Gauge:
+    def __init__(self, name, help_text, labels=None):
+        self.name = name
+        self.help = help_text
+        self.labels = labels or {}
+        self.value = 0.0
+
+    def set(self, value):
+        self.value = value
+
+
+class Histogram:
+    """固定桶直方图，另外维护一个指数滑动平均值，给屏幕叠加层显示用。"""
+    def __init__(self, name, help_text, labels=None, buckets=LATENCY_BUCKETS, ewma_alpha=0.1):
+        self.name = name
+        self.help = help_text
+        self.labels = labels or {}
+        self.buckets = tuple(buckets)
+        self.counts = [0] * (len(self.buckets) + 1)  # 最后一个是 +Inf
+        self.count = 0
+        self.sum = 0.0
+        self.ewma = 0.0
+        self._alpha = ewma_alpha
+
+    def observe(self, value):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.count += 1
+        self.sum += value
+        self.ewma = value if self.count == 1 else self.ewma + self._alpha * (value - self.ewma)
+
+    def percentile(self, q):
+        """由桶计数估算分位数 (桶内线性插值)。"""
+        if not self.count:
+            return 0.0
+        target = self.count * q / 100.0
+        seen = 0
+        lower = 0.0
+        for upper, count in zip(self.buckets + (float('inf'),), self.counts):
+            if seen + count >= target and count:
+                if upper == float('inf'):
+                    return lower
+                return lower + (upper - lower) * (target - seen) / count
+            seen += count
+            lower = upper
+        return lower
+
+# ==============================================================================
+# 计时上下文
+# ==============================================================================
+
+class _StageTimer:
+    """每次 stage() 都新建一个：开始时间存在各自的实例里，嵌套或多线程同时计时互不干扰。"""
+    __slots__ = ('_hist', '_start')
+
+    def __init__(self, hist):
+        self._hist = hist
+
+    def __enter__(self):
+        self._start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self._hist.observe(time.perf_counter() - self._start)
+        return False
+
+
+class _NullTimer:
+    """关闭指标时使用的空计时器：进入/退出什么都不做。"""
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+_NULL_TIMER = _NullTimer()
+
+# ==============================================================================
+# 指标注册表 (MetricsRegistry)
+# ==============================================================================
+
+class MetricsRegistry:
+    """
+    汇总所有计数器、仪表和直方图。
+    - stage(name) 返回一个计时上下文，把耗时记录到 stage_seconds{stage=name}。
+    - enabled=False 时 stage() 返回共享的空计时器，计数器照常累加 (只是一次加法)。
+    - 指标可能在任意线程第一次用到时才注册：注册和遍历都在锁内进行，
+      已经存在的指标照旧不加锁直接取 (字典查找在插入的同时进行也是安全的)。
+    """
+    def __init__(self, prefix="smart_checkout", enabled=True):
+        self.prefix = prefix
+        self.enabled = enabled
+        self._metrics = {}      # (name, labels) -> metric，保持注册顺序
+        self._stage_hists = {}  # 阶段名 -> stage_seconds 直方图
+        self._lock = threading.Lock()
+
+    def _get(self, cls, name, help_text, labels, **kwargs):
+        key = (name, tuple(sorted((labels or {}).items())))
+        metric = self._metrics.get(key)
+        if metric is None:
+            with self._lock:
+                metric = self._metrics.get(key)
+                if metric is None:
+                    metric = cls(name, help_text, labels, **kwargs)
+                    self._metrics[key] = metric
+        return metric
+
+    def counter(self, name, help_text="", labels=None):
+        return self._get(Counter, name, help_text, labels)
+
+    def gauge(self, name, help_text="", labels=None):
+        return self._get(Gauge, name, help_text, labels)
+
+    def histogram(self, name, help_text="", labels=None, buckets=LATENCY_BUCKETS):
+        return self._get(Histogram, name, help_text, labels, buckets=buckets)
+
+    def stage(self, name):
+        if not self.enabled:
+            return _NULL_TIMER
+        hist = self._stage_hists.get(name)
+        if hist is None:
+            hist = self.histogram("stage_seconds", "Latency of each main-loop stage", {'stage': name})
+            with self._lock:
+                hist = self._stage_hists.setdefault(name, hist)
+        return _StageTimer(hist)
+
+    def stage_histograms(self):
+        with self._lock:
+            return list(self._stage_hists.items())
+
+    # --------------------------------------------------------------------------
+    # 输出
+    # --------------------------------------------------------------------------
+    def render_prometheus(self):
+        """生成 Prometheus 文本格式 (0.0.4)。"""
+        lines = []
+        described = set()
+        # 同名指标 (不同标签) 必须连续输出，按名字第一次出现的顺序分组
+        with self._lock:
+            metrics = list(self._metrics.values())
+        order = {}
+        for metric in metrics:
+            order.setdefault(metric.name, len(order))
+        for metric in sorted(metrics, key=lambda m: order[m.name]):
+            full = f"{self.prefix}_{metric.name}"
+            if full not in described:
+                described.add(full)
+                kind = {Counter: 'counter', Gauge: 'gauge', Histogram: 'histogram'}[type(metric)]
+                lines.append(f"# HELP {full} {metric.help}")
+                lines.append(f"# TYPE {full} {kind}")
+            if isinstance(metric, Histogram):
+                cumulative = 0
+                for upper, count in zip(metric.buckets, metric.counts):
+                    cumulative += count
+                    lines.append(f"{full}_bucket{_labels(metric.labels, le=repr(upper))} {cumulative}")
+                lines.append(f"{full}_bucket{_labels(metric.labels, le='+Inf')} {metric.count}")
+                lines.append(f"{full}_sum{_labels(metric.labels)} {metric.sum}")
+                lines.append(f"{full}_count{_labels(metric.labels)} {metric.count}")
+            else:
+                lines.append(f"{full}{_labels(metric.labels)} {metric.value}")
+        return "\n".join(lines) + "\n"
+
+    def overlay_lines(self):
+        """屏幕叠加层用的简短文字：每个阶段的滑动平均耗时 (ms)。"""
+        return [f"{name:<9}{hist.ewma * 1000:6.1f} ms" for name, hist in self.stage_histograms()]
+
+
+def _labels(labels, **extra):
+    merged = dict(labels)
+    merged.update(extra)
+    if not merged:
+        return ""
+    return "{" + ",".join(f'{k}="{v}"' for k, v in merged.items()) + "}"
+
+# ==============================================================================
+# 本地 HTTP 端点 (MetricsServer)
+# ==============================================================================
+
+class _ThreadingHTTPServer(socketserver.ThreadingMixIn, http.server.HTTPServer):
+    daemon_threads = True
+
+
+class MetricsServer:
+    """在后台线程提供 http://<host>:<port>/metrics (Prometheus 文本格式)。"""
+    def __init__(self, registry, port=9100, host="127.0.0.1"):
+        class Handler(http.server.BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path.split('?')[0] != '/metrics':
+                    self.send_error(404)
+                    return
+                body = registry.render_prometheus().encode()
+                self.send_response(200)
+                self.send_header('Content-Type', 'text/plain; version=0.0.4; charset=utf-8')
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *args):
+                pass  # 不要每次抓取都往终端打日志
+
+        self._server = _ThreadingHTTPServer((host, port), Handler)
+        self.port = self._server.server_address[1]
+        self._thread = threading.Thread(target=self._server.serve_forever, name="metrics_server", daemon=True)
+        self._thread.start()
+        print(f"Metrics endpoint: http://{host}:{self.port}/metrics")
+
+    def close(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+# ==============================================================================
+# 单独测试代码
+# ==============================================================================
+# 运行 `python3 modules/metrics.py` 启动一个带模拟数据的端点，用 curl 查看输出。
+if __name__ == '__main__':
+    import random
+    registry = MetricsRegistry()
+    server = MetricsServer(registry, port=9100)
+    frames = registry.counter("frames_total", "Frames processed by the main loop")
+    try:
+        while True:
+            for stage, mean in (('capture', 0.002), ('detect', 0.030), ('render', 0.008)):
+                with registry.stage(stage):
+                    time.sleep(random.expovariate(1.0 / mean))
+            frames.inc()
+            if frames.value % 30 == 0:
+                print(" | ".join(registry.overlay_lines()))
+    except KeyboardInterrupt:
+        server.close()
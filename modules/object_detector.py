@@ -5,14 +5,68 @@
 # 导入必要的库
 # ==============================================================================
 
-# --- Jetson Inference 核心库 ---
-# NVIDIA为Jetson平台提供的、用于高性能AI推理的Python库。
-# etson Inference封装了TensorRT，能以极高的效率运行AI模型。
-import jetson.inference 
-import jetson.utils      # 导入工具库，再侧睡代码中用的
+# --- 推理后端 ---
+# 具体的推理库 (jetson.inference / onnxruntime / OpenCV DNN) 由后端在创建时按需导入，
+# 这样在没有 Jetson 的 x86 服务器上也能运行、测试和基准测试整个检测流程。
+from detector_backends import Detection, create_backend, load_labels
+from engine_cache import BackgroundLoader
 
 # --- 系统库 ---
+import os
 import sys
+import time
+
+# ==============================================================================
+# 模型注册表 (MODEL_REGISTRY)
+# ------------------------------------------------------------------------------
+# 所有可用的检测模型。路径相对于项目根目录，threshold 是认为“有把握”的置信度。
+# 级联时第一个模型 (水果) 每帧都跑；第二个模型 (超市通用商品) 只在第一个模型没把握时才跑，
+# 而且第一次需要时才在后台加载 (加载期间照常只用第一个模型) —— 模型文件不存在时级联自动关闭。
+# ==============================================================================
+
+MODEL_REGISTRY = {
+    'fruit': {'model': "models/fruit/ssd-mobilenet.onnx", 'labels': "models/fruit/labels.txt", 'threshold': 0.8},
+    'supermarket': {'model': "models/supermarket/ssd-mobilenet.onnx", 'labels': "models/supermarket/labels.txt",
+                    'threshold': 0.6},
+}
+
+
+# 级联裁剪区域的边长取整到这个倍数：同一个物体前后几帧的裁剪尺寸相同，后端可以复用裁剪缓冲区
+CROP_ALIGN = 32
+
+
+def unified_labels(label_lists):
+    """
+    把几个模型的类别合并成一个统一的类别空间：第一个模型的类别原样保留 (class_id 不变)，
+    后面模型里的新类别依次追加，同名类别 (不区分大小写，例如两个模型都有的 apple) 合并成一个。
+    SSD 模型的第 0 类是背景，所以每个类别文件的第一行都必须是 BACKGROUND (它们合并成统一的第 0 类)。
+    :param label_lists: 每个模型的类别列表，按级联顺序。
+    :return: (统一的类别列表, 每个模型 本地 class_id -> 统一 class_id 的列表)。
+    """
+    labels, ids, maps = [], {}, []
+    for model_labels in label_lists:
+        mapping = []
+        for label in model_labels:
+            key = label.strip().lower()
+            if key not in ids:
+                ids[key] = len(labels)
+                labels.append(label)
+            mapping.append(ids[key])
+        maps.append(mapping)
+    return labels, maps
+
+
+def _snap(lo, hi, limit, align=CROP_ALIGN):
+    """把区域 [lo, hi) 的长度向上取整到 align 的倍数 (放不下时取整幅)，必要时往里挪，不超出 [0, limit)。"""
+    size = min(limit, int(-(-(hi - lo) // align) * align))
+    start = int(min(max(0, (lo + hi - size) / 2), limit - size))
+    return start, start + size
+
+
+def registry_labels(names, registry=None):
+    """只读取类别文件、不加载模型，得到级联的统一类别列表 (给商品目录用)。"""
+    registry = registry or MODEL_REGISTRY
+    return unified_labels([load_labels(registry[name]['labels']) for name in names])[0]
 
 # ==============================================================================
 # 定义ObjectDetector类
@@ -23,11 +77,14 @@ class ObjectDetector:
     一个专门用于水果识别的检测器类，这个脚本不能使用OpenCV，OpenCV会和jetson.inference冲突，后面画框都直接在GPU上画，节省时间还避免了opencv
     - 只依赖NVIDIA官方库，不引入OpenCV，避免潜在的OpenCV库冲突
     - 充分利用TensorRT进行GPU加速推理。
+    - 推理后端可插拔：'jetson' (TensorRT, 默认) 或 'cpu' (ONNX Runtime / OpenCV DNN)，
+      两者返回相同字段的检测结果 (ClassID, Confidence, Left/Top/Right/Bottom)。
     """
     # --------------------------------------------------------------------------
     # 初始化方法 (__init__)
     # --------------------------------------------------------------------------
-    def __init__(self, model_path, labels_path, threshold=0.8):
+    def __init__(self, model_path, labels_path, threshold=0.8, backend='jetson', secondary=None,
+                 candidate_threshold=0.4, sweep_interval=1.0, max_crops=3, crop_margin=0.25, **backend_kwargs):
         """
         当创建ObjectDetector对象时，这个方法会被调用。
         它负责加载并初始化AI模型。
@@ -35,26 +92,172 @@ class ObjectDetector:
         :param model_path: ONNX模型文件的路径 
         :param labels_path: 标签文件的路径 
         :param threshold: 置信度阈值
+        :param backend: 推理后端，'jetson'、'cpu' 或 'auto'
+        :param secondary: 级联的第二个模型，MODEL_REGISTRY 中的一项 ({'model', 'labels', 'threshold'})；
+                          None 表示不级联。第一次需要时才在后台加载。
+        :param candidate_threshold: 级联时第一个模型的候选阈值：介于它和 threshold 之间的框是“没把握的区域”，
+                                    裁剪下来交给第二个模型。
+        :param sweep_interval: 第一个模型一个有把握的框都没有时，最多每隔这么多秒让第二个模型看一次整帧
+                               (找第一个模型完全不认识的商品)。
+        :param max_crops: 没把握的区域超过这么多个时，改为第二个模型看整帧一次。
+        :param crop_margin: 裁剪区域向四周扩大的比例。
+        :param backend_kwargs: 传给后端的额外参数 (例如 CPU 后端的 runtime='opencv')
         """
         print("正在初始化水果识别模型...")
-        
-        # --- 构造命令行参数 ---
-        # jetson.inference本来需要命令行参数        
-        # 我们可以通过一个列表来模拟命令行参数，以配置模型的加载方式。
-        argv = [
-            f"--model={model_path}",     # 指定ONNX模型文件的位置
-            f"--labels={labels_path}",    # 指定标签文件的位置
-            "--input-blob=input_0",      # 告诉网络输入的节点名称 (通常在模型转换时定义)
-            "--output-cvg=scores",     # 告诉网络输出分数的节点名称
-            "--output-bbox=boxes"      # 告诉网络输出边界框的节点名称
-        ]
-        
-        # --- 加载网络并触发TensorRT优化 ---
-        # 当第一次运行的时候：解析ONNX、TensorRT优化、生成Engine
-        # 当第二次及以后运行时，直接加载缓存的Engine文件，推理会非常快
-        self.net = jetson.inference.detectNet(argv=argv, threshold=threshold)
-        
-        print("水果识别模型初始化完毕。")
+        if secondary and not os.path.exists(secondary['model']):
+            # 没有部署第二个模型：和不级联完全一样 (包括 GPU 上画的类别名和置信度)
+            print(f"[ObjectDetector] Secondary model {secondary['model']} not found, cascade disabled")
+            secondary = None
+        self.threshold = threshold
+        self.secondary = secondary
+        self.candidate_threshold = min(candidate_threshold, threshold)
+        self.sweep_interval = sweep_interval
+        self.max_crops = max_crops
+        self.crop_margin = crop_margin
+        # 级联时第一个模型用较低的候选阈值，才能看到“没把握”的框
+        primary_threshold = self.candidate_threshold if secondary else threshold
+        self.backend = create_backend(backend, model_path, labels_path, threshold=primary_threshold, **backend_kwargs)
+        print(f"水果识别模型初始化完毕。(后端: {self.backend.name})")
+
+        # --- 统一的类别空间 ---
+        label_lists = [load_labels(labels_path)] + ([load_labels(secondary['labels'])] if secondary else [])
+        self.labels, maps = unified_labels(label_lists)
+        # 统一 class_id -> (画框用的后端编号, 该后端的本地 class_id)；0 号是第一个模型
+        self._owners = {unified: (0, local) for local, unified in enumerate(maps[0])}
+        self._secondary_map = maps[1] if secondary else []
+        for local, unified in enumerate(self._secondary_map):
+            self._owners.setdefault(unified, (1, local))
+
+        # --- 第二个模型 (懒加载) ---
+        self._backend_name = self.backend.name
+        self._secondary_kwargs = {k: v for k, v in backend_kwargs.items() if k != 'engine_cache'}  # engine 缓存各管各的
+        self._secondary_backend = None
+        self._secondary_loader = None
+        self._secondary_failed = False
+        self._last_sweep = 0.0
+        self.cascade_frames = 0     # 第二个模型实际运行的帧数
+        self.cascade_crops = 0
+        self.cascade_sweeps = 0
+        self.frames = 0
+
+    @classmethod
+    def from_registry(cls, names=('fruit',), backend='jetson', registry=None, **kwargs):
+        """
+        按注册表中的模型名创建检测器。
+        :param names: 一个或两个模型名；两个时第二个是级联的第二个模型。
+        :param kwargs: 其余参数同 __init__ (engine_cache 等后端参数只用于第一个模型)。
+        """
+        registry = registry or MODEL_REGISTRY
+        if not 1 <= len(names) <= 2:
+            raise ValueError("a detector cascade has one or two models")
+        primary = registry[names[0]]
+        secondary = registry[names[1]] if len(names) > 1 else None
+        return cls(primary['model'], primary['labels'], threshold=primary['threshold'], backend=backend,
+                   secondary=secondary, **kwargs)
+
+    # --------------------------------------------------------------------------
+    # 级联 (cascade)
+    # --------------------------------------------------------------------------
+    def _load_secondary(self):
+        """
+        返回第二个模型，还没加载好时返回 None。
+        第一次需要时在后台线程加载 (TensorRT 第一次优化要好几分钟，不能卡住检测阶段)；
+        加载失败 (例如模型文件不存在) 就关闭级联，不影响第一个模型。
+        """
+        if self._secondary_backend is not None or self._secondary_failed:
+            return self._secondary_backend
+        spec = self.secondary
+        if self._secondary_loader is None:
+            if not os.path.exists(spec['model']):
+                self._secondary_failed = True
+                print(f"[ObjectDetector] Secondary model disabled: {spec['model']} not found")
+                return None
+            print(f"正在后台加载级联模型 {spec['model']}...")
+            self._secondary_loader = BackgroundLoader(
+                lambda: create_backend(self._backend_name, spec['model'], spec['labels'],
+                                       threshold=spec['threshold'], **self._secondary_kwargs),
+                name="secondary_loader")
+            return None
+        if not self._secondary_loader.done:
+            return None
+        try:
+            self._secondary_backend = self._secondary_loader.get()
+            print(f"级联模型加载完毕 ({self._secondary_loader.elapsed:.1f}s)")
+        except Exception as e:
+            self._secondary_failed = True
+            print(f"[ObjectDetector] Secondary model disabled: {e}")
+        return self._secondary_backend
+
+    def _cascade(self, img, detections):
+        """
+        在第一个模型的结果上执行级联，返回统一类别空间中的最终结果。
+        - 有把握 (>= threshold) 的框直接采用，第二个模型不会为它们运行；
+        - 没把握的框裁剪下来 (或者区域太多时整帧一次) 交给第二个模型，采用它有把握的结果；
+        - 一个有把握的框都没有时，限速地让第二个模型看一次整帧。
+        """
+        self.frames += 1
+        confident = [d for d in detections if d.Confidence >= self.threshold]
+        uncertain = [d for d in detections if d.Confidence < self.threshold]
+        now = time.monotonic()
+        sweep = not confident and now - self._last_sweep >= self.sweep_interval
+        if not uncertain and not sweep:
+            return confident
+        backend = self._load_secondary()
+        if backend is None:
+            return confident
+        self.cascade_frames += 1
+        width, height = self._image_size(img)
+        if sweep or len(uncertain) > self.max_crops:
+            self._last_sweep = now
+            self.cascade_sweeps += 1
+            regions = [(0, 0, width, height)]
+        else:
+            regions = [self._expand(d, width, height) for d in uncertain]
+            self.cascade_crops += len(regions)
+        found = []
+        for left, top, right, bottom in regions:
+            if right - left < 2 or bottom - top < 2:
+                continue
+            whole = (left, top, right, bottom) == (0, 0, width, height)
+            view = img if whole else backend.crop(img, (left, top, right, bottom))
+            for d in backend.detect(view, overlay='none'):
+                if not 0 <= d.ClassID < len(self._secondary_map):
+                    continue
+                box = (d.Left + left, d.Top + top, d.Right + left, d.Bottom + top)
+                if any(_iou(box, c) > 0.5 for c in confident + found):
+                    continue  # 同一个物体第一个模型已经认出来了，或者相邻的裁剪区域重复检出
+                found.append(Detection(self._secondary_map[d.ClassID], d.Confidence, *box))
+        return confident + found
+
+    def _expand(self, det, width, height):
+        dx, dy = (det.Right - det.Left) * self.crop_margin, (det.Bottom - det.Top) * self.crop_margin
+        left, right = _snap(det.Left - dx, det.Right + dx, width)
+        top, bottom = _snap(det.Top - dy, det.Bottom + dy, height)
+        return left, top, right, bottom
+
+    @staticmethod
+    def _image_size(img):
+        # CUDA 图像有 width/height 属性；Numpy 图像用 shape
+        if hasattr(img, 'shape') and not hasattr(img, 'width'):
+            return img.shape[1], img.shape[0]
+        return img.width, img.height
+
+    def _draw(self, img, detections):
+        for det in detections:
+            self._draw_rect(img, (det.Left, det.Top, det.Right, det.Bottom), det.ClassID)
+
+    def _draw_rect(self, img, box, class_id):
+        # 统一 class_id 交给它所属的模型画 (各用各的类别颜色)
+        owner, local = self._owners.get(class_id, (0, class_id))
+        backend = self._secondary_backend if owner == 1 and self._secondary_backend is not None else self.backend
+        backend.draw_rect(img, box, local)
+
+    def cascade_stats(self):
+        """第二个模型运行的比例，用来确认它没有在每帧都跑。"""
+        return {'frames': self.frames, 'secondary_frames': self.cascade_frames, 'crops': self.cascade_crops,
+                'sweeps': self.cascade_sweeps,
+                'secondary_ratio': self.cascade_frames / self.frames if self.frames else 0.0,
+                'secondary_loaded': self._secondary_backend is not None}
 
     # --------------------------------------------------------------------------
     # 检测与绘制方法 (detect_and_draw)
@@ -67,14 +270,64 @@ class ObjectDetector:
         :return: 一个包含所有检测结果的列表 (detections)。
         """
         # --- GPU快速推理 ---
-        # self.net.Detect() 直接将GPU中的图像直接送入TensorRT。
+        # Jetson 后端直接将GPU中的图像直接送入TensorRT。
         # 所有的计算都在GPU上完成
         # 'overlay'可以使得在函数在完成检测后，直接在原始图像上绘制边界框(box)、标签(labels)和置信度(conf)，相当于直接在GPU完成，避免把数据拷贝到CPU在用OpenCV绘制
-        detections = self.net.Detect(original_img, overlay='box,labels,conf')
-        
-        # 返回检测结果列表。每个结果是一个对象，包含了类别ID、置信度、边界框坐标等信息。
+        if not self.secondary:
+            detections = self.backend.detect(original_img, overlay='box,labels,conf')
+            # 返回检测结果列表。每个结果是一个对象，包含了类别ID、置信度、边界框坐标等信息。
+            return detections
+        # 级联：先不画，候选框里有没把握的；合并后只画最终结果
+        detections = self._cascade(original_img, self.backend.detect(original_img, overlay='none'))
+        self._draw(original_img, detections)
         return detections
 
+    # --------------------------------------------------------------------------
+    # 批量检测方法 (detect_batch)
+    # --------------------------------------------------------------------------
+    def detect_batch(self, original_imgs, overlay=True):
+        """
+        一次对多帧图像执行检测。CPU 后端会把它们拼成一个 batch 只推理一次。
+        
+        :param original_imgs: 图像列表。
+        :param overlay: 是否把结果画到各自的图像上。
+        :return: 与输入顺序对应的检测结果列表的列表。
+        """
+        if not self.secondary:
+            return self.backend.detect_batch(original_imgs, overlay='box,labels,conf' if overlay else 'none')
+        results = self.backend.detect_batch(original_imgs, overlay='none')
+        results = [self._cascade(img, detections) for img, detections in zip(original_imgs, results)]
+        if overlay:
+            for img, detections in zip(original_imgs, results):
+                self._draw(img, detections)
+        return results
+
+    # --------------------------------------------------------------------------
+    # 绘制追踪框方法 (draw_boxes)
+    # --------------------------------------------------------------------------
+    def draw_boxes(self, original_img, boxes):
+        """
+        在不运行检测的帧上，把追踪器外推出来的框直接画在GPU图像上。
+        
+        :param original_img: CUDA图像。
+        :param boxes: [(box, class_id), ...]，box 为 (left, top, right, bottom)。
+        """
+        for box, class_id in boxes:
+            left, top, right, bottom = (float(v) for v in box)
+            # 与 overlay='box' 一样使用类别颜色
+            self._draw_rect(original_img, (left, top, right, bottom), class_id)
+
+    # --------------------------------------------------------------------------
+    # 获取类别名称方法 (get_class_name)
+    # --------------------------------------------------------------------------
+    def get_class_name(self, class_id):
+        """
+        返回小写、去掉空白的类别名 (例如 "apple")，与价格表的键一致。class_id 属于统一的类别空间。
+        """
+        if 0 <= class_id < len(self.labels):
+            return self.labels[class_id].strip().lower()
+        return self.backend.get_class_desc(class_id).strip().lower()
+
     # --------------------------------------------------------------------------
     # 获取性能指标方法 (get_network_fps)
     # --------------------------------------------------------------------------
@@ -83,13 +336,26 @@ class ObjectDetector:
         获取AI模型本身的推理速度（FPS - 每秒帧数）。
         这个值只反应GPU处理模型的速度，不管手势那边的检测速度
         """
-        return self.net.GetNetworkFPS()
+        return self.backend.get_network_fps()
+
+
+
+def _iou(a, b):
+    """a、b 为 (left, top, right, bottom) 元组或带 Left/Top/Right/Bottom 的检测结果。"""
+    if not isinstance(b, tuple):
+        b = (b.Left, b.Top, b.Right, b.Bottom)
+    left, top = max(a[0], b[0]), max(a[1], b[1])
+    right, bottom = min(a[2], b[2]), min(a[3], b[3])
+    inter = max(0.0, right - left) * max(0.0, bottom - top)
+    union = (a[2] - a[0]) * (a[3] - a[1]) + (b[2] - b[0]) * (b[3] - b[1]) - inter
+    return inter / union if union > 0 else 0.0
 
 # ==============================================================================
 # 3单独测试的代码（单独检测水果识别有没有问题）
 # ==============================================================================
 # 这部分代码在直接运行 `python3 modules/object_detector.py` 时执行。
 if __name__ == '__main__':
+    import jetson.utils
     print("以独立模式运行水果检测模块 (纯净版)...")
 
     # 定义模型文件所在的路径
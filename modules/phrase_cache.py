@@ -0,0 +1,267 @@
+#!/usr/bin/env python3
+# modules/phrase_cache.py
+
+# ==============================================================================
+# 导入库
+# ==============================================================================
+import collections
+import hashlib
+import os
+import re
+import shutil
+import subprocess
+import wave
+
+import numpy as np
+
+# ==============================================================================
+# 预合成语音缓存 (PhraseCache)
+# ------------------------------------------------------------------------------
+# 播报的句子种类很少、可以预见："Welcome"、"<水果> added."、"Undo <水果>."、总价……
+# 把它们提前用 espeak 合成为 wav 文件，播报时只需要 aplay 播放，
+# 不再在检测器和 Mediapipe 最忙的时候现场合成。
+#   - 缓存键 = (文本, 声音, 语速) 的哈希，换声音/语速不会播错文件。
+#   - 固定短语 (pin) 永不淘汰，文件名记在缓存目录的 pinned.txt 里，重启后仍然是固定的；
+#     价格等动态短语按 LRU 淘汰。
+#   - 句子中的数字拆成预先合成的数字片段 ("seven" "point" "five" "zero")，
+#     用 wave 模块拼接，没见过的总价也不需要完整合成。
+# ==============================================================================
+
+DEFAULT_CACHE_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), '.phrase_cache')
+
+_ONES = ("zero one two three four five six seven eight nine ten eleven twelve thirteen "
+         "fourteen fifteen sixteen seventeen eighteen nineteen").split()
+_TENS = "_ _ twenty thirty forty fifty sixty seventy eighty ninety".split()
+NUMBER_WORDS = tuple(_ONES) + tuple(_TENS[2:]) + ("hundred", "point")
+
+_NUMBER_RE = re.compile(r'\d+(?:\.\d+)?')
+_GAP_SECONDS = 0.04        # 拼接片段之间保留的停顿
+_SILENCE_LEVEL = 300       # 低于这个幅度 (int16) 的首尾样本视为静音，拼接前裁掉
+PIN_MANIFEST = 'pinned.txt'
+
+
+def number_to_words(text):
+    """把 "127" / "7.50" 读成单词列表，读法与 espeak 对原句的读法一致 (小数部分逐位读)。"""
+    integer, _, fraction = text.partition('.')
+    n = int(integer)
+    if n >= 1000:
+        return None  # 超出片段覆盖范围，整句合成
+    words = []
+    if n >= 100:
+        words += [_ONES[n // 100], "hundred"]
+        n %= 100
+    if n >= 20:
+        words.append(_TENS[n // 10])
+        if n % 10:
+            words.append(_ONES[n % 10])
+    elif n or not words:
+        words.append(_ONES[n])
+    if fraction:
+        words.append("point")
+        words += [_ONES[int(d)] for d in fraction]
+    return words
+
+
+class PhraseCache:
+    """
+    wav 文件缓存。只在语音线程 (或部署脚本) 中使用，不加锁。
+    """
+    def __init__(self, cache_dir=DEFAULT_CACHE_DIR, voice="en", rate=250, max_dynamic=64,
+                 synth_cmd="espeak", play_cmd="aplay"):
+        """
+        :param voice: espeak 声音名 (-v)。
+        :param rate: 语速，每分钟单词数 (-s)。与 pyttsx3 默认语速 +50 一致。
+        :param max_dynamic: 动态短语 (未 pin 的) 最多保留的文件数。
+        """
+        self.cache_dir = cache_dir
+        self.voice = voice
+        self.rate = rate
+        self.max_dynamic = max_dynamic
+        self.synth_cmd = shutil.which(synth_cmd) or shutil.which("espeak-ng")
+        self.play_cmd = shutil.which(play_cmd)
+        self.hits = 0
+        self.misses = 0
+        self.assembled = 0
+        self.evictions = 0
+        self._dynamic = collections.OrderedDict()   # 文件名 -> None，按最近使用排序
+        os.makedirs(cache_dir, exist_ok=True)
+        # 部署时 (或上次运行) 固定下来的短语从清单恢复，不计入动态条目的上限；
+        # 其余文件当作动态条目 (最旧的先淘汰)
+        self._manifest = self._path(PIN_MANIFEST)
+        existing = [f for f in os.listdir(cache_dir) if f.endswith('.wav')]
+        self._pinned = self._load_manifest() & set(existing)
+        for name in sorted(existing, key=lambda f: os.path.getmtime(os.path.join(cache_dir, f))):
+            if name not in self._pinned:
+                self._dynamic[name] = None
+
+    @property
+    def available(self):
+        """本机有 espeak 和 aplay 时才能使用缓存，否则调用方退回 pyttsx3。"""
+        return bool(self.synth_cmd and self.play_cmd)
+
+    def _filename(self, text):
+        digest = hashlib.sha1(f"{self.voice}|{self.rate}|{text}".encode()).hexdigest()[:20]
+        return digest + '.wav'
+
+    def _path(self, name):
+        return os.path.join(self.cache_dir, name)
+
+    # --------------------------------------------------------------------------
+    # 合成与查找
+    # --------------------------------------------------------------------------
+    def _synthesize(self, text, path):
+        tmp = path + '.tmp'
+        subprocess.run([self.synth_cmd, '-v', self.voice, '-s', str(self.rate), '-w', tmp, text],
+                       check=True, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        os.replace(tmp, path)  # 合成到一半被打断时不会留下残缺的缓存文件
+
+    def _load_manifest(self):
+        try:
+            with open(self._manifest) as f:
+                return {line.strip() for line in f if line.strip()}
+        except OSError:
+            return set()
+
+    def _touch(self, name, pinned):
+        if pinned:
+            if name not in self._pinned:
+                self._pinned.add(name)
+                with open(self._manifest, 'a') as f:
+                    f.write(name + '\n')
+            self._dynamic.pop(name, None)
+        elif name not in self._pinned:
+            self._dynamic[name] = None
+            self._dynamic.move_to_end(name)
+            while len(self._dynamic) > self.max_dynamic:
+                victim, _ = self._dynamic.popitem(last=False)
+                try:
+                    os.remove(self._path(victim))
+                except OSError:
+                    pass
+                self.evictions += 1
+
+    def contains(self, text):
+        return os.path.exists(self._path(self._filename(text)))
+
+    def get(self, text, pinned=False):
+        """
+        返回这句话的 wav 路径。
+        没有缓存时：句子含数字就用片段拼接，否则整句合成一次。
+        """
+        name = self._filename(text)
+        path = self._path(name)
+        if os.path.exists(path):
+            self.hits += 1
+        else:
+            self.misses += 1
+            if not (_NUMBER_RE.search(text) and self._assemble(text, path)):
+                self._synthesize(text, path)
+        self._touch(name, pinned)
+        return path
+
+    def pin(self, phrases):
+        """预合成并固定一组短语 (启动时或部署时调用)。返回新合成的数量。"""
+        created = 0
+        for text in phrases:
+            if not self.contains(text):
+                created += 1
+            self.get(text, pinned=True)
+        return created
+
+    def missing(self, phrases):
+        return [text for text in phrases if not self.contains(text)]
+
+    # --------------------------------------------------------------------------
+    # 数字片段拼接
+    # --------------------------------------------------------------------------
+    def _fragments(self, text):
+        """把句子拆成 [文字片段, 数字单词...] 的列表；数字超出范围时返回 None。"""
+        parts = []
+        pos = 0
+        for match in _NUMBER_RE.finditer(text):
+            words = number_to_words(match.group())
+            if words is None:
+                return None
+            parts.append(text[pos:match.start()].strip())
+            parts += words
+            pos = match.end()
+        parts.append(text[pos:].strip())
+        return [p for p in parts if p and re.search(r'\w', p)]
+
+    def _assemble(self, text, path):
+        fragments = self._fragments(text)
+        if not fragments:
+            return False
+        params = None
+        chunks = []
+        for fragment in fragments:
+            # 数字单词是固定的，文字部分 ("Total price is") 按动态短语缓存
+            with wave.open(self.get(fragment, pinned=fragment in NUMBER_WORDS), 'rb') as clip:
+                clip_params = (clip.getnchannels(), clip.getsampwidth(), clip.getframerate())
+                if clip_params[1] != 2 or (params is not None and clip_params != params):
+                    return False  # 格式不一致，无法简单拼接，改为整句合成
+                params = clip_params
+                samples = np.frombuffer(clip.readframes(clip.getnframes()), dtype='<i2')
+            loud = np.nonzero(np.abs(samples.astype(np.int32)) > _SILENCE_LEVEL)[0]
+            if loud.size:
+                samples = samples[loud[0]:loud[-1] + 1]
+            chunks.append(samples)
+            chunks.append(np.zeros(int(params[2] * _GAP_SECONDS) * params[0], dtype='<i2'))
+        tmp = path + '.tmp'
+        with wave.open(tmp, 'wb') as out:
+            out.setnchannels(params[0])
+            out.setsampwidth(params[1])
+            out.setframerate(params[2])
+            out.writeframes(np.concatenate(chunks).tobytes())
+        os.replace(tmp, path)
+        self.assembled += 1
+        return True
+
+    # --------------------------------------------------------------------------
+    # 播放
+    # --------------------------------------------------------------------------
+    def play(self, path):
+        """开始播放并立即返回 Popen 对象；调用方 wait() 等待播完，terminate() 打断。"""
+        return subprocess.Popen([self.play_cmd, '-q', path], stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+
+    def stats(self):
+        return {'hits': self.hits, 'misses': self.misses, 'assembled': self.assembled,
+                'evictions': self.evictions, 'pinned': len(self._pinned), 'dynamic': len(self._dynamic)}
+
+
+def standard_phrases(item_names):
+    """程序会说到的固定短语：欢迎语、每种商品的添加/撤销、清空购物车、数字片段。"""
+    phrases = ["Welcome", "Cart cleared.", "Thank you. Cart is now clear.",
+               "items added.", "items removed.", "Total price is", "dollars. Please scan to pay."]
+    for name in item_names:
+        phrases += [f"{name} added.", f"Undo {name}."]
+    return phrases + list(NUMBER_WORDS)
+
+# ==============================================================================
+# 部署脚本
+# ==============================================================================
+# 用法: python3 modules/phrase_cache.py [--labels models/fruit/labels.txt] [--say TEXT]
+# 安装时运行一次，之后启动就不需要再合成这些短语。
+if __name__ == '__main__':
+    import argparse
+    import time
+
+    parser = argparse.ArgumentParser(description="Pre-render announcement audio with espeak.")
+    parser.add_argument('--labels', default=os.path.join(os.path.dirname(DEFAULT_CACHE_DIR), 'models', 'fruit', 'labels.txt'))
+    parser.add_argument('--cache-dir', default=DEFAULT_CACHE_DIR)
+    parser.add_argument('--voice', default="en")
+    parser.add_argument('--rate', type=int, default=250)
+    parser.add_argument('--say', help="play one phrase from the cache (assembling numbers if needed)")
+    args = parser.parse_args()
+
+    cache = PhraseCache(args.cache_dir, voice=args.voice, rate=args.rate)
+    if not cache.available:
+        print("espeak and aplay are required for the phrase cache.")
+        raise SystemExit(1)
+    with open(args.labels) as f:
+        names = [line.strip() for line in f if line.strip() and line.strip().lower() != 'background']
+    start = time.monotonic()
+    created = cache.pin(standard_phrases(names))
+    print(f"{created} phrases synthesized in {time.monotonic() - start:.1f}s, cache: {cache.stats()}")
+    if args.say:
+        cache.play(cache.get(args.say)).wait()
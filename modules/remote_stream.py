@@ -0,0 +1,300 @@
+#!/usr/bin/env python3
+# modules/remote_stream.py
+
+# ==============================================================================
+# 导入库
+# ==============================================================================
+import http.server
+import socketserver
+import threading
+import time
+
+import cv2
+import numpy as np
+
+from metrics import MetricsRegistry
+
+# ==============================================================================
+# 远程画面 (RemoteStream)
+# ------------------------------------------------------------------------------
+# 把 UIManager 合成好的整屏画面以 MJPEG over HTTP 的形式提供出来，
+# 不用站在收银台的 HDMI 屏幕前也能看到它现在显示什么 (浏览器打开 http://<host>:<port>/)。
+#   - 合成阶段调用 offer()：没到下一帧的时间、或者没有人在看时立即返回；
+#     否则只把画面拷贝进预分配的缓冲区，唤醒编码线程，绝不等待编码或网络。
+#   - 编码在后台线程中进行，按设定的帧率 (默认 5 FPS) 抽帧，缩小、转换颜色都写进复用的缓冲区；
+#     缩小后的画面和上一次编码的完全一样时不重新编码。
+#   - 每个客户端一个线程，永远只发送最新的一帧：客户端慢就跳过中间的帧，不会拖慢编码线程，更不会拖慢显示。
+# ==============================================================================
+
+BOUNDARY = "frame"
+KEEPALIVE_INTERVAL = 5.0   # 画面静止时多久重发一次最后一帧 (秒)
+
+INDEX_HTML = b"""<!doctype html>
+<html><head><title>Smart Fruit Stall</title></head>
+<body style="margin:0;background:#1e1e1e">
+<img src="/stream.mjpg" style="display:block;margin:auto;max-width:100%">
+</body></html>
+"""
+
+
+class _ThreadingHTTPServer(socketserver.ThreadingMixIn, http.server.HTTPServer):
+    daemon_threads = True
+
+
+class RemoteStream:
+    def __init__(self, port=8080, host="127.0.0.1", fps=5.0, scale=0.5, quality=70, metrics=None):
+        """
+        :param port: HTTP 端口，0 表示由系统分配 (测试用，实际端口见 self.port)。
+        :param host: 监听地址。默认只监听本机，需要从别的电脑查看时改成 "0.0.0.0"。
+        :param fps: 最多每秒编码几帧 (从合成的画面中抽帧)。
+        :param scale: 编码前缩小的比例，960x800 的画面缩小一半后每帧只有几十 KB。
+        :param quality: JPEG 质量 (0~100)。
+        :param metrics: 可选的 MetricsRegistry。
+        """
+        self.interval = 1.0 / fps if fps else 0.0
+        self.scale = scale
+        self.encode_params = [int(cv2.IMWRITE_JPEG_QUALITY), int(quality)]
+        self.clients = 0
+        self._next_offer = 0.0
+        self._wanted_until = 0.0     # 有人请求单帧快照时，这之前即使没有流客户端也要编码
+
+        # --- 编码用的缓冲区 (按画面尺寸分配一次，之后一直复用) ---
+        self._lock = threading.Lock()
+        self._pending = None         # offer() 写入的画面
+        self._working = None         # 编码线程正在读的画面，和 _pending 轮换
+        self._has_pending = False
+        self._small = None           # 缩小后的 RGB 画面
+        self._previous = None        # 上一次编码的缩小画面，用于判断画面有没有变化
+        self._has_previous = False
+        self._bgr = None             # JPEG 编码需要 BGR
+        self._wake = threading.Event()
+        self._closed = False
+
+        # --- 最新的一帧 (不可变的 bytes，客户端线程直接读，不需要拷贝) ---
+        self._frame_cond = threading.Condition()
+        self._jpeg = None
+        self._frame_id = 0
+
+        registry = metrics if metrics is not None else MetricsRegistry(enabled=False)
+        frames_help = "Composited frames handled by the remote stream encoder"
+        self._encoded = registry.counter("remote_stream_frames_total", frames_help, {'result': 'encoded'})
+        self._unchanged = registry.counter("remote_stream_frames_total", frames_help, {'result': 'unchanged'})
+        self._overwritten = registry.counter("remote_stream_frames_total", frames_help, {'result': 'overwritten'})
+        self._clients_gauge = registry.gauge("remote_stream_clients", "Connected MJPEG clients")
+
+        self._encoder = threading.Thread(target=self._run, name="remote_stream_encoder", daemon=True)
+        self._encoder.start()
+        self._server = _ThreadingHTTPServer((host, port), self._make_handler())
+        self.port = self._server.server_address[1]
+        self._server_thread = threading.Thread(target=self._server.serve_forever, name="remote_stream_server", daemon=True)
+        self._server_thread.start()
+        print(f"📡 Remote display stream: http://{host}:{self.port}/")
+
+    # --------------------------------------------------------------------------
+    # 生产者接口 (合成阶段调用)
+    # --------------------------------------------------------------------------
+    def offer(self, np_img):
+        """
+        提交一帧合成好的 RGB 画面。不需要这一帧时立即返回；需要时只做一次内存拷贝。
+        :return: 这一帧是否被采用。
+        """
+        now = time.monotonic()
+        if now < self._next_offer or (self.clients == 0 and now > self._wanted_until):
+            return False
+        self._next_offer = now + self.interval
+        with self._lock:
+            if self._pending is None or self._pending.shape != np_img.shape:
+                self._pending = np.empty_like(np_img)
+                self._working = np.empty_like(np_img)
+            if self._has_pending:
+                self._overwritten.inc()   # 编码线程还没来得及取走上一帧，直接覆盖
+            np.copyto(self._pending, np_img)
+            self._has_pending = True
+        self._wake.set()
+        return True
+
+    def stats(self):
+        return {'clients': self.clients, 'encoded': self._encoded.value, 'unchanged': self._unchanged.value,
+                'overwritten': self._overwritten.value,
+                'frame_bytes': len(self._jpeg) if self._jpeg is not None else 0}
+
+    def close(self):
+        self._closed = True
+        self._wake.set()
+        with self._frame_cond:
+            self._frame_cond.notify_all()
+        self._server.shutdown()
+        self._server.server_close()
+        self._encoder.join(timeout=1.0)
+
+    # --------------------------------------------------------------------------
+    # 编码线程
+    # --------------------------------------------------------------------------
+    def _run(self):
+        while True:
+            self._wake.wait()
+            self._wake.clear()
+            if self._closed:
+                return
+            with self._lock:
+                if not self._has_pending:
+                    continue
+                # 两个缓冲区轮换：offer() 接着写另一个，编码期间不需要持锁
+                self._pending, self._working = self._working, self._pending
+                self._has_pending = False
+            try:
+                self._encode(self._working)
+            except Exception as e:
+                print(f"[RemoteStream ERROR] Failed to encode frame: {e}")
+
+    def _encode(self, frame):
+        h, w = frame.shape[:2]
+        size = (max(1, int(w * self.scale)), max(1, int(h * self.scale)))
+        if self._small is None or self._small.shape[:2] != (size[1], size[0]):
+            self._small = np.empty((size[1], size[0], 3), dtype=np.uint8)
+            self._previous = np.empty_like(self._small)
+            self._bgr = np.empty_like(self._small)
+            self._has_previous = False
+        if size == (w, h):
+            np.copyto(self._small, frame[..., :3])
+        else:
+            cv2.resize(frame[..., :3], size, dst=self._small, interpolation=cv2.INTER_AREA)
+        if self._has_previous and np.array_equal(self._small, self._previous):
+            self._unchanged.inc()   # 画面没变 (例如停在结账界面)：客户端手里的那一帧仍然是对的
+            return
+        np.copyto(self._previous, self._small)
+        self._has_previous = True
+        cv2.cvtColor(self._small, cv2.COLOR_RGB2BGR, dst=self._bgr)
+        ok, encoded = cv2.imencode('.jpg', self._bgr, self.encode_params)
+        if not ok:
+            return
+        self._encoded.inc()
+        with self._frame_cond:
+            self._jpeg = encoded.tobytes()
+            self._frame_id += 1
+            self._frame_cond.notify_all()
+
+    def _wait_frame(self, last_id, timeout):
+        """等待比 last_id 新的一帧，返回 (帧号, JPEG)；超时返回当前这一帧 (可能与 last_id 相同)。"""
+        with self._frame_cond:
+            if self._frame_id == last_id and not self._closed:
+                self._frame_cond.wait(timeout)
+            return self._frame_id, self._jpeg
+
+    # --------------------------------------------------------------------------
+    # HTTP
+    # --------------------------------------------------------------------------
+    def _client_joined(self, delta):
+        with self._lock:
+            self.clients += delta
+            self._clients_gauge.set(self.clients)
+
+    def _make_handler(self):
+        stream = self
+
+        class Handler(http.server.BaseHTTPRequestHandler):
+            timeout = 10    # 客户端 10 秒收不下一帧就断开，线程不会一直挂着
+
+            def do_GET(self):
+                path = self.path.split('?')[0]
+                if path == '/':
+                    self._send(200, 'text/html; charset=utf-8', INDEX_HTML)
+                elif path == '/snapshot.jpg':
+                    self._snapshot()
+                elif path == '/stream.mjpg':
+                    self._stream()
+                else:
+                    self.send_error(404)
+
+            def _send(self, code, content_type, body):
+                self.send_response(code)
+                self.send_header('Content-Type', content_type)
+                self.send_header('Content-Length', str(len(body)))
+                self.send_header('Cache-Control', 'no-cache')
+                self.end_headers()
+                self.wfile.write(body)
+
+            def _snapshot(self):
+                # 没有流客户端时平时不编码：请求快照后的 2 秒内照常编码，等一帧新画面
+                stream._wanted_until = time.monotonic() + 2.0
+                last_id = stream._frame_id
+                deadline = time.monotonic() + 1.5
+                frame_id, jpeg = last_id, stream._jpeg
+                while frame_id == last_id and time.monotonic() < deadline and not stream._closed:
+                    frame_id, jpeg = stream._wait_frame(last_id, deadline - time.monotonic())
+                if jpeg is None:
+                    self.send_error(503, "no frame available yet")
+                    return
+                self._send(200, 'image/jpeg', jpeg)
+
+            def _stream(self):
+                self.send_response(200)
+                self.send_header('Content-Type', f'multipart/x-mixed-replace; boundary={BOUNDARY}')
+                self.send_header('Cache-Control', 'no-cache')
+                self.end_headers()
+                stream._client_joined(+1)
+                last_id, last_sent = -1, time.monotonic()
+                try:
+                    while not stream._closed:
+                        frame_id, jpeg = stream._wait_frame(last_id, 1.0)
+                        if jpeg is None:
+                            continue    # 还没有画面
+                        if frame_id == last_id and time.monotonic() - last_sent < KEEPALIVE_INTERVAL:
+                            continue    # 画面没变；隔一段时间重发一次，客户端断开了才能发现
+                        # 只发最新的一帧：发送期间编出来的中间帧直接跳过
+                        last_id, last_sent = frame_id, time.monotonic()
+                        self.wfile.write(f"--{BOUNDARY}\r\nContent-Type: image/jpeg\r\n"
+                                         f"Content-Length: {len(jpeg)}\r\n\r\n".encode())
+                        self.wfile.write(jpeg)
+                        self.wfile.write(b"\r\n")
+                except (OSError, ValueError):
+                    pass    # 客户端断开或超时
+                finally:
+                    stream._client_joined(-1)
+
+            def log_message(self, *args):
+                pass  # 不要每个请求都往终端打日志
+
+        return Handler
+
+# ==============================================================================
+# 单独测试代码
+# ==============================================================================
+# 运行 `python3 modules/remote_stream.py`：在 http://127.0.0.1:8080/ 播放一段合成画面，
+# 同时用一个本地客户端检查 offer() 的耗时和收到的帧。
+if __name__ == '__main__':
+    import urllib.request
+
+    stream = RemoteStream(port=8080, fps=10)
+    canvas = np.zeros((800, 960, 3), dtype=np.uint8)
+    received = []
+
+    def client():
+        with urllib.request.urlopen(f"http://127.0.0.1:{stream.port}/stream.mjpg") as response:
+            data = b""
+            while True:
+                data += response.read(4096)
+                while b"\r\n\r\n" in data:
+                    header, _, rest = data.partition(b"\r\n\r\n")
+                    length = int(header.split(b"Content-Length: ")[1].split(b"\r\n")[0])
+                    if len(rest) < length + 2:
+                        break
+                    received.append(rest[:length])
+                    data = rest[length + 2:]
+
+    threading.Thread(target=client, daemon=True).start()
+    offer_times = []
+    start = time.monotonic()
+    for i in range(300):
+        # 前一半画面在动，后一半静止 (不应再重新编码)
+        if i < 150:
+            canvas[:, :] = (i * 3 % 255, 60, 90)
+            cv2.putText(canvas, f"frame {i}", (50, 400), cv2.FONT_HERSHEY_SIMPLEX, 3, (255, 255, 255), 5)
+        t = time.perf_counter()
+        stream.offer(canvas)
+        offer_times.append(time.perf_counter() - t)
+        time.sleep(1 / 30.0)
+    print(f"offer(): mean {np.mean(offer_times) * 1e6:.0f} us, max {np.max(offer_times) * 1e3:.2f} ms "
+          f"over {len(offer_times)} frames in {time.monotonic() - start:.1f}s")
+    print(f"client received {len(received)} frames, {stream.stats()}")
+    stream.close()
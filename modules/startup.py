@@ -0,0 +1,185 @@
+#!/usr/bin/env python3
+# modules/startup.py
+
+# ==============================================================================
+# 导入库
+# ==============================================================================
+import threading
+import time
+
+from metrics import MetricsRegistry
+
+# ==============================================================================
+# 并行启动 (Startup)
+# ------------------------------------------------------------------------------
+# 启动时要做的事 (加载商品目录、TensorRT 模型、Mediapipe、语音、摄像头……) 大多互不相关，
+# 以前一件接一件地做完才显示第一帧画面。现在把每一件登记为一个任务，并写明它依赖哪些任务：
+#   - 每个任务一个线程，依赖的任务都完成后立即开始，互不相关的任务同时进行；
+#   - 主线程不参与初始化，一直刷新“正在启动”画面，显示还在进行中的任务；
+#   - 每个任务的开始/结束时间记入时间线，启动完成后打印出来，并写入 startup_seconds 指标，
+#     收银机重启慢的时候能直接看出是哪一步拖了后腿。
+# 大部分时间花在 C 扩展里 (TensorRT、Mediapipe 图初始化、文件读写)，它们会释放 GIL，所以线程就够用。
+# ==============================================================================
+
+class StartupError(Exception):
+    """依赖的任务失败，这个任务没有执行。"""
+
+
+class _Task:
+    __slots__ = ('name', 'fn', 'deps', 'result', 'error', 'started', 'finished', 'done')
+
+    def __init__(self, name, fn, deps):
+        self.name = name
+        self.fn = fn
+        self.deps = deps
+        self.result = None
+        self.error = None
+        self.started = None
+        self.finished = None
+        self.done = threading.Event()
+
+
+class Startup:
+    def __init__(self, t0=None, metrics=None):
+        """
+        :param t0: 时间线的零点 (time.monotonic())，默认为创建时刻。传入进程开始导入模块的时间，
+                   时间线就包含导入耗时。
+        :param metrics: 可选的 MetricsRegistry，每个任务的耗时记为 startup_seconds{component}。
+        """
+        self.t0 = time.monotonic() if t0 is None else t0
+        self.metrics = metrics if metrics is not None else MetricsRegistry(enabled=False)
+        self._tasks = {}
+        self._order = []
+        self._lock = threading.Lock()
+
+    def add(self, name, fn, deps=()):
+        """
+        登记一个任务并立即开始 (等依赖的任务完成后)。
+        :param name: 任务名，也用于 get() 和时间线。
+        :param fn: fn(*依赖任务的结果)，按 deps 的顺序传入。
+        :param deps: 依赖的任务名，必须是已经登记过的任务 (因此不会出现循环依赖)。
+        """
+        if name in self._tasks:
+            raise ValueError(f"startup task '{name}' is already registered")
+        missing = [dep for dep in deps if dep not in self._tasks]
+        if missing:
+            raise ValueError(f"startup task '{name}' depends on unknown tasks: {missing}")
+        task = _Task(name, fn, tuple(deps))
+        with self._lock:
+            self._tasks[name] = task
+            self._order.append(name)
+        threading.Thread(target=self._run, args=(task,), name=f"startup_{name}", daemon=True).start()
+        return self
+
+    def record(self, name, started, finished=None):
+        """把在主线程里完成的一步 (导入模块、打开显示) 也记入时间线。"""
+        task = _Task(name, None, ())
+        task.started = started
+        task.finished = time.monotonic() if finished is None else finished
+        task.done.set()
+        with self._lock:
+            self._tasks[name] = task
+            self._order.append(name)
+        self._observe(task)
+
+    def _run(self, task):
+        deps = [self._tasks[dep] for dep in task.deps]
+        for dep in deps:
+            dep.done.wait()
+        task.started = time.monotonic()
+        try:
+            failed = [dep.name for dep in deps if dep.error is not None]
+            if failed:
+                raise StartupError(f"'{task.name}' skipped because {', '.join(failed)} failed")
+            task.result = task.fn(*[dep.result for dep in deps])
+        except Exception as e:
+            task.error = e
+            if not isinstance(e, StartupError):
+                print(f"[Startup ERROR] {task.name} failed: {e}")
+        finally:
+            task.finished = time.monotonic()
+            self._observe(task)
+            task.done.set()
+
+    def _observe(self, task):
+        self.metrics.gauge("startup_seconds", "Time spent initializing each component",
+                           {'component': task.name}).set(task.finished - task.started)
+
+    # --------------------------------------------------------------------------
+    # 查询
+    # --------------------------------------------------------------------------
+    def get(self, name, timeout=None):
+        """等待任务完成并返回结果；任务失败时抛出原来的异常。"""
+        task = self._tasks[name]
+        if not task.done.wait(timeout):
+            raise TimeoutError(f"startup task '{name}' did not finish within {timeout} s")
+        if task.error is not None:
+            raise task.error
+        return task.result
+
+    def ready(self, name):
+        return self._tasks[name].done.is_set()
+
+    @property
+    def done(self):
+        with self._lock:
+            return all(task.done.is_set() for task in self._tasks.values())
+
+    @property
+    def elapsed(self):
+        return time.monotonic() - self.t0
+
+    def pending(self):
+        """还没完成的任务名，按登记顺序。正在执行的排在等待依赖的前面。"""
+        with self._lock:
+            tasks = [self._tasks[name] for name in self._order]
+        waiting = [t.name for t in tasks if not t.done.is_set() and t.started is None]
+        return [t.name for t in tasks if not t.done.is_set() and t.started is not None] + waiting
+
+    # --------------------------------------------------------------------------
+    # 时间线
+    # --------------------------------------------------------------------------
+    def timeline(self, width=40):
+        """
+        每个任务一行的文字时间线，例如:
+            detector        0.12 ->  3.85 s  |  ############################         |
+        :param width: 时间条的宽度 (字符)。
+        """
+        with self._lock:
+            tasks = [self._tasks[name] for name in self._order if self._tasks[name].finished is not None]
+        if not tasks:
+            return "Startup timeline: (empty)"
+        end = max(task.finished for task in tasks) - self.t0
+        scale = width / max(end, 1e-6)
+        busy = sum(task.finished - task.started for task in tasks)
+        lines = [f"Startup timeline: ready after {end:.2f} s "
+                 f"(components took {busy:.2f} s in total, {busy / max(end, 1e-6):.1f}x overlap)"]
+        name_width = max(len(task.name) for task in tasks)
+        for task in tasks:
+            start, stop = task.started - self.t0, task.finished - self.t0
+            left = min(int(start * scale), width - 1)
+            length = max(1, int(round(stop * scale)) - left)
+            bar = " " * left + "#" * length
+            status = "" if task.error is None else "  FAILED"
+            lines.append(f"  {task.name:<{name_width}}  {start:5.2f} -> {stop:5.2f} s  |{bar:<{width}}|{status}")
+        return "\n".join(lines)
+
+# ==============================================================================
+# 单独测试代码
+# ==============================================================================
+# 运行 `python3 modules/startup.py`：用 sleep 模拟各个组件的初始化时间。
+if __name__ == '__main__':
+    startup = Startup()
+    startup.record("imports", startup.t0, startup.t0 + 0.3)
+    startup.add("catalog", lambda: time.sleep(0.1) or "catalog")
+    startup.add("announcer", lambda catalog: time.sleep(0.4), deps=["catalog"])
+    startup.add("detector", lambda: time.sleep(1.5) or "detector")
+    startup.add("hand_tracker", lambda: time.sleep(0.8))
+    startup.add("cameras", lambda: time.sleep(0.5))
+    startup.add("broken", lambda: 1 / 0)
+    startup.add("needs_broken", lambda x: None, deps=["broken"])
+    while not startup.done:
+        print(f"  {startup.elapsed:4.1f}s  loading: {', '.join(startup.pending())}")
+        time.sleep(0.25)
+    print(startup.timeline())
+    print(f"detector result: {startup.get('detector')}")
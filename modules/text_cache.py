@@ -0,0 +1,106 @@
+# modules/text_cache.py
+
+import collections
+
+import cv2
+import numpy as np
+
+
+class TextSprite:
+    """一段预先光栅化好的文字：alpha 蒙版 + 颜色 + 相对于基线原点的偏移。"""
+    def __init__(self, text, font, scale, thickness, color, line_type):
+        (w, h), baseline = cv2.getTextSize(text, font, scale, thickness)
+        pad = thickness + 1  # 粗笔画会超出 getTextSize 给出的范围，留一点边
+        mask = np.zeros((h + baseline + 2 * pad, w + 2 * pad), dtype=np.uint8)
+        cv2.putText(mask, text, (pad, pad + h), font, scale, 255, thickness, line_type)
+
+        self.size = (w, h)
+        self.baseline = baseline
+        self.color = np.array(color, dtype=np.uint8)
+        # putText 的 org 是基线左端，蒙版左上角相对它的偏移
+        self.offset = (-pad, -pad - h)
+        self.mask = mask
+        self.ys, self.xs = np.nonzero(mask)
+        # 非抗锯齿文字的蒙版只有 0/255，直接按坐标赋值；抗锯齿文字才需要按 alpha 混合
+        # (按蒙版内容判断而不是看 line_type，新版 OpenCV 的字体渲染总是带抗锯齿)
+        values = mask[self.ys, self.xs]
+        self.alpha = None
+        if values.size and values.min() < 255:
+            self.alpha = (values.astype(np.float32) / 255.0)[:, None]
+
+
+class TextSpriteCache:
+    """
+    有上限的 LRU 文字贴图缓存，替代每帧的 cv2.putText / cv2.getTextSize。
+    键为 (text, font, scale, thickness, color, line_type)，命中时只做一次像素拷贝。
+    """
+    def __init__(self, max_entries=256):
+        self.max_entries = max_entries
+        self._sprites = collections.OrderedDict()
+        self._sizes = collections.OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def _get(self, text, font, scale, thickness, color, line_type):
+        key = (text, font, scale, thickness, tuple(color), line_type)
+        sprite = self._sprites.get(key)
+        if sprite is not None:
+            self._sprites.move_to_end(key)
+            self.hits += 1
+            return sprite
+        self.misses += 1
+        sprite = TextSprite(text, font, scale, thickness, color, line_type)
+        self._sprites[key] = sprite
+        if len(self._sprites) > self.max_entries:
+            self._sprites.popitem(last=False)
+            self.evictions += 1
+        return sprite
+
+    def get_text_size(self, text, font, scale, thickness):
+        """与 cv2.getTextSize 返回值相同：((w, h), baseline)。"""
+        key = (text, font, scale, thickness)
+        size = self._sizes.get(key)
+        if size is None:
+            size = cv2.getTextSize(text, font, scale, thickness)
+            self._sizes[key] = size
+            if len(self._sizes) > self.max_entries:
+                self._sizes.popitem(last=False)
+        else:
+            self._sizes.move_to_end(key)
+        return size
+
+    def put_text(self, img, text, org, font, scale, color, thickness=1, line_type=cv2.LINE_8):
+        """与 cv2.putText 参数顺序一致，把缓存的文字贴图画到 img 上。"""
+        sprite = self._get(text, font, scale, thickness, color, line_type)
+        x0 = org[0] + sprite.offset[0]
+        y0 = org[1] + sprite.offset[1]
+        mh, mw = sprite.mask.shape
+        img_h, img_w = img.shape[:2]
+
+        if x0 >= 0 and y0 >= 0 and x0 + mw <= img_w and y0 + mh <= img_h:
+            ys, xs = sprite.ys + y0, sprite.xs + x0
+            alpha = sprite.alpha
+        else:
+            # 贴图有一部分在画面外：只画画面内的像素
+            inside = ((sprite.ys + y0 >= 0) & (sprite.ys + y0 < img_h) &
+                      (sprite.xs + x0 >= 0) & (sprite.xs + x0 < img_w))
+            ys, xs = sprite.ys[inside] + y0, sprite.xs[inside] + x0
+            alpha = None if sprite.alpha is None else sprite.alpha[inside]
+
+        if alpha is None:
+            img[ys, xs] = sprite.color
+        else:
+            dst = img[ys, xs].astype(np.float32)
+            img[ys, xs] = (dst + (sprite.color - dst) * alpha + 0.5).astype(np.uint8)
+
+    def stats(self):
+        """返回命中率等统计信息，用于调整缓存大小。"""
+        lookups = self.hits + self.misses
+        return {
+            'entries': len(self._sprites),
+            'hits': self.hits,
+            'misses': self.misses,
+            'evictions': self.evictions,
+            'hit_rate': self.hits / lookups if lookups else 0.0,
+        }
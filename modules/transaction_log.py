@@ -0,0 +1,210 @@
+#!/usr/bin/env python3
+# modules/transaction_log.py
+
+# ==============================================================================
+# 导入库
+# ==============================================================================
+import queue
+import sqlite3
+import threading
+import time
+
+# ==============================================================================
+# 交易记录 (TransactionLog)
+# ------------------------------------------------------------------------------
+# 每完成一笔交易 (结账模式下点赞) 就把商品明细、价格、时间和撤销/清空次数写入本地 SQLite。
+#   - 主循环只往队列里放一条记录，写库在后台线程中进行，视频循环永远不碰数据库。
+#   - 后台线程把一段时间内的交易攒成一批，在一个事务里 executemany 写入，只提交一次。
+#   - 数据库使用 WAL 模式：报表工具可以在收银台运行的同时读库，读写互不阻塞。
+#   - 报表查询都有对应的覆盖索引，几百万笔交易也只扫描索引里需要的那一段日期。
+# ==============================================================================
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS transactions (
+    id          INTEGER PRIMARY KEY,
+    lane        TEXT    NOT NULL,
+    day         TEXT    NOT NULL,   -- 本地日期 YYYY-MM-DD，按天统计时直接走索引
+    started_at  REAL    NOT NULL,   -- 第一件商品加入购物车的时间 (Unix 时间戳)
+    checkout_at REAL,               -- 指向手势进入结账模式的时间
+    finished_at REAL    NOT NULL,   -- 点赞完成交易的时间
+    duration    REAL    NOT NULL,   -- finished_at - started_at (秒)
+    total_cents INTEGER NOT NULL,
+    item_count  INTEGER NOT NULL,
+    undo_count  INTEGER NOT NULL,
+    clear_count INTEGER NOT NULL
+);
+CREATE TABLE IF NOT EXISTS line_items (
+    transaction_id INTEGER NOT NULL REFERENCES transactions(id),
+    day            TEXT    NOT NULL,   -- 冗余存一份日期，按商品统计时不需要回表关联
+    name           TEXT    NOT NULL,
+    count          INTEGER NOT NULL,
+    unit_cents     INTEGER NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_transactions_day
+    ON transactions(day, total_cents, item_count, duration);
+CREATE INDEX IF NOT EXISTS idx_line_items_day_name
+    ON line_items(day, name, count, unit_cents);
+CREATE INDEX IF NOT EXISTS idx_line_items_transaction
+    ON line_items(transaction_id);
+"""
+
+
+def connect(path, readonly=False):
+    """打开交易数据库 (WAL 模式)。只读连接给报表工具用，不会建表。"""
+    if readonly:
+        conn = sqlite3.connect(f"file:{path}?mode=ro", uri=True)
+    else:
+        conn = sqlite3.connect(path)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")  # WAL 下断电只可能丢最后一次提交，不会损坏数据库
+        conn.executescript(SCHEMA)
+    return conn
+
+
+class TransactionLog:
+    def __init__(self, path, flush_interval=1.0):
+        """
+        :param path: SQLite 数据库路径，不存在时自动创建。
+        :param flush_interval: 攒批的时间 (秒)。交易频率很低，这段时间只决定最多有几秒的交易还没落盘。
+        """
+        print(f"🧮 Opening transaction log {path}...")
+        self.path = path
+        self.flush_interval = flush_interval
+        self.batches = 0
+        self.written = 0
+        self.errors = 0
+        self._queue = queue.Queue()
+        # 建表放在这里做一次，数据库路径有问题时启动就报错，而不是等到第一笔交易
+        connect(path).close()
+        self._thread = threading.Thread(target=self._run, name="transaction_log", daemon=True)
+        self._thread.start()
+
+    def record(self, lane, items, started_at, finished_at, checkout_at=None, undo_count=0, clear_count=0):
+        """
+        主循环调用：放进队列立即返回。
+        :param lane: 收银台名称。
+        :param items: [(商品名, 数量, 单价分), ...]。
+        :param started_at / finished_at / checkout_at: Unix 时间戳。
+        """
+        self._queue.put_nowait((lane, list(items), started_at, checkout_at, finished_at, undo_count, clear_count))
+
+    def _run(self):
+        # sqlite3 连接只能在创建它的线程里使用，所以在后台线程里打开
+        conn = connect(self.path)
+        closing = False
+        while not closing:
+            batch = [self._queue.get()]
+            time.sleep(self.flush_interval)
+            while True:
+                try:
+                    batch.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+            if None in batch:
+                closing = True
+                batch = batch[:batch.index(None)]
+            try:
+                self._write(conn, batch)
+            except sqlite3.Error as e:
+                # 磁盘满、数据库被锁太久等：记下来继续收银，不能因为报表数据让收银台停下
+                self.errors += len(batch)
+                print(f"[TransactionLog] Failed to write {len(batch)} transactions: {e}")
+        conn.close()
+
+    def _write(self, conn, batch):
+        if not batch:
+            return
+        with conn:  # 一个事务，成功则提交，异常则回滚
+            for lane, items, started_at, checkout_at, finished_at, undo_count, clear_count in batch:
+                day = time.strftime('%Y-%m-%d', time.localtime(finished_at))
+                total_cents = sum(count * cents for _, count, cents in items)
+                cursor = conn.execute(
+                    "INSERT INTO transactions (lane, day, started_at, checkout_at, finished_at, duration,"
+                    " total_cents, item_count, undo_count, clear_count) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                    (lane, day, started_at, checkout_at, finished_at, max(finished_at - started_at, 0.0),
+                     total_cents, sum(count for _, count, _ in items), undo_count, clear_count))
+                conn.executemany(
+                    "INSERT INTO line_items (transaction_id, day, name, count, unit_cents) VALUES (?, ?, ?, ?, ?)",
+                    [(cursor.lastrowid, day, name, count, cents) for name, count, cents in items])
+        self.batches += 1
+        self.written += len(batch)
+
+    def close(self):
+        self._queue.put(None)
+        self._thread.join()
+
+# ==============================================================================
+# 报表查询
+# ------------------------------------------------------------------------------
+# since / until 是包含两端的日期字符串 (YYYY-MM-DD)，省略表示不限。
+# 每个查询都只用到对应索引里的列，SQLite 不需要回表读整行。
+# ==============================================================================
+
+def _day_range(since, until):
+    return since or '0000-00-00', until or '9999-99-99'
+
+
+def daily_totals(conn, since=None, until=None):
+    """每天的交易笔数、商品件数和营业额。返回 [(日期, 笔数, 件数, 营业额分), ...]。"""
+    return conn.execute(
+        "SELECT day, COUNT(*), SUM(item_count), SUM(total_cents) FROM transactions"
+        " WHERE day BETWEEN ? AND ? GROUP BY day ORDER BY day", _day_range(since, until)).fetchall()
+
+
+def product_volume(conn, since=None, until=None):
+    """每种商品的销量和销售额，按销量从高到低。返回 [(商品名, 件数, 销售额分), ...]。"""
+    return conn.execute(
+        "SELECT name, SUM(count), SUM(count * unit_cents) FROM line_items"
+        " WHERE day BETWEEN ? AND ? GROUP BY name ORDER BY SUM(count) DESC", _day_range(since, until)).fetchall()
+
+
+def checkout_times(conn, since=None, until=None):
+    """每天的平均结账用时 (从第一件商品到完成交易)。返回 [(日期, 笔数, 平均秒数), ...]。"""
+    return conn.execute(
+        "SELECT day, COUNT(*), AVG(duration) FROM transactions"
+        " WHERE day BETWEEN ? AND ? GROUP BY day ORDER BY day", _day_range(since, until)).fetchall()
+
+# ==============================================================================
+# 命令行报表工具
+# ==============================================================================
+# 用法:
+#   python3 modules/transaction_log.py transactions.db [--since 2024-05-01] [--until 2024-05-31]
+#   python3 modules/transaction_log.py /tmp/t.db --generate 1000000   # 生成测试数据，检验报表速度
+if __name__ == '__main__':
+    import argparse
+    import random
+
+    parser = argparse.ArgumentParser(description="Sales reports from the checkout transaction log.")
+    parser.add_argument('db')
+    parser.add_argument('--since', metavar='YYYY-MM-DD')
+    parser.add_argument('--until', metavar='YYYY-MM-DD')
+    parser.add_argument('--generate', type=int, default=0, metavar='N', help="first append N random transactions (for testing)")
+    args = parser.parse_args()
+
+    if args.generate:
+        log = TransactionLog(args.db, flush_interval=0.0)
+        fruits = [("apple", 250), ("banana", 120), ("orange", 300), ("pear", 200), ("grape", 550)]
+        end = time.time()
+        start = time.perf_counter()
+        for i in range(args.generate):
+            finished = end - random.uniform(0, 90 * 86400)
+            items = [(name, random.randint(1, 4), cents) for name, cents in random.sample(fruits, random.randint(1, 3))]
+            log.record("Lane 1", items, finished - random.uniform(10, 120), finished,
+                       undo_count=random.randint(0, 1), clear_count=0)
+        log.close()
+        print(f"Generated {log.written} transactions in {log.batches} batches "
+              f"({time.perf_counter() - start:.1f} s)")
+
+    conn = connect(args.db, readonly=True)
+    reports = [
+        ("Daily totals", daily_totals, lambda r: f"  {r[0]}  {r[1]:6d} sales  {r[2]:7d} items  ${r[3] / 100:10.2f}"),
+        ("Per-product volume", product_volume, lambda r: f"  {r[0]:<16} {r[1]:8d} items  ${r[2] / 100:10.2f}"),
+        ("Average checkout time", checkout_times, lambda r: f"  {r[0]}  {r[1]:6d} sales  {r[2]:6.1f} s"),
+    ]
+    for title, query, fmt in reports:
+        start = time.perf_counter()
+        rows = query(conn, args.since, args.until)
+        print(f"\n{title} ({(time.perf_counter() - start) * 1000:.1f} ms)")
+        for row in rows:
+            print(fmt(row))
+    conn.close()
@@ -3,6 +3,8 @@
 import cv2
 import numpy as np
 
+from text_cache import TextSpriteCache
+
 class UIManager:
     def __init__(self, window_width=960, window_height=800):
         print("🎨 Initializing UIManager (Final Version)...")
@@ -12,33 +14,113 @@ class UIManager:
         self.fruit_cam_rect = (0, 0, 640, 480)
         self.hand_cam_rect = (640, 0, 320, 240)
         self.cart_rect = (0, 480, 960, 320)
+        self.metrics_rect = (640, 240, 320, 240)  # 手势画面下方的空白区域，用来显示性能指标
         
         self.colors = {
             'bg': (30, 30, 30), 'header': (255, 200, 0), 'text': (255, 255, 255),
             'line': (80, 80, 80), 'total_bg': (40, 40, 40)
         }
         self.font = cv2.FONT_HERSHEY_SIMPLEX
+        # 所有每帧都要画的文字都走贴图缓存，main.py 里的手势标签也共用它
+        self.text_cache = TextSpriteCache(max_entries=256)
+
+        # --- 缓存图层 ---
+        # 静态底图 (背景色 + 购物车面板的框架) 只画一次；
+        # 画布 (canvas) 每帧复用，只有视频区域和变化过的购物车面板会被重新写入。
+        self._static_layer = self._render_static_layer()
+        self._canvas = np.empty_like(self._static_layer)
+        self._canvas_valid = False
+        self._cart_key = None      # 上一次绘制购物车时的内容快照
+        self._cart_panel = None    # 缓存的购物车面板图像
+        self._qr_canvas = None     # 结账画面 (变暗的画面 + 二维码) 复用的缓冲区
         print("✅ UIManager initialized.")
 
+    def _render_static_layer(self):
+        layer = np.full((self.height, self.width, 3), self.colors['bg'], dtype=np.uint8)
+        x, y, w, h = self.cart_rect
+        cv2.rectangle(layer, (x, y), (x + w, y + h), (50, 50, 50), -1)
+        cv2.putText(layer, "Shopping Cart", (x + 20, y + 40), self.font, 1.2, self.colors['header'], 2)
+        cv2.line(layer, (x + 20, y + 60), (x + w - 20, y + 60), self.colors['line'], 1)
+        total_bar_y = y + h - 60
+        cv2.rectangle(layer, (x, total_bar_y), (x + w, y + h), self.colors['total_bg'], -1)
+        cv2.line(layer, (x, total_bar_y), (x+w, total_bar_y), self.colors['line'], 1)
+        return layer
+
+    def invalidate(self):
+        """在画布上画了区域以外的东西后调用，下一帧会从静态底图完整重建。"""
+        self._canvas_valid = False
+        self._cart_key = None
+
     def create_background(self):
-        return np.full((self.height, self.width, 3), self.colors['bg'], dtype=np.uint8)
+        # 复用同一块画布：只有第一次 (或 invalidate 之后) 才从静态底图拷贝
+        if not self._canvas_valid:
+            np.copyto(self._canvas, self._static_layer)
+            self._canvas_valid = True
+            self._cart_key = None
+        return self._canvas
+
+    def draw_warmup_screen(self, title, message, elapsed):
+        """启动/预热阶段显示的整屏画面 (模型加载、TensorRT 优化等)。"""
+        self.invalidate()  # 预热画面覆盖了整块画布，之后需要从静态底图重建
+        screen = self._canvas
+        screen[:] = self.colors['bg']
+        dots = "." * (int(elapsed * 2) % 4)
+        for text, scale, color, thickness, y in (
+                (title, 1.2, self.colors['header'], 2, self.height // 2 - 30),
+                (message + dots, 0.7, self.colors['text'], 1, self.height // 2 + 20),
+                (f"{elapsed:.0f}s", 0.7, (150, 150, 150), 1, self.height // 2 + 60)):
+            text_w = self.text_cache.get_text_size(text, self.font, scale, thickness)[0][0]
+            cv2.putText(screen, text, ((self.width - text_w) // 2, y), self.font, scale, color, thickness)
+        return screen
 
     def draw_video_frames(self, background, fruit_frame, hand_frame):
-        # ... (这部分无变化) ...
-        fruit_frame_resized = cv2.resize(fruit_frame, (self.fruit_cam_rect[2], self.fruit_cam_rect[3]))
-        background[self.fruit_cam_rect[1]:self.fruit_cam_rect[1]+self.fruit_cam_rect[3], self.fruit_cam_rect[0]:self.fruit_cam_rect[0]+self.fruit_cam_rect[2]] = fruit_frame_resized
-        hand_frame_resized = cv2.resize(hand_frame, (self.hand_cam_rect[2], self.hand_cam_rect[3]))
-        background[self.hand_cam_rect[1]:self.hand_cam_rect[1]+self.hand_cam_rect[3], self.hand_cam_rect[0]:self.hand_cam_rect[0]+self.hand_cam_rect[2]] = hand_frame_resized
-        
+        self._blit(background, fruit_frame, self.fruit_cam_rect)
+        self._blit(background, hand_frame, self.hand_cam_rect)
+
+    @staticmethod
+    def _blit(background, frame, rect):
+        # 尺寸已经和窗口区域一致 (摄像头分辨率就是这么设置的) 时直接拷贝，不做 resize；
+        # 需要缩放时也直接缩放进画布的这块区域，不产生临时数组
+        x, y, w, h = rect
+        view = background[y:y + h, x:x + w]
+        if frame.shape[:2] == (h, w):
+            np.copyto(view, frame)
+        else:
+            cv2.resize(frame, (w, h), dst=view)
+
+    def hand_view(self, background):
+        """画布上手势画面区域的视图，在上面画骨骼/文字就直接画进了最终画面。"""
+        x, y, w, h = self.hand_cam_rect
+        return background[y:y + h, x:x + w]
+
+    def draw_metrics_overlay(self, background, lines):
+        """在手势画面下方的空白区域显示每个阶段的耗时。每帧先用背景色清空再写字。"""
+        x, y, w, h = self.metrics_rect
+        background[y:y + h, x:x + w] = self.colors['bg']
+        self.text_cache.put_text(background, "Stage timings (avg)", (x + 15, y + 25), self.font, 0.55, self.colors['header'], 1)
+        for i, line in enumerate(lines[:9]):
+            self.text_cache.put_text(background, line, (x + 15, y + 50 + i * 21), self.font, 0.5, self.colors['text'], 1)
+
     def draw_shopping_cart(self, background, shopping_cart, total_price):
+        # 购物车内容或总价没变时，画布上的面板仍然是上一帧画好的，直接跳过
+        cart_key = (tuple((name, d['count'], d['price']) for name, d in shopping_cart.items()), round(total_price, 2))
+        if background is not self._canvas or cart_key != self._cart_key:
+            if cart_key != self._cart_key or self._cart_panel is None:
+                self._cart_panel = self._render_cart_panel(shopping_cart, total_price)
+            x, y, w, h = self.cart_rect
+            background[y:y + h, x:x + w] = self._cart_panel
+            if background is self._canvas:
+                self._cart_key = cart_key
+
+    def _render_cart_panel(self, shopping_cart, total_price):
+        """在静态面板的拷贝上绘制商品行和总价，坐标相对于面板左上角。"""
         x, y, w, h = self.cart_rect
-        cv2.rectangle(background, (x, y), (x + w, y + h), (50, 50, 50), -1)
-        cv2.putText(background, "Shopping Cart", (x + 20, y + 40), self.font, 1.2, self.colors['header'], 2)
-        cv2.line(background, (x + 20, y + 60), (x + w - 20, y + 60), self.colors['line'], 1)
-        
+        panel = self._static_layer[y:y + h, x:x + w].copy()
+        x, y = 0, 0
+
         item_y_start = y + 85 # 稍微向上移动一点起始位置
         if not shopping_cart:
-            cv2.putText(background, "Your cart is empty.", (x + 30, item_y_start + 10), self.font, 0.7, (150, 150, 150), 1)
+            self.text_cache.put_text(panel, "Your cart is empty.", (x + 30, item_y_start + 10), self.font, 0.7, (150, 150, 150), 1)
         else:
             for i, (item_name, details) in enumerate(shopping_cart.items()):
                 # --- 关键改动: 减小行距和字体，增加最大行数 ---
@@ -47,33 +129,32 @@ class UIManager:
                 max_items_to_show = 9 # 最多显示9行
                 
                 if i >= max_items_to_show:
-                    cv2.putText(background, "...", (x + 40, item_y_start + i * line_height), self.font, font_scale, self.colors['text'], 1)
+                    self.text_cache.put_text(panel, "...", (x + 40, item_y_start + i * line_height), self.font, font_scale, self.colors['text'], 1)
                     break
                 item_text_left = f"- {item_name.capitalize()} x{details['count']}"
-                cv2.putText(background, item_text_left, (x + 40, item_y_start + i * line_height), self.font, font_scale, self.colors['text'], 1)
+                self.text_cache.put_text(panel, item_text_left, (x + 40, item_y_start + i * line_height), self.font, font_scale, self.colors['text'], 1)
                 
                 item_text_right = f"${details['price'] * details['count']:.2f}"
-                text_size_right = cv2.getTextSize(item_text_right, self.font, font_scale, 1)[0]
-                cv2.putText(background, item_text_right, (x + w - text_size_right[0] - 40, item_y_start + i * line_height), self.font, font_scale, self.colors['text'], 1)
+                text_size_right = self.text_cache.get_text_size(item_text_right, self.font, font_scale, 1)[0]
+                self.text_cache.put_text(panel, item_text_right, (x + w - text_size_right[0] - 40, item_y_start + i * line_height), self.font, font_scale, self.colors['text'], 1)
         
         total_bar_y = y + h - 60
-        cv2.rectangle(background, (x, total_bar_y), (x + w, y + h), self.colors['total_bg'], -1)
-        cv2.line(background, (x, total_bar_y), (x+w, total_bar_y), self.colors['line'], 1)
         total_price_text = f"Total: ${total_price:.2f}"
-        text_size_total = cv2.getTextSize(total_price_text, self.font, 1.1, 2)[0]
-        cv2.putText(background, total_price_text, (x + w - text_size_total[0] - 30, total_bar_y + 40), self.font, 1.1, self.colors['header'], 2)
+        text_size_total = self.text_cache.get_text_size(total_price_text, self.font, 1.1, 2)[0]
+        self.text_cache.put_text(panel, total_price_text, (x + w - text_size_total[0] - 30, total_bar_y + 40), self.font, 1.1, self.colors['header'], 2)
+        return panel
 
     def draw_qr_code(self, background, qr_image):
-        # ... (这部分无变化) ...
-        overlay = background.copy()
-        cv2.rectangle(overlay, (0, 0), (self.width, self.height), (0, 0, 0), -1)
+        # 叠加一层 70% 的黑色 = 原画面乘以 0.3，直接写进预分配的结账画布，不再每帧拷贝两整屏
         alpha = 0.7
-        background = cv2.addWeighted(overlay, alpha, background, 1 - alpha, 0)
+        if self._qr_canvas is None or self._qr_canvas.shape != background.shape:
+            self._qr_canvas = np.empty_like(background)
+        background = cv2.addWeighted(background, 1 - alpha, background, 0, 0, dst=self._qr_canvas)
         qr_h, qr_w, _ = qr_image.shape
         x_offset = (self.width - qr_w) // 2
         y_offset = (self.height - qr_h) // 2
         background[y_offset:y_offset+qr_h, x_offset:x_offset+qr_w] = qr_image
         msg = "Scan to pay. Make a THUMB UP to cancel."
-        text_size = cv2.getTextSize(msg, self.font, 0.8, 2)[0]
-        cv2.putText(background, msg, ((self.width - text_size[0]) // 2, y_offset + qr_h + 40), self.font, 0.8, (255, 255, 255), 2)
+        text_size = self.text_cache.get_text_size(msg, self.font, 0.8, 2)[0]
+        self.text_cache.put_text(background, msg, ((self.width - text_size[0]) // 2, y_offset + qr_h + 40), self.font, 0.8, (255, 255, 255), 2)
         return background
\ No newline at end of file
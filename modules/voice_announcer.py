@@ -2,85 +2,327 @@
 # 导入所有必需的库。
 # ==============================================================================
 import os
-import pyttsx3      # 核心的离线文本转语音库
-import threading    # 用于实现异步播放，防止阻塞主程序
+import time
+import threading    # 语音在一个常驻的后台线程中播放，防止阻塞主程序
+# pyttsx3 (核心的离线文本转语音库) 在语音线程创建引擎时才导入，导入和初始化都不拖慢程序启动
+
+from metrics import MetricsRegistry
 
 # ==============================================================================
 # 核心功能实现
 # ------------------------------------------------------------------------------
-# 将所有功能封装在一个简洁的模块级函数中。
+# 一个常驻的语音工作线程独占 pyttsx3 引擎，主程序通过 `say()` 把消息放进一个
+# 有界的优先级队列，立即返回。
+#   - 同类消息会合并：连续几条 "Apple added." 还没来得及说，就合并成 "3 items added."。
+#   - 紧急消息 (结账/总价等) 会丢弃所有排队中的普通消息，并打断正在说的那一句。
+#   - 队列长度、语音延迟 (入队到开口) 等指标记录在 MetricsRegistry 中。
+#   - 传入 PhraseCache 时，句子直接播放预合成的 wav 文件，只有缓存未命中才调用 espeak 合成；
+#     空闲时在后台预合成常用短语。
 # ==============================================================================
 
-# 全局引擎实例 ---
-# 模块加载时就初始化一个全局的pyttsx3引擎实例。
-#   避免在每次调用`say`函数时都重复初始化，提高了效率。保证整个程序只有一个引擎实例在工作
-try:
-    engine = pyttsx3.init()
-    # --- 调整语音属性 ---
-    rate = engine.getProperty('rate')  # 获取当前语速
-    engine.setProperty('rate', rate + 50) # 在默认基础上增加50，让语速更快
-    
-    # 创建一个线程锁，用于在多线程环境下安全地访问引擎
-    engine_lock = threading.Lock()
-    print("Global pyttsx3 engine initialized successfully.")
-
-except Exception as e:
-    # 如果因为某些原因（如系统音频服务问题）初始化失败，
-    # 我们将engine设为None，并在后续调用中安全地跳过播报，保证主程序不会崩溃。
-    engine = None
-    print(f"ERROR: Failed to initialize global pyttsx3 engine: {e}")
+# --- 消息优先级 (数字越小越优先) ---
+PRIORITY_URGENT = 0   # 结账、总价、清空购物车：打断一切
+PRIORITY_NORMAL = 1   # 添加/撤销商品
+PRIORITY_LOW = 2      # 欢迎语等可有可无的提示
 
+# --- 可合并的消息 ---
+# 相同 key 的消息还在排队时，数量累加，文字换成下面的模板。
+# 不在这里的 key 则是“后来者取代”：新消息直接替换掉排队中的旧消息。
+COALESCE_TEMPLATES = {
+    'added': "{count} items added.",
+    'undo': "{count} items removed.",
+}
 
-# ---  核心播报函数 `say()` ---
-def say(text):
+
+class _Message:
+    __slots__ = ('text', 'priority', 'key', 'count', 'enqueued', 'prefix')
+
+    def __init__(self, text, priority, key, count, enqueued, prefix=""):
+        self.text = text
+        self.prefix = prefix    # 例如多路收银台模式下的 "Lane 2, "，合并消息时保留
+        self.priority = priority
+        self.key = key
+        self.count = count
+        self.enqueued = enqueued
+
+
+def _pyttsx3_init():
+    import pyttsx3
+    return pyttsx3.init()
+
+
+# ==============================================================================
+# 语音工作线程 (SpeechWorker)
+# ==============================================================================
+
+class SpeechWorker:
     """
-    用于在后台线程中异步播报文本。
-    :param text: 需要播报的字符串。
+    常驻的语音线程。pyttsx3 引擎在这个线程里创建、也只在这个线程里使用，
+    打断 (engine.stop) 在引擎的 started-word 回调中执行，回调同样运行在这个线程上，
+    所以打断总是立即生效。
     """
-    # --- 安全检查 ---
-    # 如果引擎初始化失败或传入的文本为空，则直接返回。
-    if not engine or not text:
-        return
-
-    # --- 内部函数 `run()` ---
-    # 这个函数包含了实际的、会阻塞的语音播报逻辑。
-    # 我们将把它放到一个独立的线程中去执行。
-    def run():
-        # `with engine_lock:` 确保在同一时刻只有一个线程可以操作引擎，避免冲突。
-        with engine_lock:
+    def __init__(self, max_pending=4, rate_delta=50, metrics=None, engine_factory=None,
+                 phrase_cache=None, warmup=()):
+        """
+        :param max_pending: 排队消息的上限，满了就丢掉最不重要、最旧的一条。
+        :param rate_delta: 在默认语速基础上增加的值，让语速更快。
+        :param metrics: 可选的 MetricsRegistry，不传时使用私有的注册表 (stats() 仍然可用)。
+        :param engine_factory: 创建语音引擎的函数，默认 pyttsx3.init (在语音线程中导入)。
+        :param phrase_cache: 可选的 PhraseCache。本机有 espeak/aplay 时用它代替 pyttsx3。
+        :param warmup: 空闲时预合成并固定在缓存里的短语列表。
+        """
+        self.max_pending = max_pending
+        self.rate_delta = rate_delta
+        self._engine_factory = engine_factory or _pyttsx3_init
+        self._engine = None
+        self._phrase_cache = phrase_cache if phrase_cache is not None and phrase_cache.available else None
+        self._warmup = list(warmup) if self._phrase_cache is not None else []
+        self._player = None     # 正在播放缓存语音的 aplay 进程
+        self._cond = threading.Condition()
+        self._pending = []
+        self._current = None
+        self._preempt = False
+        self._closed = False
+        self.available = None   # None: 引擎还在初始化；True/False: 初始化成功/失败
+
+        registry = metrics if metrics is not None else MetricsRegistry()
+        self._depth = registry.gauge("speech_queue_depth", "Announcements waiting to be spoken")
+        self._latency = registry.histogram("speech_latency_seconds", "Delay from say() until speech starts",
+                                           buckets=(0.05, 0.1, 0.25, 0.5, 1.0, 2.0, 4.0, 8.0))
+        self._results = {result: registry.counter("speech_messages_total", "Announcements by outcome", {'result': result})
+                         for result in ('spoken', 'coalesced', 'superseded', 'dropped', 'interrupted')}
+
+        self._thread = threading.Thread(target=self._run, name="speech_worker", daemon=True)
+        self._thread.start()
+
+    # --------------------------------------------------------------------------
+    # 生产者接口 (任意线程调用)
+    # --------------------------------------------------------------------------
+    def submit(self, text, priority=PRIORITY_NORMAL, key=None, count=1, prefix=""):
+        """
+        把一条消息放进队列，立即返回。
+        :param key: 消息类别。相同类别 (且前缀相同) 的排队消息会被合并 (见 COALESCE_TEMPLATES) 或取代。
+        :param count: 这条消息代表的商品数量，合并时累加。
+        :param prefix: 播报时加在文字前面的前缀，不参与合并模板。
+        """
+        if not text or self._closed or self.available is False:
+            return
+        with self._cond:
+            if priority == PRIORITY_URGENT:
+                # 紧急消息：排队中的普通消息都已过时，正在说的普通消息也立即打断
+                # (多路收银台模式下其他收银台的消息不受影响，只是排在后面)
+                stale = [m for m in self._pending if m.priority != PRIORITY_URGENT and m.prefix == prefix]
+                self._drop(stale, 'superseded')
+                if (self._current is not None and self._current.priority != PRIORITY_URGENT
+                        and self._current.prefix == prefix):
+                    self._preempt = True
+                    if self._player is not None:
+                        self._player.terminate()
+            if key is not None:
+                for queued in self._pending:
+                    if queued.key != key or queued.prefix != prefix:
+                        continue
+                    if key in COALESCE_TEMPLATES:
+                        queued.count += count
+                        queued.text = COALESCE_TEMPLATES[key].format(count=queued.count)
+                        self._results['coalesced'].inc()
+                        return
+                    self._drop([queued], 'superseded')
+                    break
+            if len(self._pending) >= self.max_pending:
+                # 丢掉最不重要的消息里最旧的一条
+                victim = max(self._pending, key=lambda m: (m.priority, -m.enqueued))
+                if victim.priority < priority:
+                    self._results['dropped'].inc()  # 新消息自己就是最不重要的
+                    return
+                self._drop([victim], 'dropped')
+            self._pending.append(_Message(text, priority, key, count, time.monotonic(), prefix))
+            self._depth.set(len(self._pending))
+            self._cond.notify()
+
+    def _drop(self, messages, result):
+        for m in messages:
+            self._pending.remove(m)
+            self._results[result].inc()
+        self._depth.set(len(self._pending))
+
+    def wait_idle(self, timeout=None):
+        """等待队列清空、当前这句说完。返回是否在超时前完成。"""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        with self._cond:
+            while self._pending or self._current is not None:
+                remaining = None if deadline is None else deadline - time.monotonic()
+                if remaining is not None and remaining <= 0:
+                    return False
+                self._cond.wait(remaining)
+        return True
+
+    def close(self, timeout=1.0):
+        with self._cond:
+            self._closed = True
+            self._cond.notify_all()
+            if self._current is not None:
+                self._preempt = True
+                if self._player is not None:
+                    self._player.terminate()
+        self._thread.join(timeout)
+
+    def stats(self):
+        result = {name: counter.value for name, counter in self._results.items()}
+        result['queue_depth'] = len(self._pending)
+        result['latency_p50'] = self._latency.percentile(50)
+        result['latency_p95'] = self._latency.percentile(95)
+        if self._phrase_cache is not None:
+            result['phrase_cache'] = self._phrase_cache.stats()
+        return result
+
+    # --------------------------------------------------------------------------
+    # 语音线程
+    # --------------------------------------------------------------------------
+    def _init_engine(self):
+        engine = self._engine_factory()
+        # --- 调整语音属性 ---
+        rate = engine.getProperty('rate')  # 获取当前语速
+        engine.setProperty('rate', rate + self.rate_delta)
+        engine.connect('started-utterance', self._on_started)
+        engine.connect('started-word', self._on_word)
+        return engine
+
+    def _run(self):
+        try:
+            if self._phrase_cache is not None:
+                print(f"Speech worker using phrase cache at {self._phrase_cache.cache_dir}")
+            else:
+                self._engine = self._init_engine()
+                print("pyttsx3 speech worker initialized successfully.")
+            self.available = True
+        except Exception as e:
+            # 如果因为某些原因（如系统音频服务问题）初始化失败，之后的播报都安全地跳过，保证主程序不会崩溃。
+            self.available = False
+            print(f"ERROR: Failed to initialize pyttsx3 engine: {e}")
+            with self._cond:
+                self._pending.clear()
+                self._cond.notify_all()
+            return
+
+        while True:
+            warmup = None
+            with self._cond:
+                while not self._pending and not self._closed and not self._warmup:
+                    self._cond.wait()
+                if self._closed:
+                    break
+                if not self._pending:
+                    warmup = self._warmup.pop(0)
+                else:
+                    message = min(self._pending, key=lambda m: (m.priority, m.enqueued))
+                    self._pending.remove(message)
+                    self._depth.set(len(self._pending))
+                    self._current = message
+                    self._preempt = False
+            if warmup is not None:
+                # 空闲：预合成一条常用短语，然后马上回来检查队列。
+                # 合成要几百毫秒，必须在锁外进行，否则这期间 say()/submit() 都会被挡住
+                self._prewarm(warmup)
+                continue
+
+            text = message.prefix + message.text
             print(f"    Saying: '{text}'")
             try:
-                # --- 打断机制 ---
-                # 如果引擎当前正在忙（播放上一条语音），先让它强制停止。
-                # 这保证了用户总是能听到最新的、最及时的反馈。
-                if engine.isBusy():
-                    engine.stop()
-                
-                # --- 核心播报指令 ---
-                engine.say(text)        # 1. 将文本放入播放队列
-                engine.runAndWait()     # 2. 开始播报，并“阻塞”直到播报完毕
+                if self._phrase_cache is not None:
+                    self._play_cached(text)
+                else:
+                    self._engine.say(text)
+                    self._engine.runAndWait()   # 阻塞到说完或被 _on_word 打断
             except Exception as e:
                 print(f"[VoiceAnnouncer ERROR] Failed to say '{text}': {e}")
 
-    # --- 异步执行 ---
-    # 创建一个新的线程，目标是执行我们上面定义的`run`函数。
-    thread = threading.Thread(target=run)
-    thread.daemon = True # 如果主程序退出了，这个线程也会被强制结束。
-    thread.start()       # 启动线程。主程序会立即继续执行下一行代码，不会在此等待。
+            with self._cond:
+                self._results['interrupted' if self._preempt else 'spoken'].inc()
+                self._current = None
+                self._cond.notify_all()
+
+    def _prewarm(self, text):
+        try:
+            self._phrase_cache.get(text, pinned=True)
+        except Exception as e:
+            print(f"[VoiceAnnouncer ERROR] Failed to pre-render '{text}': {e}")
+
+    def _play_cached(self, text):
+        path = self._phrase_cache.get(text)   # 命中时只是一次文件查找
+        with self._cond:
+            if self._preempt or self._closed:
+                return  # 合成期间来了紧急消息，这句不用再说
+            self._player = self._phrase_cache.play(path)
+        self._on_started(None)
+        try:
+            self._player.wait()  # 被打断时 submit() 会 terminate 这个进程
+        finally:
+            with self._cond:
+                self._player = None
+
+    def _on_started(self, name):
+        if self._current is not None:
+            self._latency.observe(time.monotonic() - self._current.enqueued)
+
+    def _on_word(self, name, location, length):
+        # 引擎回调运行在语音线程中，这里调用 stop() 才能真正打断 runAndWait
+        if self._preempt:
+            self._engine.stop()
+
+
+# ==============================================================================
+# 模块级接口
+# ==============================================================================
+# 整个程序共用一个语音线程，第一次播报时自动创建。
+_worker = None
+_worker_lock = threading.Lock()
+
+
+def start(metrics=None, **kwargs):
+    """
+    创建 (或返回已有的) 全局语音线程。想把语音指标并入主程序的 MetricsRegistry 时，
+    在第一次 say() 之前调用一次。
+    """
+    global _worker
+    with _worker_lock:
+        if _worker is None:
+            _worker = SpeechWorker(metrics=metrics, **kwargs)
+        return _worker
+
+
+# ---  核心播报函数 `say()` ---
+def say(text, priority=PRIORITY_NORMAL, key=None, count=1, prefix=""):
+    """
+    异步播报文本：放进语音队列后立即返回。
+    :param text: 需要播报的字符串。
+    :param priority: PRIORITY_URGENT / PRIORITY_NORMAL / PRIORITY_LOW。
+    :param key: 消息类别，用于合并或取代排队中的同类消息。
+    :param count: 这条消息代表的数量 (合并时累加)。
+    :param prefix: 播报时加在前面的前缀 (多路收银台模式下的收银台名称)。
+    """
+    (_worker or start()).submit(text, priority, key, count, prefix)
+
+
+def shutdown(timeout=1.0):
+    """停止语音线程，未说出的消息直接丢弃。"""
+    global _worker
+    with _worker_lock:
+        if _worker is not None:
+            _worker.close(timeout)
+            _worker = None
 
 
 # ==============================================================================
 #  独立测试代码
 if __name__ == '__main__':
-    import time
-    print("\n--- Running Voice Announcer Test (Pure pyttsx3) ---")
-    if engine:
-        say("This is a long sentence that will be interrupted by the next one.")
-        time.sleep(1) # 只等1秒，这句话肯定没说完
-        say("Interrupted!") # 这个声音会打断并取代上一句话
-        
-        # 等待最后一个语音播放完毕
-        while engine.isBusy():
-            time.sleep(0.1)
-        
-        print("\nTest finished.")
\ No newline at end of file
+    print("\n--- Running Voice Announcer Test (pyttsx3 speech worker) ---")
+    worker = start()
+    say("This is a long sentence that will be interrupted by the checkout announcement.", key='intro')
+    for fruit in ("Apple", "Banana", "Orange"):
+        say(f"{fruit} added.", key='added')     # 后两条会和第一条合并成 "3 items added."
+    time.sleep(1.5)
+    say("Total price is 7.50 dollars. Please scan to pay.", PRIORITY_URGENT, key='checkout')
+    worker.wait_idle(timeout=15)
+    print(f"\nTest finished. {worker.stats()}")
+    shutdown()
@@ -0,0 +1,511 @@
+#!/usr/bin/env python3
+# 长时间运行测试 (Soak Test)
+# ==============================================================================
+# 收银机一开就是好几天，运行久了变慢这类问题 (内存泄漏、线程越开越多、某个阶段越来越慢)
+# 在几分钟的基准测试里看不出来。这个脚本用合成画面或循环回放的录像，
+# 驱动和 main.py 完全相同的流水线 (检测、手势、状态机、购物车、交易记录、语音、界面合成)
+# 连续运行几个小时，定时采样:
+#   - 进程常驻内存 (RSS)、tracemalloc 统计的 Python 内存和增长最多的分配位置；
+#   - 线程数 (Python 线程和包括原生线程在内的系统线程)、打开的文件数、GC 跟踪的对象数；
+#   - 每个阶段在这段采样间隔内的 p50/p95 延迟，以及吞吐量。
+# 结束时输出总结报告：持续单调增长的资源和越来越慢的阶段会被标记出来，并以非零状态退出。
+#
+# 用法:
+#   python3 soak_test.py --duration 8h                      # 合成画面 + 脚本化的顾客操作
+#   python3 soak_test.py --replay session.rec --duration 4h # 循环回放真实录像
+#   python3 soak_test.py --duration 10m --interval 5 --warmup 30 --json soak.json
+# ==============================================================================
+
+import sys
+import os
+import gc
+import time
+import json
+import shutil
+import argparse
+import tempfile
+import threading
+import tracemalloc
+import types
+
+import cv2
+import numpy as np
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), 'modules'))
+
+# 配置和 CUDA/Numpy 转换函数直接取自 main.py，保证测的就是线上的配置
+from main import (CATALOG_PATH, DETECTOR_MODELS, DETECT_INTERVAL, HAND_HOLD_INTERVAL, HAND_IDLE_INTERVAL,
+                  MAX_CAMERA_SKEW, RENDER_PERIOD, jetson, to_numpy, to_display)
+from camera_capture import LockstepCapture, SyntheticVideoSource
+from cart import Cart
+from catalog import Catalog
+from checkout_state import CheckoutStateMachine
+from frame_buffers import FrameBufferPool, HandFramePreprocessor
+from frame_recorder import FrameReplay, NullOutput
+from fruit_tracker import FruitTracker
+from gesture_events import GestureEventEngine
+from metrics import Histogram, MetricsRegistry
+from phrase_cache import PhraseCache, standard_phrases
+from pipeline import CheckoutStages, Pipeline
+from transaction_log import TransactionLog
+from ui_manager import UIManager
+from voice_announcer import say as announcer_say, start as start_announcer, shutdown as shutdown_announcer
+
+# ==============================================================================
+# 判定阈值
+# ------------------------------------------------------------------------------
+# 预热之后的采样才参与判定。一个资源被判为“持续增长”需要同时满足:
+#   - 趋势：采样值与时间的 Kendall 秩相关系数 ≥ TREND_TAU (后面的采样普遍比前面的大，而不是偶尔一次跳变)；
+#   - 幅度：最后三分之一的中位数比最前三分之一多出 (绝对值, 相对比例) 中较大的那个。
+# ==============================================================================
+TREND_TAU = 0.6
+GROWTH_TOLERANCE = {
+    'rss_mb': (16.0, 0.05),
+    'traced_mb': (4.0, 0.10),
+    'threads': (2, 0.0),
+    'os_threads': (2, 0.0),
+    'open_files': (4, 0.0),
+    'gc_objects': (5000, 0.10),
+}
+# 阶段的 p95 延迟：最后三分之一比最前三分之一慢 25% 以上、多于 1 ms，并且有上升趋势才算变慢
+# (单看前后两段，偶尔卡顿一次的噪声就会被误判)；吞吐量下降 20% 以上算变慢
+LATENCY_DRIFT_RATIO = 1.25
+LATENCY_DRIFT_MIN_MS = 1.0
+LATENCY_TREND_TAU = 0.3
+THROUGHPUT_DROP_RATIO = 0.8
+
+# ==============================================================================
+# 输入
+# ==============================================================================
+
+class ContinuousTimestamps:
+    """
+    包装循环回放的视频源：录像每放完一遍时间戳会跳回开头，这里累加偏移量让它一直递增，
+    否则手势事件引擎和状态机会看到时间倒流。
+    """
+    def __init__(self, source):
+        self.source = source
+        self.last_timestamp = 0.0
+        self._offset = 0.0
+        self._last_raw = None
+
+    def Capture(self, timeout=None):
+        frame = self.source.Capture(timeout)
+        raw = self.source.last_timestamp
+        if self._last_raw is not None and raw < self._last_raw:
+            # 新一遍的第一帧接在上一遍的最后一帧之后 (间隔按 30 FPS 计)
+            self._offset += self._last_raw - raw + 1 / 30.0
+        self._last_raw = raw
+        self.last_timestamp = raw + self._offset
+        return frame
+
+    def IsStreaming(self):
+        return self.source.IsStreaming()
+
+
+def open_capture(args):
+    if args.replay:
+        replay = FrameReplay(args.replay)
+        fruit_cam, hand_cam = replay.sources(realtime=True, loop=True, as_cuda=jetson is not None)
+        print(f"Replaying {len(replay)} frame pairs from {args.replay} in a loop")
+        return LockstepCapture(ContinuousTimestamps(fruit_cam), ContinuousTimestamps(hand_cam), max_skew=MAX_CAMERA_SKEW)
+    # 合成画面：两路都按 30 FPS 出帧，和真实摄像头一样每帧都是新分配的图像
+    return LockstepCapture(SyntheticVideoSource(640, 480, fps=30.0), SyntheticVideoSource(320, 240, fps=30.0, channels=4),
+                           max_skew=MAX_CAMERA_SKEW)
+
+# ==============================================================================
+# 脚本化的顾客操作 (Scenario)
+# ------------------------------------------------------------------------------
+# 合成画面里没有真的水果和手，用一个按时间循环的剧本代替：放上几件水果、撤销一件、
+# 指向结账、点赞完成交易，再放两件、点赞清空购物车。
+# 这样购物车、日志、交易记录、语音和二维码界面都会被反复用到，而不只是空转视频。
+# ==============================================================================
+
+class Scenario:
+    # (开始秒数, 结束秒数, 手势)，一个循环 SCRIPT_PERIOD 秒
+    SCRIPT_PERIOD = 24.0
+    GESTURES = ((9.0, 9.6, "open_palm"),      # 撤销一件
+                (11.0, 12.0, "pointing"),     # 结账
+                (14.0, 14.6, "thumb_up"),     # 完成交易
+                (20.0, 20.6, "thumb_up"))     # 清空购物车
+    FRUIT_TIMES = (1.0, 2.5, 4.0, 5.5, 7.0, 16.0, 17.5)
+
+    def __init__(self, class_ids, clock=time.monotonic):
+        """:param class_ids: 目录里有商品的类别 ID，轮流“放上”收银台。"""
+        if not class_ids:
+            raise ValueError("the catalog has no products for the scripted scenario")
+        self.class_ids = list(class_ids)
+        self.clock = clock
+        self.start = clock()
+        self._last_fruit = 0.0
+        self._next_class = 0
+
+    def _elapsed(self):
+        return self.clock() - self.start
+
+    def gesture(self):
+        phase = self._elapsed() % self.SCRIPT_PERIOD
+        for begin, end, gesture in self.GESTURES:
+            if begin <= phase < end:
+                return gesture
+        return None
+
+    def new_tracks(self):
+        """上次调用之后按剧本应该出现的水果 (接口同 FruitTracker 的新轨迹，只用到 class_id)。"""
+        now = self._elapsed()
+        tracks = []
+        for t in self.FRUIT_TIMES:
+            # 区间 (上次, 这次] 内经过了几次各个循环里的时刻 t
+            cycles = (int(np.floor((now - t) / self.SCRIPT_PERIOD))
+                      - int(np.floor((self._last_fruit - t) / self.SCRIPT_PERIOD)))
+            for _ in range(max(cycles, 0)):
+                tracks.append(types.SimpleNamespace(class_id=self.class_ids[self._next_class]))
+                self._next_class = (self._next_class + 1) % len(self.class_ids)
+        self._last_fruit = now
+        return tracks
+
+
+class ScriptedHands:
+    """同时替代 HandTracker 和 GestureRecognizer：手势来自剧本，画面照常经过预处理和界面合成。"""
+    def __init__(self, scenario):
+        self.scenario = scenario
+
+    def update(self, np_img_rgb):
+        gesture = self.scenario.gesture()
+        return types.SimpleNamespace(multi_hand_landmarks=[gesture] if gesture else None), True
+
+    def recognize_with_confidence(self, hand_landmarks):
+        return hand_landmarks, 0.95
+
+    def draw_landmarks(self, img, results):
+        pass
+
+# ==============================================================================
+# 采样 (SoakMonitor)
+# ==============================================================================
+
+def _proc_status():
+    """/proc/self/status 中的 VmRSS (kB) 和 Threads；不是 Linux 时返回空字典。"""
+    fields = {}
+    try:
+        with open('/proc/self/status') as f:
+            for line in f:
+                key, _, value = line.partition(':')
+                if key in ('VmRSS', 'Threads'):
+                    fields[key] = int(value.split()[0])
+    except OSError:
+        pass
+    return fields
+
+
+def _open_files():
+    try:
+        return len(os.listdir('/proc/self/fd'))
+    except OSError:
+        return None
+
+
+def _window_percentile(hist, previous_counts, q):
+    """只用这段采样间隔内新增的桶计数估算分位数 (秒)。"""
+    window = Histogram(hist.name, hist.help, buckets=hist.buckets)
+    window.counts = [now - before for now, before in zip(hist.counts, previous_counts)]
+    window.count = sum(window.counts)
+    return window.percentile(q) if window.count else None
+
+
+class SoakMonitor:
+    def __init__(self, metrics, interval=60.0, warmup=120.0, trace_frames=1, top_allocators=10):
+        """
+        :param metrics: 流水线使用的 MetricsRegistry (必须开启)，从中读取各阶段的延迟直方图。
+        :param interval: 采样间隔 (秒)。
+        :param warmup: 预热时间 (秒)：这之前的采样不参与判定，结束时记下 tracemalloc 的基线快照。
+        :param trace_frames: tracemalloc 为每次分配保存的调用栈深度；0 表示不开 tracemalloc。
+        :param top_allocators: 每次采样记录增长最多的几个分配位置。
+        """
+        self.metrics = metrics
+        self.interval = interval
+        self.warmup = warmup
+        self.trace_frames = trace_frames
+        self.top_allocators = top_allocators
+        self.samples = []
+        self.start = None
+        self.baseline = None    # 预热结束时的 tracemalloc 快照
+        self.final_top = []
+        self._frames = metrics.counter("frames_total", "Frames processed by the main loop")
+        self._stop = threading.Event()
+        self._thread = None
+        self._prev_counts = {}
+        self._prev_frames = 0
+        self._prev_time = None
+
+    def start_sampling(self):
+        if self.trace_frames:
+            tracemalloc.start(self.trace_frames)
+        self.start = self._prev_time = time.monotonic()
+        self._thread = threading.Thread(target=self._run, name="soak_monitor", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+        if self.baseline is not None:
+            self.final_top = self._top_growth(tracemalloc.take_snapshot(), self.top_allocators)
+        if self.trace_frames:
+            tracemalloc.stop()
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            self.sample()
+
+    @staticmethod
+    def _filtered(snapshot):
+        # 不统计 tracemalloc、采样本身和导入机制的分配
+        return snapshot.filter_traces((tracemalloc.Filter(False, tracemalloc.__file__),
+                                       tracemalloc.Filter(False, __file__),
+                                       tracemalloc.Filter(False, "<frozen importlib._bootstrap*>"),
+                                       tracemalloc.Filter(False, "<unknown>")))
+
+    def _top_growth(self, snapshot, limit):
+        stats = self._filtered(snapshot).compare_to(self.baseline, 'lineno')
+        return [{'site': f"{stat.traceback[0].filename}:{stat.traceback[0].lineno}",
+                 'size_diff_kb': stat.size_diff / 1024.0, 'count_diff': stat.count_diff,
+                 'size_kb': stat.size / 1024.0} for stat in stats[:limit] if stat.size_diff > 0]
+
+    def sample(self):
+        now = time.monotonic()
+        status = _proc_status()
+        record = {
+            't': now - self.start,
+            'rss_mb': status['VmRSS'] / 1024.0 if 'VmRSS' in status else None,
+            'traced_mb': tracemalloc.get_traced_memory()[0] / 1e6 if tracemalloc.is_tracing() else None,
+            'threads': threading.active_count(),
+            'os_threads': status.get('Threads'),
+            'open_files': _open_files(),
+            'gc_objects': len(gc.get_objects()),
+            'fps': (self._frames.value - self._prev_frames) / max(now - self._prev_time, 1e-6),
+            'stages': {},
+        }
+        self._prev_frames, self._prev_time = self._frames.value, now
+        for name, hist in self.metrics.stage_histograms():
+            previous = self._prev_counts.get(name, [0] * len(hist.counts))
+            p50, p95 = _window_percentile(hist, previous, 50), _window_percentile(hist, previous, 95)
+            self._prev_counts[name] = list(hist.counts)
+            if p95 is not None:
+                record['stages'][name] = {'p50_ms': p50 * 1000.0, 'p95_ms': p95 * 1000.0,
+                                          'count': hist.count - sum(previous)}
+        if tracemalloc.is_tracing():
+            if self.baseline is None and record['t'] >= self.warmup:
+                self.baseline = self._filtered(tracemalloc.take_snapshot())
+            elif self.baseline is not None:
+                record['top_allocators'] = self._top_growth(tracemalloc.take_snapshot(), self.top_allocators)
+        self.samples.append(record)
+        stage_text = "  ".join(f"{name} {s['p95_ms']:.1f}" for name, s in sorted(record['stages'].items()))
+        print(f"[soak {record['t'] / 60:6.1f} min] rss {record['rss_mb'] or 0:.1f} MB  threads {record['threads']}"
+              f"  fps {record['fps']:.1f}  p95 ms: {stage_text}")
+        return record
+
+# ==============================================================================
+# 判定
+# ==============================================================================
+
+def kendall_tau(values):
+    """采样值与采样顺序的 Kendall 秩相关系数：1 表示严格单调递增，0 表示没有趋势。"""
+    v = np.asarray(values, dtype=np.float64)
+    n = len(v)
+    if n < 2:
+        return 0.0
+    signs = np.sign(v[None, :] - v[:, None])
+    return float(np.triu(signs, 1).sum()) / (n * (n - 1) / 2.0)
+
+
+def _thirds(values):
+    k = max(1, len(values) // 3)
+    return float(np.median(values[:k])), float(np.median(values[-k:]))
+
+
+def analyze(samples, warmup, min_samples=6):
+    """
+    对预热后的采样逐项判定。
+    :return: [{'metric', 'start', 'end', 'slope_per_hour', 'tau', 'flagged', 'reason'}, ...]
+    """
+    steady = [s for s in samples if s['t'] >= warmup]
+    if len(steady) < min_samples:
+        return [{'metric': 'samples', 'start': len(steady), 'end': len(steady), 'slope_per_hour': None, 'tau': None,
+                 'flagged': False, 'reason': f"only {len(steady)} samples after warmup, need {min_samples}"}]
+    hours = np.array([s['t'] for s in steady]) / 3600.0
+    findings = []
+
+    def series(key_fn):
+        pairs = [(h, key_fn(s)) for h, s in zip(hours, steady)]
+        pairs = [(h, v) for h, v in pairs if v is not None]
+        return np.array([h for h, _ in pairs]), np.array([v for _, v in pairs], dtype=np.float64)
+
+    def slope(t, v):
+        return float(np.polyfit(t, v, 1)[0]) if len(v) >= 2 and np.ptp(t) > 0 else 0.0
+
+    # --- 资源：持续单调增长 ---
+    for key, (absolute, relative) in GROWTH_TOLERANCE.items():
+        t, v = series(lambda s: s.get(key))
+        if len(v) < min_samples:
+            continue
+        first, last = _thirds(v)
+        tau = kendall_tau(v)
+        tolerance = max(absolute, relative * abs(first))
+        flagged = tau >= TREND_TAU and last - first > tolerance
+        findings.append({'metric': key, 'start': first, 'end': last, 'slope_per_hour': slope(t, v), 'tau': tau,
+                         'flagged': flagged,
+                         'reason': f"grew {last - first:+.1f} (> {tolerance:.1f}) with a steady upward trend" if flagged else ""})
+
+    # --- 各阶段延迟：越来越慢 ---
+    stage_names = sorted({name for s in steady for name in s['stages']})
+    for name in stage_names:
+        t, v = series(lambda s: s['stages'].get(name, {}).get('p95_ms'))
+        if len(v) < min_samples:
+            continue
+        first, last = _thirds(v)
+        tau = kendall_tau(v)
+        flagged = (last > first * LATENCY_DRIFT_RATIO and last - first > LATENCY_DRIFT_MIN_MS
+                   and tau >= LATENCY_TREND_TAU)
+        findings.append({'metric': f"{name} p95 ms", 'start': first, 'end': last, 'slope_per_hour': slope(t, v),
+                         'tau': tau, 'flagged': flagged,
+                         'reason': f"p95 drifted from {first:.2f} to {last:.2f} ms" if flagged else ""})
+
+    # --- 吞吐量 ---
+    t, v = series(lambda s: s['fps'])
+    first, last = _thirds(v)
+    flagged = first > 0 and last < first * THROUGHPUT_DROP_RATIO
+    findings.append({'metric': 'fps', 'start': first, 'end': last, 'slope_per_hour': slope(t, v),
+                     'tau': kendall_tau(v), 'flagged': flagged,
+                     'reason': f"throughput fell from {first:.1f} to {last:.1f} FPS" if flagged else ""})
+    return findings
+
+
+def print_report(monitor, findings, elapsed, counts):
+    print(f"\nSoak test summary: {elapsed / 3600:.2f} h, {len(monitor.samples)} samples, "
+          f"{counts['frames']} frames, {counts['transactions']} transactions")
+    print(f"\n{'metric':<24}{'start':>10}{'end':>10}{'slope/h':>10}{'trend':>8}  result")
+    print("-" * 74)
+    for f in findings:
+        if f['slope_per_hour'] is None:
+            print(f"{f['metric']:<24}  {f['reason']}")
+            continue
+        print(f"{f['metric']:<24}{f['start']:>10.2f}{f['end']:>10.2f}{f['slope_per_hour']:>+10.2f}{f['tau']:>8.2f}  "
+              f"{'DRIFT: ' + f['reason'] if f['flagged'] else 'ok'}")
+    if monitor.final_top:
+        print("\nLargest Python allocation growth since warmup (tracemalloc):")
+        for site in monitor.final_top:
+            print(f"  {site['size_diff_kb']:+10.1f} KB  {site['count_diff']:+8d} blocks  {site['site']}")
+    threads = sorted(t.name for t in threading.enumerate())
+    print(f"\nThreads still alive: {len(threads)} ({', '.join(threads)})")
+
+# ==============================================================================
+# 入口
+# ==============================================================================
+
+def parse_duration(text):
+    """'8h' / '30m' / '90s' / '45' (秒) → 秒数。"""
+    units = {'h': 3600.0, 'm': 60.0, 's': 1.0}
+    text = text.strip().lower()
+    if text and text[-1] in units:
+        return float(text[:-1]) * units[text[-1]]
+    return float(text)
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Drive the full checkout pipeline for hours and report memory/latency drift")
+    parser.add_argument('--duration', type=parse_duration, default=parse_duration('1h'), help="how long to run, e.g. 8h, 30m (default: 1h)")
+    parser.add_argument('--replay', metavar='FILE', help="loop a recording instead of synthetic frames")
+    parser.add_argument('--hands', choices=('scripted', 'real'), help="gesture input (default: scripted for synthetic frames, real for replays)")
+    parser.add_argument('--interval', type=parse_duration, default=60.0, help="sampling interval (default: 60s)")
+    parser.add_argument('--warmup', type=parse_duration, default=120.0, help="ignore samples before this (default: 120s)")
+    parser.add_argument('--trace-frames', type=int, default=1, metavar='N', help="tracemalloc stack depth, 0 disables tracemalloc")
+    parser.add_argument('--json', metavar='FILE', help="also write samples and findings as JSON")
+    return parser.parse_args()
+
+
+def main(args):
+    os.chdir(os.path.dirname(os.path.abspath(__file__)))  # 模型和目录路径相对于项目根目录
+    from object_detector import MODEL_REGISTRY, ObjectDetector, registry_labels
+    from engine_cache import EngineCache
+
+    metrics = MetricsRegistry(enabled=True)   # 阶段延迟从这里读取，必须开启
+    workdir = tempfile.mkdtemp(prefix='soak_')  # 购物车日志和交易记录写到临时目录，不混进真实报表
+    labels = registry_labels(DETECTOR_MODELS)
+    catalog = Catalog(CATALOG_PATH, labels).start_watching()
+    start_announcer(metrics, phrase_cache=PhraseCache(), warmup=standard_phrases(catalog.product_names()))
+
+    if jetson is not None:
+        engine_cache = EngineCache(MODEL_REGISTRY[DETECTOR_MODELS[0]]['model'])
+        engine_cache.prepare()
+        detector = ObjectDetector.from_registry(DETECTOR_MODELS, backend='jetson', engine_cache=engine_cache)
+    else:
+        detector = ObjectDetector.from_registry(DETECTOR_MODELS, backend='cpu')
+    fruit_tracker = FruitTracker(detector, detect_interval=DETECT_INTERVAL)
+
+    scripted = (args.hands or ('real' if args.replay else 'scripted')) == 'scripted'
+    scenario = Scenario([i for i in range(len(labels)) if catalog.lookup(i) is not None])
+    if scripted:
+        hand_tracker = gesture_recognizer = ScriptedHands(scenario)
+    else:
+        from hand_tracker import HandTracker
+        from gesture_recognizer import GestureRecognizer
+        hand_tracker = HandTracker(hold_interval=HAND_HOLD_INTERVAL, idle_interval=HAND_IDLE_INTERVAL)
+        gesture_recognizer = GestureRecognizer()
+
+    qr_code_img = cv2.imread("payment_qr.png")
+    qr_code_img = cv2.resize(qr_code_img, (300, 300)) if qr_code_img is not None else np.zeros((300, 300, 3), np.uint8)
+    cart = Cart(journal_path=os.path.join(workdir, "cart_journal.jsonl"))
+    transaction_log = TransactionLog(os.path.join(workdir, "transactions.db"))
+    state = CheckoutStateMachine(cart, catalog, announcer_say, on_reset=fruit_tracker.reset, metrics=metrics,
+                                 transaction_log=transaction_log)
+    capture = open_capture(args)
+    ui = UIManager()
+    stages = CheckoutStages(capture, fruit_tracker, HandFramePreprocessor(FrameBufferPool(), slots=4),
+                            GestureEventEngine(), state, cart, ui, NullOutput(), to_numpy, to_display, qr_code_img,
+                            hand_tracker=hand_tracker, gesture_recognizer=gesture_recognizer, metrics=metrics)
+    pipeline = Pipeline(stages.stages(render_period=RENDER_PERIOD), metrics=metrics)
+    if scripted:
+        # 剧本里的水果在检测阶段之后加进新轨迹，检测器本身照常处理每一帧
+        def detect(job):
+            job = stages.detect(job)
+            job.new_tracks = job.new_tracks + scenario.new_tracks()
+            return job
+        pipeline.replace('detect', detect)
+
+    print(f"Soak test: {args.duration / 3600:.2f} h, sampling every {args.interval:.0f}s "
+          f"({'scripted' if scripted else 'real'} gestures, {'replay' if args.replay else 'synthetic'} frames)")
+    monitor = SoakMonitor(metrics, interval=args.interval, warmup=args.warmup,
+                          trace_frames=args.trace_frames).start_sampling()
+    deadline = time.monotonic() + args.duration
+    try:
+        pipeline.run(until=lambda: time.monotonic() < deadline)
+    except KeyboardInterrupt:
+        print("\nInterrupted, writing the report for the samples so far...")
+    finally:
+        monitor.stop()
+        capture.stop()
+        transaction_log.close()
+        cart.close()
+        catalog.close()
+        shutdown_announcer()
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    findings = analyze(monitor.samples, args.warmup)
+    counts = {'frames': int(metrics.counter("frames_total").value), 'transactions': transaction_log.written}
+    print_report(monitor, findings, time.monotonic() - monitor.start, counts)
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump({'samples': monitor.samples, 'findings': findings, 'top_allocators': monitor.final_top,
+                       'counts': counts}, f, indent=2)
+
+    drifted = [f['metric'] for f in findings if f['flagged']]
+    if drifted:
+        print(f"\nFAILED: {', '.join(drifted)} kept growing or slowing down")
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(parse_args()))
@@ -0,0 +1,6 @@
+# tests/conftest.py
+# 与 main.py 一样把 modules/ 加进搜索路径，测试里直接 `import cart` 等
+import os
+import sys
+
+sys.path.append(os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'modules'))
@@ -0,0 +1,61 @@
+# tests/test_camera_capture.py
+# 用替身摄像头 (SyntheticVideoSource) 测试采集逻辑，不需要 Jetson
+from camera_capture import DualCameraCapture, LatestFrameSlot, LockstepCapture, SyntheticVideoSource
+
+
+class TimestampedSource(SyntheticVideoSource):
+    """像回放源一样带上 last_timestamp，每帧按给定的时间间隔前进。"""
+    def __init__(self, start, step, **kwargs):
+        super().__init__(fps=0, **kwargs)
+        self.last_timestamp = start - step
+        self.step = step
+
+    def Capture(self, timeout=None):
+        frame = super().Capture(timeout)
+        if frame is not None:
+            self.last_timestamp += self.step
+        return frame
+
+
+def test_slot_returns_latest_frame_and_counts_overwrites():
+    slot = LatestFrameSlot()
+    assert slot.get()[0] is None
+    slot.put('a', 1.0)
+    slot.put('b', 2.0)
+    frame, timestamp, seq, is_new = slot.get()
+    assert (frame, timestamp, seq, is_new) == ('b', 2.0, 2, True)
+    assert slot.dropped == 1
+    assert slot.get()[3] is False   # 没有新帧时仍返回最新帧，但不是新的
+
+
+def test_lockstep_pairs_frames_in_order_until_source_ends():
+    capture = LockstepCapture(SyntheticVideoSource(64, 48, fps=0, max_frames=3),
+                              SyntheticVideoSource(32, 24, fps=0, channels=4, max_frames=10))
+    pairs = []
+    while capture.is_streaming():
+        pair = capture.latest_pair()
+        if pair is None:
+            break
+        pairs.append(pair)
+    assert [p.fruit_seq for p in pairs] == [1, 2, 3]
+    assert all(p.fruit_new and p.hand_new for p in pairs)
+    assert pairs[0].fruit.shape == (48, 64, 3) and pairs[0].hand.shape == (24, 32, 4)
+    assert not capture.is_streaming()
+
+
+def test_lockstep_flags_pairs_with_too_much_skew():
+    capture = LockstepCapture(TimestampedSource(0.0, 0.033, width=8, height=8),
+                              TimestampedSource(0.0, 0.050, width=8, height=8), max_skew=0.05)
+    skews = [capture.latest_pair() for _ in range(5)]
+    assert [p.in_sync for p in skews] == [True, True, True, False, False]   # 第 4 帧起相差超过 0.05 s
+    assert abs(skews[-1].skew - 4 * 0.017) < 1e-9
+
+
+def test_dual_capture_waits_for_both_cameras_before_consuming():
+    capture = DualCameraCapture(None, None)
+    capture.fruit_slot.put('fruit', 1.0)
+    assert capture.latest_pair() is None
+    capture.hand_slot.put('hand', 1.0)
+    pair = capture.latest_pair()
+    assert (pair.fruit, pair.hand) == ('fruit', 'hand')
+    assert pair.fruit_new and pair.hand_new     # 水果帧没有在只有一路时被提前消费
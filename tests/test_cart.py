@@ -0,0 +1,50 @@
+# tests/test_cart.py
+from cart import Cart, CartJournal
+
+
+def test_add_undo_clear_keep_total_in_cents():
+    cart = Cart()
+    cart.add("Apple", 2.5)
+    cart.add("Banana", 1.2)
+    cart.add("Apple", 2.5)
+    assert cart.items["Apple"]["count"] == 2 and cart.total_cents == 620
+    assert cart.undo() == "Apple"
+    assert cart.total_cents == 370 and len(cart) == 2
+    cart.clear()
+    assert not cart and cart.total_cents == 0 and cart.undo() is None
+
+
+def test_existing_line_keeps_its_unit_price():
+    cart = Cart()
+    cart.add("Apple", 2.5)
+    cart.add("Apple", 3.0)   # 目录价格在中途改了
+    assert cart.items["Apple"]["cents"] == 250 and cart.total_cents == 500
+
+
+def test_journal_replay_restores_cart(tmp_path):
+    path = str(tmp_path / "cart.jsonl")
+    cart = Cart(journal_path=path, flush_interval=0.0)
+    for name, price in [("Apple", 2.5), ("Pear", 2.0), ("Apple", 2.5)]:
+        cart.add(name, price)
+    cart.undo()
+    cart.close()
+    restored = Cart(journal_path=path)
+    restored.close()
+    assert restored.items == {"Apple": {"count": 1, "price": 2.5, "cents": 250},
+                              "Pear": {"count": 1, "price": 2.0, "cents": 200}}
+    assert restored.total_cents == 450
+
+
+def test_journal_is_truncated_on_clear_and_ignores_torn_last_line(tmp_path):
+    path = str(tmp_path / "cart.jsonl")
+    cart = Cart(journal_path=path, flush_interval=0.0)
+    cart.add("Apple", 2.5)
+    cart.clear()
+    cart.add("Pear", 2.0)
+    cart.close()
+    with open(path, 'a') as f:
+        f.write('{"op":"add","na')   # 断电时写到一半的一行
+    assert [r['op'] for r in CartJournal.read(path)] == ['add']
+    restored = Cart(journal_path=path)
+    restored.close()
+    assert list(restored.items) == ["Pear"]
@@ -0,0 +1,35 @@
+# tests/test_gesture_events.py
+from gesture_events import GESTURE_HOLD, GESTURE_RELEASE, GESTURE_START, GestureEventEngine
+
+
+def run(engine, gestures, fps=30.0):
+    events = []
+    for i, gesture in enumerate(gestures):
+        events += engine.push(gesture, i / fps)
+    return [(e.kind, e.gesture) for e in events]
+
+
+def test_single_misrecognized_frame_triggers_nothing():
+    assert run(GestureEventEngine(), ["No Hand"] * 5 + ["thumb_up"] + ["No Hand"] * 5) == []
+
+
+def test_start_needs_n_of_m_votes_and_survives_one_bad_frame():
+    events = run(GestureEventEngine(hold_interval=None), ["pointing"] * 2 + ["unknown"] + ["pointing"] * 10)
+    assert events == [(GESTURE_START, "pointing")]
+
+
+def test_low_confidence_frames_do_not_vote():
+    engine = GestureEventEngine()
+    assert all(not engine.push("thumb_up", i / 30.0, confidence=0.2) for i in range(10))
+
+
+def test_hold_events_and_release():
+    events = run(GestureEventEngine(hold_interval=0.5), ["open_palm"] * 40 + ["No Hand"] * 5)
+    assert events[0] == (GESTURE_START, "open_palm")
+    assert events.count((GESTURE_HOLD, "open_palm")) == 2     # 第 3 帧开始，约 1.2 s 内每 0.5 s 一次
+    assert events[-1] == (GESTURE_RELEASE, "open_palm")
+
+
+def test_switching_gesture_releases_the_old_one_first():
+    events = run(GestureEventEngine(hold_interval=None), ["pointing"] * 5 + ["thumb_up"] * 5)
+    assert events == [(GESTURE_START, "pointing"), (GESTURE_RELEASE, "pointing"), (GESTURE_START, "thumb_up")]
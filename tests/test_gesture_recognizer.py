@@ -0,0 +1,30 @@
+# tests/test_gesture_recognizer.py
+import numpy as np
+
+from gesture_recognizer import FINGER_CHAINS, GestureRecognizer
+
+
+def open_hand():
+    """五根手指都伸直、呈扇形张开的 (21, 3) 关节点。"""
+    points = np.zeros((21, 3), dtype=np.float32)
+    for finger, chain in enumerate(FINGER_CHAINS):
+        angle = np.radians(150 - 30 * finger)
+        for k, joint in enumerate(chain[1:], start=1):
+            points[joint, :2] = 0.5 + 0.08 * k * np.cos(angle), 0.9 - 0.08 * k * np.sin(angle)
+    points[0, :2] = 0.5, 0.9
+    return points
+
+
+def test_ndarray_input_is_accepted():
+    recognizer = GestureRecognizer()
+    points = open_hand()
+    gesture, confidence = recognizer.recognize_with_confidence(points)
+    assert gesture == "open_palm" and confidence > 0
+    assert recognizer.recognize_with_confidence(points.tolist()) == (gesture, confidence)
+
+
+def test_missing_or_empty_hand_gives_no_gesture():
+    recognizer = GestureRecognizer()
+    assert recognizer.recognize_with_confidence(None) == (None, 0.0)
+    assert recognizer.recognize_with_confidence([]) == (None, 0.0)
+    assert recognizer.recognize_with_confidence(np.empty((0, 3), dtype=np.float32)) == (None, 0.0)
@@ -0,0 +1,22 @@
+# tests/test_metrics.py
+import time
+
+from metrics import MetricsRegistry
+
+
+def test_nested_stage_timers_keep_their_own_start():
+    registry = MetricsRegistry()
+    with registry.stage("outer"):
+        time.sleep(0.02)
+        with registry.stage("outer"):   # 同名阶段嵌套，不能覆盖外层的开始时间
+            pass
+    hist = dict(registry.stage_histograms())["outer"]
+    assert hist.count == 2
+    assert hist.sum >= 0.02
+
+
+def test_disabled_registry_records_nothing():
+    registry = MetricsRegistry(enabled=False)
+    with registry.stage("detect"):
+        pass
+    assert registry.stage_histograms() == []
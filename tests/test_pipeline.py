@@ -0,0 +1,62 @@
+# tests/test_pipeline.py
+import asyncio
+
+from pipeline import _CLOSED, DropOldestQueue
+
+
+def test_drop_oldest_merges_dropped_item_into_successor():
+    merged = []
+    queue = DropOldestQueue(maxsize=2, merge=lambda dropped, successor: merged.append((dropped, successor)))
+    for item in ("a", "b", "c", "d"):
+        queue.put_nowait(item)
+    assert list(queue._items) == ["c", "d"]
+    assert queue.dropped == 2
+    assert merged == [("a", "b"), ("b", "c")]
+
+
+def test_single_slot_queue_merges_into_the_new_item():
+    merged = []
+    queue = DropOldestQueue(maxsize=1, merge=lambda dropped, successor: merged.append((dropped, successor)))
+    queue.put_nowait(1)
+    queue.put_nowait(2)
+    assert merged == [(1, 2)] and len(queue) == 1
+
+
+def test_get_times_out_and_reports_closed():
+    loop = asyncio.new_event_loop()
+    try:
+        queue = DropOldestQueue()
+        assert loop.run_until_complete(queue.get(timeout=0.01)) is None
+        queue.put_nowait("x")
+        queue.close()
+        assert loop.run_until_complete(queue.get()) == "x"     # 关闭前放进去的照样取出
+        assert loop.run_until_complete(queue.get()) is _CLOSED
+    finally:
+        loop.close()
+
+
+def test_lossless_put_waits_for_space():
+    loop = asyncio.new_event_loop()
+    try:
+        queue = DropOldestQueue(maxsize=1, drop_oldest=False)
+        received = []
+
+        async def producer():
+            for i in range(3):
+                await queue.put(i)
+            queue.close()
+
+        async def consumer():
+            while True:
+                item = await queue.get()
+                if item is _CLOSED:
+                    return
+                received.append(item)
+
+        async def both():
+            await asyncio.gather(producer(), consumer())
+
+        loop.run_until_complete(both())
+        assert received == [0, 1, 2] and queue.dropped == 0
+    finally:
+        loop.close()